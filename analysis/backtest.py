@@ -0,0 +1,326 @@
+import argparse
+import csv
+import heapq
+import itertools
+import multiprocessing
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime, timedelta
+from typing import NamedTuple, Optional
+
+from analysis.batch_analysis import list_snapshots, list_store_snapshots, load_snapshot, snapshot_sort_time
+from analysis import ev_analysis
+from analysis.ev_analysis import EST, parse_and_convert_to_est
+from analysis.incremental import bet_key, opportunity_key
+from analysis.odds_table import OddsTable, find_arbitrage, find_positive_ev
+from scrapers import odds_api
+from scrapers.odds_api import create_session, fetch_scores
+from scrapers.snapshot_store import STORE_DIR
+
+RESULTS_FILE = 'data/results.csv'  # Final scores of finished games, filled in by update_results
+RESULTS_HEADERS = ["Sport", "Home Team", "Away Team", "Start Time", "Home Score", "Away Score"]
+STARTING_BANKROLL = 1000  # Every simulation starts from this bankroll
+FLAT_STAKE = 10  # Flat staking: stake per EV bet, and total investment per arbitrage or middle
+KELLY_FRACTION = 0.25  # Kelly staking: share of the full Kelly stake put on an EV bet
+MAX_BET_FRACTION = 0.05  # Kelly staking: most of the bankroll one bet may take; arbitrage and middles take this
+MIN_OPPORTUNITY_PROFIT = 0  # Guaranteed profit, in % of the investment, an arbitrage or middle must beat by default
+SETTLE_DELAY = timedelta(hours=4)  # Bets on a game are settled this long after it starts
+STAKING_METHODS = ['flat', 'kelly']
+CHUNKS_PER_WORKER = 4  # Snapshot ranges per worker and bookmaker set, so uneven ranges still balance
+SWEEP_HEADERS = ["Strategy", "Bookmakers", "Min EV", "Max EV", "Min Arbitrage Profit %", "Staking", "Bets",
+                 "Unsettled", "Staked", "Profit", "ROI", "Final Bankroll", "Max Drawdown"]
+
+# Parsed snapshots and results for the scan workers. Set before the pool is forked, so every worker
+# shares the parent's copy instead of receiving one.
+REPLAY = {'tables': [], 'results': {}}
+
+class Hit(NamedTuple):
+    # One EV bet or opportunity as seen in one snapshot, already settled against the game's result
+    time: float  # Snapshot time, epoch seconds
+    key: tuple  # Identifies the same bet or opportunity across snapshots
+    category: str  # 'EV', 'Arbitrage' or 'Middle'
+    value: float  # EV of a bet; guaranteed profit of an arbitrage or middle, in % of its investment
+    odds: float  # Price of an EV bet; 0 for opportunities
+    unit_return: Optional[float]  # What one dollar invested paid back; None when the result is unknown
+    settle_time: float
+
+def load_results(filename=RESULTS_FILE):
+    # {(sport, game, start date in EST as MM/DD/YYYY): (home team, away team, home score, away score, commence time)}
+    results = {}
+    if not os.path.exists(filename):
+        return results
+    with open(filename, newline='', encoding='utf-8') as f:
+        for row in csv.DictReader(f):
+            commence_time = parse_and_convert_to_est(row['Start Time'])
+            game = f"{row['Home Team']} vs {row['Away Team']}"
+            results[(row['Sport'], game, commence_time.strftime("%m/%d/%Y"))] = (
+                row['Home Team'], row['Away Team'], float(row['Home Score']), float(row['Away Score']), commence_time)
+    return results
+
+def scores_to_results(sport, games):
+    # Results rows for the completed games of a scores payload
+    rows = []
+    for game in games or []:
+        if not game.get('completed') or not game.get('scores'):
+            continue
+        scores = {score['name']: score['score'] for score in game['scores']}
+        if game['home_team'] in scores and game['away_team'] in scores:
+            rows.append([sport, game['home_team'], game['away_team'], game['commence_time'],
+                         scores[game['home_team']], scores[game['away_team']]])
+    return rows
+
+def update_results(sports=None, filename=RESULTS_FILE, session=None):
+    # Appends the newly completed games of every sport to the results file; returns how many were added
+    sports = odds_api.SPORTS if sports is None else sports
+    known = set()
+    if os.path.exists(filename):
+        with open(filename, newline='', encoding='utf-8') as f:
+            known = {tuple(row[:4]) for row in itertools.islice(csv.reader(f), 1, None)}
+    own_session = session is None
+    if own_session:
+        session = create_session()
+    try:
+        rows = [row for sport in sports for row in scores_to_results(sport, fetch_scores(sport, session))
+                if tuple(row[:4]) not in known]
+    finally:
+        if own_session:
+            session.close()
+
+    os.makedirs(os.path.dirname(filename) or '.', exist_ok=True)
+    new_file = not os.path.exists(filename)
+    with open(filename, 'a', newline='', encoding='utf-8') as f:
+        writer = csv.writer(f)
+        if new_file:
+            writer.writerow(RESULTS_HEADERS)
+        writer.writerows(rows)
+    print(f"{len(rows)} new results saved to {filename}")
+    return len(rows)
+
+def leg_return(market, outcome, line, odds, result, three_way):
+    # What a unit stake on one leg pays back: the odds on a win, the stake on a push, nothing on a loss
+    home_team, away_team, home_score, away_score = result[:4]
+    if market == 'Total':
+        margin = home_score + away_score - line if outcome == 'Over' else line - home_score - away_score
+    elif outcome == 'Draw':
+        margin = 1 if home_score == away_score else -1
+    else:
+        margin = home_score - away_score if outcome == home_team else away_score - home_score
+        if market == 'Spread':
+            margin += line
+        elif margin == 0 and three_way:
+            margin = -1  # A draw loses both teams' side of a three-way moneyline
+    return odds if margin > 0 else 1 if margin == 0 else 0
+
+def settle_time(result, seen_at):
+    return (result[4] + SETTLE_DELAY).timestamp() if result is not None else seen_at
+
+def ev_hit(seen_at, bet, results):
+    market, *side = bet['Bet Type'].split()
+    result = results.get((bet['Sport'], bet['Game'], bet['Start Time'][:10]))
+    unit_return = None
+    if result is not None:
+        unit_return = leg_return(market, bet.get('Team', side[0] if side else None), bet.get('Spread', bet.get('Total')),
+                                 bet['Odds'], result, bet['Sport'].lower()[:6] == 'soccer')
+    return Hit(seen_at, bet_key(bet), 'EV', bet['EV'], bet['Odds'], unit_return, settle_time(result, seen_at))
+
+def opportunity_hit(seen_at, opportunity, results):
+    result = results.get((opportunity['Sport'], opportunity['Game'], opportunity['Date']))
+    investment = opportunity['Total Investment']
+    unit_return = None
+    if result is not None:
+        three_way = opportunity['Sport'].lower()[:6] == 'soccer'
+        unit_return = sum(leg['Stake'] * leg_return(opportunity['Market'], leg['Type'], leg.get('Spread', leg.get('Total')),
+                                                    leg['Odds'], result, three_way)
+                          for leg in opportunity['Bets']) / investment
+    return Hit(seen_at, opportunity_key(opportunity), opportunity['Category'], opportunity['Profit'], 0, unit_return,
+               settle_time(result, seen_at))
+
+def ingest(snapshots, bookmakers):
+    # One parse of every snapshot, in time order, keeping the quotes of any bookmaker in the sweep
+    tables = []
+    for snapshot in sorted(snapshots, key=snapshot_sort_time):
+        now, _, source = load_snapshot(snapshot)
+        tables.append((now, OddsTable.from_rows(source, now, bookmakers)))
+    return tables
+
+def scan_snapshots(bookmakers, start, end, min_ev, max_ev):
+    # Runs in a worker: the hits of snapshots [start, end) using only the given bookmakers' quotes
+    results = REPLAY['results']
+    hits = []
+    for now, table in REPLAY['tables'][start:end]:
+        if not set(table.bookmaker_list) <= bookmakers:
+            table = table.select(table.bookmaker_rows(bookmakers))
+        seen_at = now.timestamp()
+        hits.extend(ev_hit(seen_at, bet, results) for bet in find_positive_ev(table, min_ev, max_ev))
+        hits.extend(opportunity_hit(seen_at, opportunity, results) for opportunity in find_arbitrage(table))
+    return hits
+
+class Bankroll:
+    # Stakes leave the bankroll when a bet is placed and their returns come back when its game is settled
+    def __init__(self, amount=STARTING_BANKROLL):
+        self.cash = self.peak = amount
+        self.outstanding = 0
+        self.staked = 0
+        self.bets = 0
+        self.max_drawdown = 0
+        self.pending = []
+
+    def settle(self, until=float('inf')):
+        while self.pending and self.pending[0][0] <= until:
+            _, stake, returned = heapq.heappop(self.pending)
+            self.cash += returned
+            self.outstanding -= stake
+            equity = self.cash + self.outstanding
+            self.peak = max(self.peak, equity)
+            self.max_drawdown = max(self.max_drawdown, 1 - equity / self.peak)
+
+    def place(self, stake, settle_at, unit_return):
+        stake = min(stake, self.cash)
+        if stake <= 0:
+            return
+        self.cash -= stake
+        self.outstanding += stake
+        self.staked += stake
+        self.bets += 1
+        heapq.heappush(self.pending, (settle_at, stake, stake * unit_return))
+
+def select_hits(hits, strategy, min_ev=None, max_ev=None, min_arbitrage_profit=None):
+    # Each bet or opportunity is taken the first time it passes the thresholds. 'Arbitrage' and 'Middle'
+    # are separate strategies, so guaranteed and speculative positions are never mixed, and both need
+    # more than min_arbitrage_profit % guaranteed. A percentage holds at whatever stake simulate() then
+    # places, so one threshold means the same for a small opportunity and a large one.
+    seen = set()
+    for hit in hits:
+        if hit.category != strategy:
+            continue
+        if strategy == 'EV':
+            if not min_ev <= hit.value <= max_ev:
+                continue
+        elif hit.value <= min_arbitrage_profit:
+            continue
+        if hit.key not in seen:
+            seen.add(hit.key)
+            yield hit
+
+def simulate(hits, staking):
+    # Returns (bankroll, unsettled): hits without a known result are not placed
+    bankroll = Bankroll()
+    unsettled = 0
+    for hit in hits:
+        bankroll.settle(hit.time)
+        if hit.unit_return is None:
+            unsettled += 1
+            continue
+        # Kelly fractions apply to the whole bankroll, including stakes on games not yet settled
+        equity = bankroll.cash + bankroll.outstanding
+        if staking == 'flat':
+            stake = FLAT_STAKE
+        elif hit.category == 'EV':
+            # Full Kelly for decimal odds o and edge EV is EV / (o - 1)
+            stake = equity * min(KELLY_FRACTION * hit.value / (hit.odds - 1), MAX_BET_FRACTION)
+        else:
+            stake = equity * MAX_BET_FRACTION
+        bankroll.place(stake, hit.settle_time, hit.unit_return)
+    bankroll.settle()
+    return bankroll, unsettled
+
+def snapshot_ranges(count, parts):
+    bounds = sorted(set(round(count * i / parts) for i in range(parts + 1)))
+    return list(zip(bounds[:-1], bounds[1:]))
+
+def run_scans(tasks, workers):
+    if workers > 1 and len(tasks) > 1 and 'fork' in multiprocessing.get_all_start_methods():
+        with ProcessPoolExecutor(max_workers=workers, mp_context=multiprocessing.get_context('fork')) as executor:
+            return list(executor.map(scan_snapshots, *zip(*tasks)))
+    return [scan_snapshots(*task) for task in tasks]
+
+def bookmakers_label(bookmakers):
+    return 'allowed' if bookmakers == frozenset(ev_analysis.ALLOWED_BOOKMAKERS) else '+'.join(sorted(bookmakers))
+
+def run_backtest(snapshots=None, results_file=RESULTS_FILE, bookmaker_sets=None, min_evs=None, max_evs=None,
+                 min_arbitrage_profits=None, workers=None, output_dir='logs'):
+    # Replays every snapshot once per bookmaker set and simulates every threshold combination on the
+    # hits. Snapshots are parsed once, with the quotes of every bookmaker in any set; the scans then
+    # run in parallel on that one copy. Arbitrage thresholds are profit percentages, like the
+    # opportunities' 'Profit'.
+    bookmaker_sets = [frozenset(ev_analysis.ALLOWED_BOOKMAKERS)] if bookmaker_sets is None else [frozenset(s) for s in bookmaker_sets]
+    min_evs = [ev_analysis.MIN_EV_THRESHOLD] if min_evs is None else min_evs
+    max_evs = [ev_analysis.MAX_EV_THRESHOLD] if max_evs is None else max_evs
+    min_arbitrage_profits = [MIN_OPPORTUNITY_PROFIT] if min_arbitrage_profits is None else min_arbitrage_profits
+    workers = workers or os.cpu_count() or 1
+    if snapshots is None:
+        snapshots = (list_snapshots('data') if os.path.isdir('data') else []) + list_store_snapshots(STORE_DIR)
+    if not snapshots:
+        print("No snapshots to replay.")
+        return []
+
+    start = time.perf_counter()
+    REPLAY['results'] = load_results(results_file)
+    REPLAY['tables'] = ingest(snapshots, frozenset().union(*bookmaker_sets))
+    ingest_time = time.perf_counter() - start
+    print(f"Parsed {len(REPLAY['tables'])} snapshots in {ingest_time:.2f}s; {len(REPLAY['results'])} game results")
+
+    start = time.perf_counter()
+    ranges = snapshot_ranges(len(REPLAY['tables']), workers * CHUNKS_PER_WORKER)
+    tasks = [(bookmakers, first, last, min(min_evs), max(max_evs)) for bookmakers in bookmaker_sets for first, last in ranges]
+    scans = iter(run_scans(tasks, workers))
+    hits = {bookmakers: [hit for _ in ranges for hit in next(scans)] for bookmakers in bookmaker_sets}
+    print(f"Scanned {len(bookmaker_sets)} bookmaker set(s) with {workers} worker(s) in {time.perf_counter() - start:.2f}s")
+
+    rows = []
+    for bookmakers in bookmaker_sets:
+        label = bookmakers_label(bookmakers)
+        strategies = [('EV', min_ev, max_ev, '') for min_ev in min_evs for max_ev in max_evs if min_ev < max_ev]
+        strategies += [(category, '', '', min_profit) for category in ('Arbitrage', 'Middle')
+                       for min_profit in min_arbitrage_profits]
+        for strategy, min_ev, max_ev, min_profit in strategies:
+            selected = list(select_hits(hits[bookmakers], strategy, min_ev, max_ev, min_profit))
+            for staking in STAKING_METHODS:
+                bankroll, unsettled = simulate(selected, staking)
+                profit = bankroll.cash - STARTING_BANKROLL
+                rows.append([strategy, label, min_ev, max_ev, min_profit, staking, bankroll.bets, unsettled,
+                             round(bankroll.staked, 2), round(profit, 2),
+                             round(profit / bankroll.staked, 4) if bankroll.staked else '',
+                             round(bankroll.cash, 2), round(bankroll.max_drawdown, 4)])
+
+    os.makedirs(output_dir, exist_ok=True)
+    filename = os.path.join(output_dir, f"backtest_sweep_{datetime.now(EST).strftime('%Y%m%d_%H%M%S')}.csv")
+    with open(filename, 'w', newline='', encoding='utf-8') as f:
+        writer = csv.writer(f)
+        writer.writerow(SWEEP_HEADERS)
+        writer.writerows(rows)
+
+    for strategy in ('EV', 'Arbitrage', 'Middle'):
+        ranked = sorted((row for row in rows if row[0] == strategy), key=lambda row: row[11], reverse=True)
+        if ranked:
+            best = ranked[0]
+            print(f"Best {strategy}: bookmakers {best[1]}, min EV {best[2]}, max EV {best[3]}, min arbitrage profit "
+                  f"{best[4]}, {best[5]} staking: {best[6]} bets, profit {best[9]:.2f}, final bankroll {best[11]:.2f}")
+    print(f"Sweep of {len(rows)} simulations saved to {filename}")
+    return rows
+
+def parse_list(value, cast=float):
+    return None if value is None else [cast(item) for item in value.split(',')]
+
+def main(argv=None):
+    # e.g. python -m analysis.backtest --min-ev 0,0.01,0.02 --max-ev 0.1,0.15 --bookmakers "fanduel,draftkings;bovada"
+    parser = argparse.ArgumentParser(description="Replay snapshots against game results and sweep thresholds")
+    parser.add_argument('--results', default=RESULTS_FILE)
+    parser.add_argument('--update-results', action='store_true', help="fetch newly completed games first")
+    parser.add_argument('--workers', type=int)
+    parser.add_argument('--min-ev', help="comma-separated values to sweep")
+    parser.add_argument('--max-ev', help="comma-separated values to sweep")
+    parser.add_argument('--min-arbitrage-profit', help="comma-separated values to sweep, in %% guaranteed profit on the investment, for arbitrage and middles")
+    parser.add_argument('--bookmakers', help="bookmaker sets to sweep: comma-separated keys, sets split by ';'")
+    args = parser.parse_args(argv)
+
+    if args.update_results:
+        update_results(filename=args.results)
+    bookmaker_sets = None if args.bookmakers is None else [{b.strip().lower() for b in s.split(",")} for s in args.bookmakers.split(';')]
+    run_backtest(results_file=args.results, bookmaker_sets=bookmaker_sets, min_evs=parse_list(args.min_ev),
+                 max_evs=parse_list(args.max_ev), min_arbitrage_profits=parse_list(args.min_arbitrage_profit),
+                 workers=args.workers)
+
+if __name__ == "__main__":
+    main()
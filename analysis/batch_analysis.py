@@ -0,0 +1,128 @@
+import csv
+import os
+import re
+import sys
+from concurrent.futures import ProcessPoolExecutor
+from contextlib import redirect_stdout
+from functools import lru_cache
+from datetime import datetime
+from typing import NamedTuple
+
+from analysis.ev_analysis import EST, analysis_settings, analyze_odds, configure
+from scrapers.snapshot_store import STORE_DIR, SnapshotStore
+
+SNAPSHOT_PATTERN = re.compile(r'all_sports_odds_(\d{8}_\d{6})\.csv$')
+SUMMARY_HEADERS = ["Snapshot Time", "Snapshot", "Games", "EV Bets", "Arbitrage Opportunities", "Middles",
+                   "Best EV", "Best Arbitrage Profit"]
+HIT_HEADERS = ["Snapshot Time", "Category", "Sport", "Game", "Market", "Outcome", "Line", "Bookmaker", "Odds", "Value"]
+
+class StoreSnapshot(NamedTuple):
+    # One snapshot inside a SnapshotStore; workers map the store themselves, so only this is pickled
+    directory: str
+    time: datetime
+
+def snapshot_time(path):
+    # save_to_csv stamps files with local time; fall back to the file's mtime for anything else
+    match = SNAPSHOT_PATTERN.search(os.path.basename(path))
+    if match:
+        return datetime.strptime(match.group(1), '%Y%m%d_%H%M%S').astimezone(EST)
+    return datetime.fromtimestamp(os.path.getmtime(path), EST)
+
+def list_snapshots(directory='data'):
+    paths = [os.path.join(directory, f) for f in os.listdir(directory) if f.endswith('.csv')]
+    return sorted(paths, key=snapshot_time)
+
+@lru_cache(maxsize=None)
+def open_store(directory):
+    # Each worker process maps a store once and reuses it for every snapshot it is handed
+    return SnapshotStore(directory)
+
+def list_store_snapshots(directory=STORE_DIR):
+    return [StoreSnapshot(directory, time) for time in SnapshotStore(directory).snapshot_times()]
+
+def snapshot_sort_time(snapshot):
+    return snapshot.time.astimezone(EST) if isinstance(snapshot, StoreSnapshot) else snapshot_time(snapshot)
+
+def load_snapshot(snapshot):
+    # (time in EST, label, analyze_odds source) for a CSV path or a store snapshot
+    if isinstance(snapshot, StoreSnapshot):
+        label = f"{os.path.basename(snapshot.directory)}@{snapshot.time.isoformat()}"
+        return snapshot_sort_time(snapshot), label, open_store(snapshot.directory).rows(snapshot.time)
+    return snapshot_time(snapshot), os.path.basename(snapshot), snapshot
+
+def summarize_hits(timestamp, positive_ev_bets, arbitrage_opportunities):
+    hits = []
+    for bet in positive_ev_bets:
+        line = bet.get('Spread', bet.get('Total', ''))
+        hits.append((timestamp, 'EV', bet['Sport'], bet['Game'], bet['Bet Type'], bet.get('Team', ''), line,
+                     bet['Bookmaker'], bet['Odds'], bet['EV']))
+    for opportunity in arbitrage_opportunities:
+        legs = opportunity['Bets']
+        line = '/'.join(str(leg.get('Spread', leg.get('Total', ''))) for leg in legs)
+        hits.append((timestamp, opportunity['Category'], opportunity.get('Sport', ''), opportunity.get('Game', ''),
+                     opportunity['Market'], '/'.join(leg['Type'] for leg in legs), line.strip('/'),
+                     '/'.join(leg['Bookmaker'] for leg in legs), '/'.join(f"{leg['Odds']:.2f}" for leg in legs),
+                     opportunity['Profit'] / 100))
+    return hits
+
+def analyze_snapshot(snapshot):
+    # Runs in a worker process: the snapshot is streamed row by row, and only compact hit tuples are sent back
+    now, label, source = load_snapshot(snapshot)
+    with open(os.devnull, 'w') as devnull, redirect_stdout(devnull):
+        positive_ev_bets, games, arbitrage_opportunities = analyze_odds(source, now)
+
+    timestamp = now.isoformat()
+    middles = sum(1 for opportunity in arbitrage_opportunities if opportunity['Category'] == 'Middle')
+    arbitrages = [opportunity for opportunity in arbitrage_opportunities if opportunity['Category'] == 'Arbitrage']
+    summary = (timestamp, label, sum(len(sport_games) for sport_games in games.values()),
+               len(positive_ev_bets), len(arbitrages), middles,
+               max((bet['EV'] for bet in positive_ev_bets), default=''),
+               max((opportunity['Profit'] / 100 for opportunity in arbitrages), default=''))
+    return summary, summarize_hits(timestamp, positive_ev_bets, arbitrage_opportunities)
+
+def run_batch(directory='data', workers=None, output_dir='logs', store_directory=STORE_DIR):
+    # Legacy CSV snapshots and the columnar store are analyzed together, in time order
+    snapshots = list_snapshots(directory) if os.path.isdir(directory) else []
+    snapshots += list_store_snapshots(store_directory)
+    snapshots.sort(key=snapshot_sort_time)
+    if not snapshots:
+        print(f"No snapshots found in '{directory}' or '{store_directory}'.")
+        return None
+
+    workers = workers or os.cpu_count() or 1
+    os.makedirs(output_dir, exist_ok=True)
+    run_time = datetime.now(EST).strftime('%Y%m%d_%H%M%S')
+    summary_filename = os.path.join(output_dir, f"backtest_summary_{run_time}.csv")
+    hits_filename = os.path.join(output_dir, f"backtest_hits_{run_time}.csv")
+
+    print(f"Analyzing {len(snapshots)} snapshots with {workers} worker processes...")
+    totals = {'EV Bets': 0, 'Arbitrage Opportunities': 0, 'Middles': 0}
+    chunksize = max(1, len(snapshots) // (workers * 16))
+
+    with open(summary_filename, 'w', newline='', encoding='utf-8') as summary_file, \
+            open(hits_filename, 'w', newline='', encoding='utf-8') as hits_file, \
+            ProcessPoolExecutor(max_workers=workers, initializer=configure,
+                                initargs=analysis_settings()) as executor:
+        summary_writer = csv.writer(summary_file)
+        hits_writer = csv.writer(hits_file)
+        summary_writer.writerow(SUMMARY_HEADERS)
+        hits_writer.writerow(HIT_HEADERS)
+
+        # map() yields in submission order, so both reports stay sorted by snapshot time
+        for i, (summary, hits) in enumerate(executor.map(analyze_snapshot, snapshots, chunksize=chunksize), 1):
+            summary_writer.writerow(summary)
+            hits_writer.writerows(hits)
+            totals['EV Bets'] += summary[3]
+            totals['Arbitrage Opportunities'] += summary[4]
+            totals['Middles'] += summary[5]
+            if i % 500 == 0:
+                print(f"  {i}/{len(snapshots)} snapshots analyzed")
+
+    print(f"Batch analysis complete: {totals['EV Bets']} EV bets, {totals['Arbitrage Opportunities']} arbitrage "
+          f"opportunities, {totals['Middles']} middles across {len(snapshots)} snapshots.")
+    print(f"Summary saved to {summary_filename}")
+    print(f"Hits saved to {hits_filename}")
+    return summary_filename, hits_filename
+
+if __name__ == "__main__":
+    run_batch(*sys.argv[1:2])
@@ -0,0 +1,79 @@
+import numpy as np
+
+DEVIG_METHOD = 'multiplicative'  # How the bookmaker margin is removed: multiplicative, additive, power or shin
+BOOKMAKER_WEIGHTS = {}  # Weight of each bookmaker in the market consensus, e.g. {'betonlineag': 3}; others count 1
+SOLVER_ITERATIONS = 60  # Newton/bisection steps for the power and Shin methods; they converge far sooner
+SOLVER_TOLERANCE = 1e-13
+
+# Every method takes the consensus implied probability of each outcome, the market each outcome
+# belongs to and the number of markets, and returns fair probabilities summing to 1 per market.
+# All markets of a snapshot are solved at once.
+
+def group_sum(values, markets, count):
+    return np.bincount(markets, weights=values, minlength=count)
+
+def multiplicative(probabilities, markets, count):
+    # The margin is spread in proportion to each outcome's probability
+    return probabilities / group_sum(probabilities, markets, count)[markets]
+
+def additive(probabilities, markets, count):
+    # The margin is spread equally over the outcomes; longshots can hit zero
+    sizes = np.bincount(markets, minlength=count)
+    overround = group_sum(probabilities, markets, count) - 1
+    return np.maximum(probabilities - (overround / sizes)[markets], 0)
+
+def power(probabilities, markets, count):
+    # Fair probability p ** k, with k solved per market so they sum to 1; leaves more margin on longshots
+    log_probabilities = np.log(probabilities)
+    k = np.ones(count)
+    for _ in range(SOLVER_ITERATIONS):
+        powered = probabilities ** k[markets]
+        step = (group_sum(powered, markets, count) - 1) / group_sum(powered * log_probabilities, markets, count)
+        k -= step
+        if np.abs(step).max() < SOLVER_TOLERANCE:
+            break
+    return probabilities ** k[markets]
+
+def shin(probabilities, markets, count):
+    # Shin's model: the margin protects the bookmaker against a share z of insider money. z is found
+    # per market by bisection, since the fair probabilities' sum falls monotonically as z grows.
+    total = group_sum(probabilities, markets, count)
+    squared = probabilities ** 2 / total[markets]
+
+    def fair(z):
+        z = z[markets]
+        return (np.sqrt(z ** 2 + 4 * (1 - z) * squared) - z) / (2 * (1 - z))
+
+    low = np.zeros(count)
+    high = np.ones(count) - SOLVER_TOLERANCE
+    for _ in range(SOLVER_ITERATIONS):
+        z = (low + high) / 2
+        too_high = group_sum(fair(z), markets, count) > 1
+        low = np.where(too_high, z, low)
+        high = np.where(too_high, high, z)
+        if (high - low).max() < SOLVER_TOLERANCE:
+            break
+    # Shin has no solution without a margin; those markets are normalized instead
+    return np.where(total[markets] > 1, fair((low + high) / 2), probabilities / total[markets])
+
+DEVIG_METHODS = {'multiplicative': multiplicative, 'additive': additive, 'power': power, 'shin': shin}
+
+def bookmaker_weights(bookmakers):
+    return np.array([BOOKMAKER_WEIGHTS.get(bookmaker, 1) for bookmaker in bookmakers], dtype=float)
+
+def consensus(implied_probabilities, weights, outcomes, outcome_count):
+    # Weighted mean implied probability of each outcome across the bookmakers quoting it
+    return (np.bincount(outcomes, weights=implied_probabilities * weights, minlength=outcome_count)
+            / np.bincount(outcomes, weights=weights, minlength=outcome_count))
+
+def fair_probabilities(implied_probabilities, weights, outcomes, outcome_markets, method=None):
+    # implied_probabilities and weights are per quote, outcomes the outcome id of each quote and
+    # outcome_markets the market id of each outcome. Returns the fair probability of every outcome,
+    # using DEVIG_METHOD unless another method is named.
+    implied_probabilities = np.asarray(implied_probabilities, dtype=float)
+    outcome_markets = np.asarray(outcome_markets, dtype=np.int64)
+    if not len(outcome_markets):
+        return np.zeros(0)
+    probabilities = consensus(implied_probabilities, np.asarray(weights, dtype=float),
+                              np.asarray(outcomes, dtype=np.int64), len(outcome_markets))
+    return DEVIG_METHODS[method or DEVIG_METHOD](probabilities, outcome_markets, int(outcome_markets.max()) + 1)
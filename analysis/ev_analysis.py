@@ -1,8 +1,18 @@
 import csv
 import os
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor
 from datetime import datetime, timedelta
 from collections import defaultdict
 import pytz
+from analysis.devig import bookmaker_weights, fair_probabilities
+from analysis.portfolio import size_portfolio
+from analysis.quotes import (AWAY, BOOKMAKERS, DRAW, DRAW_OUTCOME, HOME, OVER_OUTCOME, TEAMS, UNDER_OUTCOME, SideQuote,
+                             TotalQuote, bookmaker_mask, in_mask)
+from analysis.stakes import solve_stakes, stake_limits
+from monitoring.metrics import METRICS
+from scrapers.odds_api import CSV_HEADERS, OddsRow, flatten_odds
 
 # Configuration
 MINIMUM_ARBITRAGE_PROFIT = 0  # Minimum profit in dollars for arbitrage opportunities
@@ -11,10 +21,35 @@ MAX_OPPORTUNITIES_PER_GAME = 3  # Maximum number of opportunities to show per ga
 ALLOWED_BOOKMAKERS = {'betus', 'fanduel', 'draftkings', 'pointsbetus', 'wynnbet', 'bovada', 'betmgm', 'espnbet', 'fliff', 'betonlineag', 'betrivers', 'hardrockbet'}  # Set of allowed bookmakers
 MIN_EV_THRESHOLD = 0.00  # Minimum EV to consider a bet (1%)
 MAX_EV_THRESHOLD = 0.15  # Maximum EV to consider realistic (15%)
+MIN_MIDDLE_PROFIT = 0.0  # Worst-case profit (%) accepted for a middle, i.e. when only one side wins; below 0 it can lose
+TOP_EV_BETS = 10  # EV bets listed in the report
+ANALYSIS_WORKERS = 1  # Processes analyze_odds spreads the games over; 1 analyzes everything in this process
+CHUNKS_PER_WORKER = 4  # Chunks of games handed to each worker, so one slow chunk cannot idle the others
+ALLOWED_BOOKMAKER_MASK = bookmaker_mask(ALLOWED_BOOKMAKERS)
+
+MARKET_BET_TYPES = {'moneyline': 'Moneyline', 'spread': 'Spread', 'total': 'Total'}
 
 # Time zone configuration
 EST = pytz.timezone('US/Eastern')
 
+def configure(allowed_bookmakers=None, max_days_ahead=None, min_ev=None, max_ev=None):
+    # Replaces the analysis settings above, e.g. when config.settings reloads them. The bookmaker mask
+    # is only rebuilt when the bookmakers actually change; None keeps a setting as it is.
+    global ALLOWED_BOOKMAKERS, ALLOWED_BOOKMAKER_MASK, MAX_DAYS_AHEAD, MIN_EV_THRESHOLD, MAX_EV_THRESHOLD
+    if allowed_bookmakers is not None and set(allowed_bookmakers) != ALLOWED_BOOKMAKERS:
+        ALLOWED_BOOKMAKERS = set(allowed_bookmakers)
+        ALLOWED_BOOKMAKER_MASK = bookmaker_mask(ALLOWED_BOOKMAKERS)
+    if max_days_ahead is not None:
+        MAX_DAYS_AHEAD = max_days_ahead
+    if min_ev is not None:
+        MIN_EV_THRESHOLD = min_ev
+    if max_ev is not None:
+        MAX_EV_THRESHOLD = max_ev
+
+def analysis_settings():
+    # configure's arguments for the settings in force here, for worker processes to apply
+    return ALLOWED_BOOKMAKERS, MAX_DAYS_AHEAD, MIN_EV_THRESHOLD, MAX_EV_THRESHOLD
+
 def decimal_to_american(decimal_odds):
     if decimal_odds >= 2:
         return f"+{int((decimal_odds - 1) * 100)}"
@@ -28,318 +63,462 @@ def calculate_ev(odds, true_probability):
     return (true_probability * (odds - 1)) - (1 - true_probability)
 
 def parse_and_convert_to_est(date_string):
-    utc_time = datetime.strptime(date_string, "%Y-%m-%dT%H:%M:%SZ")
-    utc_time = pytz.utc.localize(utc_time)
+    utc_time = datetime.fromisoformat(date_string.replace('Z', '+00:00'))
     est_time = utc_time.astimezone(EST)
     return est_time
 
 def format_est_time(est_time):
     return est_time.strftime("%m/%d/%Y %I:%M %p EST")
 
-def is_within_time_range(event_time):
-    now = datetime.now(EST)
+def time_window(now=None):
+    now = now or datetime.now(EST)
+    return now, now + timedelta(days=MAX_DAYS_AHEAD)
+
+def is_within_time_range(event_time, now=None):
+    window_start, window_end = time_window(now)
     est_event_time = parse_and_convert_to_est(event_time)
-    return now <= est_event_time <= (now + timedelta(days=MAX_DAYS_AHEAD))
+    return window_start <= est_event_time <= window_end
+
+class EventTimes:
+    # Parses, formats and window-checks each distinct commence_time once per run, against one "now"
+    def __init__(self, now=None):
+        self.window_start, self.window_end = time_window(now)
+        self.cache = {}
+
+    def get(self, commence_time):
+        entry = self.cache.get(commence_time)
+        if entry is None:
+            est_time = parse_and_convert_to_est(commence_time)
+            entry = (est_time, format_est_time(est_time), self.window_start <= est_time <= self.window_end)
+            self.cache[commence_time] = entry
+        return entry
+
+def market_line(bet, market):
+    # The line both sides of a market share: the home spread for spreads, the total for totals
+    if market == 'spread':
+        return bet.spread if bet.side == HOME else -bet.spread
+    if market == 'total':
+        return bet.total
+    return None
+
+def group_bets_by_line(bets, market):
+    bets_by_line = defaultdict(list)
+    for bet in bets:
+        bets_by_line[market_line(bet, market)].append(bet)
+    return bets_by_line
+
+def middle_sides(line_bets, market):
+    # Splits quotes into a low side that wins above its threshold and a high side that wins below it.
+    # For totals that is Over/Under at the total; for spreads it is the home team (wins when the home
+    # margin beats -spread) and the away team (wins when the home margin stays under its spread).
+    low_side, high_side = [], []
+    for line, bets in sorted(line_bets.items()):
+        if market == 'total':
+            best_over = max(bets, key=lambda x: x.over_odds)
+            best_under = max(bets, key=lambda x: x.under_odds)
+            low_side.append((line, best_over.over_odds, {'Type': 'Over', 'Odds': best_over.over_odds, 'Bookmaker': BOOKMAKERS.name(best_over.bookmaker), 'Total': line}))
+            high_side.append((line, best_under.under_odds, {'Type': 'Under', 'Odds': best_under.under_odds, 'Bookmaker': BOOKMAKERS.name(best_under.bookmaker), 'Total': line}))
+        else:
+            for side, sides in ((HOME, low_side), (AWAY, high_side)):
+                side_bets = [bet for bet in bets if bet.side == side]
+                if side_bets:
+                    best = max(side_bets, key=lambda x: x.odds)
+                    threshold = -best.spread if side == HOME else best.spread
+                    sides.append((threshold, best.odds, {'Type': TEAMS.name(best.team), 'Odds': best.odds, 'Bookmaker': BOOKMAKERS.name(best.bookmaker), 'Spread': best.spread}))
+    return low_side, high_side
+
+def best_middle_pairs(low_side, high_side):
+    # For every high-side line, the best-priced low-side quote on a strictly lower threshold.
+    # Both sides come sorted by line, so one sweep covers every pair.
+    low_side = sorted(low_side, key=lambda x: x[0])
+    pairs = []
+    best_low = None
+    i = 0
+    for high in sorted(high_side, key=lambda x: x[0]):
+        while i < len(low_side) and low_side[i][0] < high[0]:
+            if best_low is None or low_side[i][1] > best_low[1]:
+                best_low = low_side[i]
+            i += 1
+        if best_low is not None:
+            pairs.append((best_low, high))
+    return pairs
+
+def middle_opportunity(market, date, low, high):
+    # No guaranteed profit to round for, so middles keep exact equal-payout stakes
+    plan = solve_stakes([low[1], high[1]], limits=stake_limits([low[2]['Bookmaker'], high[2]['Bookmaker']]), unit=0)
+    if not plan.investment or plan.profit / plan.investment * 100 < MIN_MIDDLE_PROFIT:
+        return None
+    low_stake, high_stake = plan.stakes
+    middle_profit = low_stake * low[1] + high_stake * high[1] - plan.investment
+    return {
+        'Category': 'Middle',
+        'Market': market.capitalize(),
+        'Date': date.strftime("%m/%d/%Y"),
+        'Bets': [dict(low[2], Stake=low_stake), dict(high[2], Stake=high_stake)],
+        'Profit': plan.profit / plan.investment * 100,
+        'Middle Profit': middle_profit / plan.investment * 100,
+        'Middle Width': high[0] - low[0],
+        'Total Investment': plan.investment
+    }
+
+def arbitrage_opportunity(market, date, legs, plan=None):
+    # One bet per outcome of the market; None unless the rounded stakes lock in a profit.
+    # The OddsTable engine passes plans it solved for the whole slate at once.
+    if plan is None:
+        if sum(1 / leg['Odds'] for leg in legs) >= 1:
+            return None
+        plan = solve_stakes([leg['Odds'] for leg in legs], limits=stake_limits([leg['Bookmaker'] for leg in legs]))
+    if plan is None or plan.profit <= MINIMUM_ARBITRAGE_PROFIT:
+        return None
+    return {
+        'Category': 'Arbitrage',
+        'Market': market,
+        'Date': date,
+        'Bets': [dict(leg, Stake=stake) for leg, stake in zip(legs, plan.stakes)],
+        'Profit': plan.profit / plan.investment * 100,
+        'Total Investment': plan.investment
+    }
 
 def find_arbitrage_opportunities(bets, sport):
     opportunities = []
     for market in ['moneyline', 'spread', 'total']:
         if market in bets:
-            # Group bets by date
-            bets_by_date = defaultdict(list)
+            # Group bets by date and line so prices are only compared on the same line
+            bets_by_key = defaultdict(list)
             for bet in bets[market]:
-                bet_date = datetime.strptime(bet['Start Time'], "%m/%d/%Y %I:%M %p EST").date()
-                bets_by_date[bet_date].append(bet)
+                bet_date = bet.commence_time.date()
+                bets_by_key[(bet_date, market_line(bet, market))].append(bet)
             
-            # Check for arbitrage opportunities within each date
-            for date, date_bets in bets_by_date.items():
+            # Check for arbitrage opportunities within each date and line
+            for (date, line), date_bets in bets_by_key.items():
                 if market == 'total':
-                    best_over = max(date_bets, key=lambda x: x['Over Odds'])
-                    best_under = max(date_bets, key=lambda x: x['Under Odds'])
-                    total_prob = (1 / best_over['Over Odds']) + (1 / best_under['Under Odds'])
-                    if total_prob < 1:
-                        over_stake = (1 / best_over['Over Odds']) / total_prob
-                        under_stake = (1 / best_under['Under Odds']) / total_prob
-                        min_stake = min(over_stake, under_stake)
-                        over_bet = 100 if over_stake == min_stake else 100 * (over_stake / min_stake)
-                        under_bet = 100 if under_stake == min_stake else 100 * (under_stake / min_stake)
-                        total_investment = over_bet + under_bet
-                        profit = (100 / total_prob) - total_investment
-                        profit_percentage = (profit / total_investment) * 100
-                        if profit > MINIMUM_ARBITRAGE_PROFIT:
-                            opportunities.append({
-                                'Market': 'Total',
-                                'Date': date.strftime("%m/%d/%Y"),
-                                'Bets': [
-                                    {'Type': 'Over', 'Odds': best_over['Over Odds'], 'Bookmaker': best_over['Bookmaker'], 'Total': best_over['Total'], 'Stake': over_bet},
-                                    {'Type': 'Under', 'Odds': best_under['Under Odds'], 'Bookmaker': best_under['Bookmaker'], 'Total': best_under['Total'], 'Stake': under_bet}
-                                ],
-                                'Profit': profit_percentage,
-                                'Total Investment': total_investment
-                            })
+                    best_over = max(date_bets, key=lambda x: x.over_odds)
+                    best_under = max(date_bets, key=lambda x: x.under_odds)
+                    legs = [{'Type': 'Over', 'Odds': best_over.over_odds, 'Bookmaker': BOOKMAKERS.name(best_over.bookmaker), 'Total': best_over.total},
+                            {'Type': 'Under', 'Odds': best_under.under_odds, 'Bookmaker': BOOKMAKERS.name(best_under.bookmaker), 'Total': best_under.total}]
                 else:
                     best_bets = {}
                     for bet in date_bets:
-                        outcome = bet['Team']
-                        if outcome not in best_bets or bet['Odds'] > best_bets[outcome]['Odds']:
+                        outcome = bet.team
+                        if outcome not in best_bets or bet.odds > best_bets[outcome].odds:
                             best_bets[outcome] = bet
                     
-                    # Check if we have odds for all possible outcomes
-                    if sport.lower()[:6] == 'soccer' and market == 'moneyline' and len(best_bets) == 3:
-                        total_prob = sum(1 / bet['Odds'] for bet in best_bets.values())
-                        if total_prob < 1:
-                            stakes = {team: (1 / bet['Odds']) / total_prob for team, bet in best_bets.items()}
-                            min_stake = min(stakes.values())
-                            normalized_stakes = {team: 100 if stake == min_stake else 100 * (stake / min_stake) for team, stake in stakes.items()}
-                            total_investment = sum(normalized_stakes.values())
-                            profit = (100 / total_prob) - total_investment
-                            profit_percentage = (profit / total_investment) * 100
-                            if profit > MINIMUM_ARBITRAGE_PROFIT:
-                                opportunities.append({
-                                    'Market': market.capitalize(),
-                                    'Date': date.strftime("%m/%d/%Y"),
-                                    'Bets': [{'Type': team, 'Odds': bet['Odds'], 'Bookmaker': bet['Bookmaker'], 'Stake': normalized_stakes[team]} for team, bet in best_bets.items()],
-                                    'Profit': profit_percentage,
-                                    'Total Investment': total_investment
-                                })
-                    elif len(best_bets) == 2:  # For non-soccer sports or other markets
-                        total_prob = sum(1 / bet['Odds'] for bet in best_bets.values())
-                        if total_prob < 1:
-                            stakes = {team: (1 / bet['Odds']) / total_prob for team, bet in best_bets.items()}
-                            min_stake = min(stakes.values())
-                            normalized_stakes = {team: 100 if stake == min_stake else 100 * (stake / min_stake) for team, stake in stakes.items()}
-                            total_investment = sum(normalized_stakes.values())
-                            payout = min(normalized_stakes[team] * bet['Odds'] for team, bet in best_bets.items())
-                            profit = payout - total_investment
-                            profit_percentage = (profit / total_investment) * 100
-                            if profit > MINIMUM_ARBITRAGE_PROFIT:
-                                opportunities.append({
-                                    'Market': market.capitalize(),
-                                    'Date': date.strftime("%m/%d/%Y"),
-                                    'Bets': [{'Type': team, 'Odds': bet['Odds'], 'Bookmaker': bet['Bookmaker'], 'Stake': normalized_stakes[team]} for team, bet in best_bets.items()],
-                                    'Profit': profit_percentage,
-                                    'Total Investment': total_investment
-                                })
-    return opportunities
+                    # Soccer moneylines need all three outcomes; everything else is two-way
+                    if not (len(best_bets) == 2 or (sport.lower()[:6] == 'soccer' and market == 'moneyline' and len(best_bets) == 3)):
+                        continue
+                    legs = [{'Type': TEAMS.name(team), 'Odds': bet.odds, 'Bookmaker': BOOKMAKERS.name(bet.bookmaker)} for team, bet in best_bets.items()]
+                    if market == 'spread':
+                        for leg, bet in zip(legs, best_bets.values()):
+                            leg['Spread'] = bet.spread
+                opportunity = arbitrage_opportunity(market.capitalize(), date.strftime("%m/%d/%Y"), legs)
+                if opportunity:
+                    opportunities.append(opportunity)
 
-def analyze_odds(filename):
-    games = defaultdict(lambda: defaultdict(lambda: defaultdict(list)))
-    positive_ev_bets = []
-    arbitrage_opportunities = []
+            # Cross-line pairs (e.g. Over 44.5 with Under 46.5) are reported separately as middles
+            if market != 'moneyline':
+                lines_by_date = defaultdict(dict)
+                for (date, line), line_bets in bets_by_key.items():
+                    lines_by_date[date][line] = line_bets
+                for date, line_bets in lines_by_date.items():
+                    for low, high in best_middle_pairs(*middle_sides(line_bets, market)):
+                        opportunity = middle_opportunity(market, date, low, high)
+                        if opportunity:
+                            opportunities.append(opportunity)
+    return opportunities
 
+def read_odds_csv(filename):
     with open(filename, mode='r', encoding='utf-8') as file:
         csv_reader = csv.DictReader(file)
         
         for row in csv_reader:
-            sport = row['Sport']
-            game_key = f"{row['Home Team']} vs {row['Away Team']}"
-            start_time = row['Start Time']
-            bookmaker = row['Bookmaker'].lower()
-            
-            if not is_within_time_range(start_time) or bookmaker not in ALLOWED_BOOKMAKERS:
+            values = [row.get(header, 'N/A') for header in CSV_HEADERS]
+            odds = [None if value in ('N/A', '', None) else float(value) for value in values[5:]]
+            yield OddsRow(*values[:5], *odds)
+
+def iter_odds_rows(source):
+    # Accepts a snapshot CSV path, the all_data dict from the fetcher, or OddsRow records
+    if isinstance(source, (str, os.PathLike)):
+        return read_odds_csv(source)
+    if isinstance(source, dict):
+        return flatten_odds(source)
+    return iter(source)
+
+def row_quotes(row, bookmaker, commence_time, est_start_time):
+    # Quote records for one bookmaker row, as (market, quote) pairs
+    quotes = []
+    home_team = TEAMS.intern(row.home_team)
+    away_team = TEAMS.intern(row.away_team)
+    
+    # Process moneyline (h2h) bets
+    if row.home_odds is not None and row.away_odds is not None:
+        home_odds = row.home_odds
+        away_odds = row.away_odds
+        
+        quotes.append(('moneyline', SideQuote(
+            home_team, away_team, bookmaker, home_odds, calculate_implied_probability(home_odds),
+            commence_time, est_start_time, HOME)))
+        
+        quotes.append(('moneyline', SideQuote(
+            away_team, home_team, bookmaker, away_odds, calculate_implied_probability(away_odds),
+            commence_time, est_start_time, AWAY)))
+        
+        # Add draw bet if available (for soccer)
+        if row.sport.lower()[:6] == 'soccer' and row.draw_odds is not None:
+            draw_odds = row.draw_odds
+            quotes.append(('moneyline', SideQuote(
+                DRAW_OUTCOME, None, bookmaker, draw_odds, calculate_implied_probability(draw_odds),
+                commence_time, est_start_time, DRAW)))
+    
+    # Process spread bets
+    if row.home_spread is not None and row.home_spread_odds is not None and row.away_spread_odds is not None:
+        home_spread = row.home_spread
+        home_spread_odds = row.home_spread_odds
+        away_spread = -home_spread
+        away_spread_odds = row.away_spread_odds
+        
+        quotes.append(('spread', SideQuote(
+            home_team, away_team, bookmaker, home_spread_odds, calculate_implied_probability(home_spread_odds),
+            commence_time, est_start_time, HOME, home_spread)))
+        
+        quotes.append(('spread', SideQuote(
+            away_team, home_team, bookmaker, away_spread_odds, calculate_implied_probability(away_spread_odds),
+            commence_time, est_start_time, AWAY, away_spread)))
+    
+    # Process total (over/under) bets
+    if row.over is not None and row.over_odds is not None and row.under_odds is not None:
+        total = row.over
+        over_odds = row.over_odds
+        under_odds = row.under_odds
+        
+        quotes.append(('total', TotalQuote(
+            total, bookmaker, over_odds, under_odds,
+            calculate_implied_probability(over_odds), calculate_implied_probability(under_odds),
+            commence_time, est_start_time)))
+    return quotes
+
+def collect_quotes(source, now=None):
+    games = defaultdict(lambda: defaultdict(lambda: defaultdict(list)))
+    event_times = EventTimes(now)
+    quotes = 0
+
+    with METRICS.timer('parse'):
+        for row in iter_odds_rows(source):
+            bookmaker = BOOKMAKERS.intern(row.bookmaker)
+            if not in_mask(ALLOWED_BOOKMAKER_MASK, bookmaker):
+                continue
+            commence_time, est_start_time, in_window = event_times.get(row.start_time)
+            if not in_window:
                 continue
-            
-            est_start_time = format_est_time(parse_and_convert_to_est(start_time))
-            
-            # Process moneyline (h2h) bets
-            if row['Home Odds'] != 'N/A' and row['Away Odds'] != 'N/A':
-                home_odds = float(row['Home Odds'])
-                away_odds = float(row['Away Odds'])
-                
-                games[sport][game_key]['moneyline'].append({
-                    'Team': row['Home Team'],
-                    'Opponent': row['Away Team'],
-                    'Bookmaker': bookmaker,
-                    'Odds': home_odds,
-                    'Implied Probability': calculate_implied_probability(home_odds),
-                    'Start Time': est_start_time,
-                    'Bet Type': 'Moneyline'
-                })
-                
-                games[sport][game_key]['moneyline'].append({
-                    'Team': row['Away Team'],
-                    'Opponent': row['Home Team'],
-                    'Bookmaker': bookmaker,
-                    'Odds': away_odds,
-                    'Implied Probability': calculate_implied_probability(away_odds),
-                    'Start Time': est_start_time,
-                    'Bet Type': 'Moneyline'
-                })
-                
-                # Add draw bet if available (for soccer)
-                if sport.lower()[:6] == 'soccer' and 'Draw Odds' in row and row['Draw Odds'] != 'N/A':
-                    draw_odds = float(row['Draw Odds'])
-                    games[sport][game_key]['moneyline'].append({
-                        'Team': 'Draw',
-                        'Bookmaker': bookmaker,
-                        'Odds': draw_odds,
-                        'Implied Probability': calculate_implied_probability(draw_odds),
-                        'Start Time': est_start_time,
-                        'Bet Type': 'Moneyline'
-                    })
-            
-            # Process spread bets
-            if row['Home Spread'] != 'N/A' and row['Home Spread Odds'] != 'N/A':
-                home_spread = float(row['Home Spread'])
-                home_spread_odds = float(row['Home Spread Odds'])
-                away_spread = -home_spread
-                away_spread_odds = float(row['Away Spread Odds'])
-                
-                games[sport][game_key]['spread'].append({
-                    'Team': row['Home Team'],
-                    'Opponent': row['Away Team'],
-                    'Bookmaker': bookmaker,
-                    'Spread': home_spread,
-                    'Odds': home_spread_odds,
-                    'Implied Probability': calculate_implied_probability(home_spread_odds),
-                    'Start Time': est_start_time,
-                    'Bet Type': 'Spread'
-                })
-                
-                games[sport][game_key]['spread'].append({
-                    'Team': row['Away Team'],
-                    'Opponent': row['Home Team'],
-                    'Bookmaker': bookmaker,
-                    'Spread': away_spread,
-                    'Odds': away_spread_odds,
-                    'Implied Probability': calculate_implied_probability(away_spread_odds),
-                    'Start Time': est_start_time,
-                    'Bet Type': 'Spread'
-                })
-            
-            # Process total (over/under) bets
-            if row['Over'] != 'N/A' and row['Over Odds'] != 'N/A' and row['Under Odds'] != 'N/A':
-                total = float(row['Over'])
-                over_odds = float(row['Over Odds'])
-                under_odds = float(row['Under Odds'])
-                
-                games[sport][game_key]['total'].append({
-                    'Total': total,
-                    'Bookmaker': bookmaker,
-                    'Over Odds': over_odds,
-                    'Under Odds': under_odds,
-                    'Over Implied Probability': calculate_implied_probability(over_odds),
-                    'Under Implied Probability': calculate_implied_probability(under_odds),
-                    'Start Time': est_start_time,
-                    'Bet Type': 'Total'
-                })
+
+            game = games[row.sport][f"{row.home_team} vs {row.away_team}"]
+            for market, quote in row_quotes(row, bookmaker, commence_time, est_start_time):
+                game[market].append(quote)
+                quotes += 1
+
+    METRICS.increment('quotes', quotes)
+    METRICS.increment('games', sum(len(sport_games) for sport_games in games.values()))
+    return games
+
+def outcome_quotes(bet, market):
+    # (outcome, implied probability) pairs a quote adds to its line's consensus
+    if market == 'total':
+        return ((OVER_OUTCOME, bet.over_implied_probability), (UNDER_OUTCOME, bet.under_implied_probability))
+    return ((bet.team, bet.implied_probability),)
+
+def market_consensus(markets, method=None):
+    # Fair probability of every outcome on every line of the given (key, market, bets) markets, all
+    # de-vigged in one vectorized pass: {key: {(line, outcome): probability}}
+    line_ids = {}
+    outcome_ids = {}
+    outcome_lines = []
+    outcomes = []
+    implied_probabilities = []
+    bookmakers = []
+    for key, market, bets in markets:
+        for bet in bets:
+            line = (key, market_line(bet, market))
+            line_id = line_ids.setdefault(line, len(line_ids))
+            for outcome, probability in outcome_quotes(bet, market):
+                outcome_id = outcome_ids.setdefault((line, outcome), len(outcome_ids))
+                if outcome_id == len(outcome_lines):
+                    outcome_lines.append(line_id)
+                outcomes.append(outcome_id)
+                implied_probabilities.append(probability)
+                bookmakers.append(bet.bookmaker)
+
+    weight_by_bookmaker = dict(zip(set(bookmakers), bookmaker_weights([BOOKMAKERS.name(b) for b in set(bookmakers)]).tolist()))
+    fair = fair_probabilities(implied_probabilities, [weight_by_bookmaker[b] for b in bookmakers], outcomes,
+                              outcome_lines, method).tolist()
+    consensus = defaultdict(dict)
+    for ((key, line), outcome), outcome_id in outcome_ids.items():
+        consensus[key][(line, outcome)] = fair[outcome_id]
+    return consensus
+
+def positive_ev_bet(sport, game, bet_type, bet, odds, ev):
+    return {
+        'Sport': sport,
+        'Game': game,
+        'Bookmaker': BOOKMAKERS.name(bet.bookmaker),
+        'Bet Type': bet_type,
+        'Odds': odds,
+        'EV': ev,
+        'Start Time': bet.start_time,
+        'Commence Time': bet.commence_time
+    }
+
+def find_positive_ev_bets(bets, market, sport, game, consensus=None):
+    # consensus: this market's fair probabilities from market_consensus; analyze_odds solves every market
+    # of the snapshot at once and passes them in
+    if consensus is None:
+        consensus = market_consensus([(None, market, bets)])[None]
+    positive_ev_bets = []
+    # Evaluate each line on its own so quotes on different spreads/totals never mix
+    for line, line_bets in group_bets_by_line(bets, market).items():
+        if market == 'total':
+            for bet in line_bets:
+                for side, outcome, odds in (('Over', OVER_OUTCOME, bet.over_odds), ('Under', UNDER_OUTCOME, bet.under_odds)):
+                    ev = calculate_ev(odds, consensus[(line, outcome)])
+                    if MIN_EV_THRESHOLD <= ev <= MAX_EV_THRESHOLD:
+                        bet_info = positive_ev_bet(sport, game, f'Total {side}', bet, odds, ev)
+                        bet_info['Total'] = bet.total
+                        positive_ev_bets.append(bet_info)
+            continue
+
+        # For soccer moneyline, only consider if all three outcomes are present
+        if sport.lower()[:6] == 'soccer' and market == 'moneyline':
+            outcomes = set(bet.team for bet in line_bets)
+            if len(outcomes) != 3 or DRAW_OUTCOME not in outcomes:
+                continue
+
+        for bet in line_bets:
+            ev = calculate_ev(bet.odds, consensus[(line, bet.team)])
+            if MIN_EV_THRESHOLD <= ev <= MAX_EV_THRESHOLD:
+                bet_info = positive_ev_bet(sport, game, MARKET_BET_TYPES[market], bet, bet.odds, ev)
+                bet_info['Team'] = TEAMS.name(bet.team)
+                if market == 'spread':
+                    bet_info['Spread'] = bet.spread
+                positive_ev_bets.append(bet_info)
+
+    return positive_ev_bets
+
+def record_results(positive_ev_bets, arbitrage_opportunities):
+    METRICS.increment('ev_bets', len(positive_ev_bets))
+    for category in ('Arbitrage', 'Middle'):
+        METRICS.increment('opportunities', sum(1 for opportunity in arbitrage_opportunities
+                                               if opportunity['Category'] == category), category=category)
+
+def analyze_odds(source, now=None, workers=None):
+    workers = ANALYSIS_WORKERS if workers is None else workers
+    if workers > 1:
+        return analyze_odds_parallel(source, now, workers)
+    games = collect_quotes(source, now)
+    positive_ev_bets = []
+    arbitrage_opportunities = []
+    arbitrage_time = ev_time = 0
+
+    start = time.perf_counter()
+    consensus = market_consensus(((sport, game, market), market, bets) for sport, sport_games in games.items()
+                                 for game, data in sport_games.items() for market, bets in data.items())
+    ev_time += time.perf_counter() - start
 
     for sport, sport_games in games.items():
         for game, data in sport_games.items():
-            arbitrage_opportunities.extend(find_arbitrage_opportunities(data, sport))
+            start = time.perf_counter()
+            for opportunity in find_arbitrage_opportunities(data, sport):
+                opportunity['Sport'] = sport
+                opportunity['Game'] = game
+                arbitrage_opportunities.append(opportunity)
+            arbitrage_time += time.perf_counter() - start
             
+            start = time.perf_counter()
             for market in ['moneyline', 'spread', 'total']:
                 if market in data:
-                    if market == 'total':
-                        best_odds = max(data[market], key=lambda x: max(x['Over Odds'], x['Under Odds']))
-                        total_implied_prob = best_odds['Over Implied Probability'] + best_odds['Under Implied Probability']
-                        true_prob_over = best_odds['Over Implied Probability'] / total_implied_prob
-                        true_prob_under = best_odds['Under Implied Probability'] / total_implied_prob
-                        
-                        ev_over = calculate_ev(best_odds['Over Odds'], true_prob_over)
-                        ev_under = calculate_ev(best_odds['Under Odds'], true_prob_under)
-                        
-                        if MIN_EV_THRESHOLD <= ev_over <= MAX_EV_THRESHOLD:
-                            positive_ev_bets.append({
-                                'Sport': sport,
-                                'Game': game,
-                                'Bookmaker': best_odds['Bookmaker'],
-                                'Bet Type': 'Total Over',
-                                'Total': best_odds['Total'],
-                                'Odds': best_odds['Over Odds'],
-                                'EV': ev_over,
-                                'Start Time': best_odds['Start Time']
-                            })
-                        
-                        if MIN_EV_THRESHOLD <= ev_under <= MAX_EV_THRESHOLD:
-                            positive_ev_bets.append({
-                                'Sport': sport,
-                                'Game': game,
-                                'Bookmaker': best_odds['Bookmaker'],
-                                'Bet Type': 'Total Under',
-                                'Total': best_odds['Total'],
-                                'Odds': best_odds['Under Odds'],
-                                'EV': ev_under,
-                                'Start Time': best_odds['Start Time']
-                            })
-                    else:
-                        if sport.lower()[:6] == 'soccer' and market == 'moneyline':
-                            # For soccer moneyline, only consider if all three outcomes are present
-                            outcomes = set(bet['Team'] for bet in data[market])
-                            if len(outcomes) == 3 and 'Draw' in outcomes:
-                                # Group bets by outcome
-                                bets_by_outcome = {outcome: [] for outcome in outcomes}
-                                for bet in data[market]:
-                                    bets_by_outcome[bet['Team']].append(bet)
-                                
-                                # Calculate average true probability for each outcome
-                                avg_true_probs = {}
-                                for outcome, bets in bets_by_outcome.items():
-                                    implied_probs = [1 / bet['Odds'] for bet in bets]
-                                    avg_implied_prob = sum(implied_probs) / len(implied_probs)
-                                    avg_true_probs[outcome] = avg_implied_prob
-                                
-                                # Normalize probabilities
-                                total_prob = sum(avg_true_probs.values())
-                                for outcome in avg_true_probs:
-                                    avg_true_probs[outcome] /= total_prob
-                                
-                                # Now evaluate each bet using the average true probabilities
-                                for bet in data[market]:
-                                    true_prob = avg_true_probs[bet['Team']]
-                                    ev = calculate_ev(bet['Odds'], true_prob)
-                                    
-                                    if MIN_EV_THRESHOLD <= ev <= MAX_EV_THRESHOLD:
-                                        positive_ev_bets.append({
-                                            'Sport': sport,
-                                            'Game': game,
-                                            'Team': bet['Team'],
-                                            'Bookmaker': bet['Bookmaker'],
-                                            'Bet Type': bet['Bet Type'],
-                                            'Odds': bet['Odds'],
-                                            'EV': ev,
-                                            'Start Time': bet['Start Time']
-                                        })
-                        else:
-                            # For non-soccer sports or other markets
-                            # Group bets by outcome
-                            outcomes = set(bet['Team'] for bet in data[market])
-                            bets_by_outcome = {outcome: [] for outcome in outcomes}
-                            for bet in data[market]:
-                                bets_by_outcome[bet['Team']].append(bet)
-                            
-                            # Calculate average true probability for each outcome
-                            avg_true_probs = {}
-                            for outcome, bets in bets_by_outcome.items():
-                                implied_probs = [1 / bet['Odds'] for bet in bets]
-                                avg_implied_prob = sum(implied_probs) / len(implied_probs)
-                                avg_true_probs[outcome] = avg_implied_prob
-                            
-                            # Normalize probabilities
-                            total_prob = sum(avg_true_probs.values())
-                            for outcome in avg_true_probs:
-                                avg_true_probs[outcome] /= total_prob
-                            
-                            # Now evaluate each bet using the average true probabilities
-                            for bet in data[market]:
-                                true_prob = avg_true_probs[bet['Team']]
-                                ev = calculate_ev(bet['Odds'], true_prob)
-                                print(bet['Team'], ev)
-                                if MIN_EV_THRESHOLD <= ev <= MAX_EV_THRESHOLD:
-                                    bet_info = {
-                                        'Sport': sport,
-                                        'Game': game,
-                                        'Team': bet['Team'],
-                                        'Bookmaker': bet['Bookmaker'],
-                                        'Bet Type': bet['Bet Type'],
-                                        'Odds': bet['Odds'],
-                                        'EV': ev,
-                                        'Start Time': bet['Start Time']
-                                    }
-                                    if market == 'spread':
-                                        bet_info['Spread'] = bet['Spread']
-                                    positive_ev_bets.append(bet_info)
+                    positive_ev_bets.extend(find_positive_ev_bets(data[market], market, sport, game,
+                                                                  consensus[(sport, game, market)]))
+            ev_time += time.perf_counter() - start
 
+    METRICS.observe('arbitrage_scan', arbitrage_time)
+    METRICS.observe('ev_scan', ev_time)
+    record_results(positive_ev_bets, arbitrage_opportunities)
+    return positive_ev_bets, games, arbitrage_opportunities
+
+def game_chunks(rows, count):
+    # Rows grouped by game, with games in the order collect_quotes meets them (sport first), cut into at
+    # most count contiguous chunks of similar size
+    sports = {}
+    for row in rows:
+        sports.setdefault(row.sport, {}).setdefault((row.home_team, row.away_team), []).append(row)
+    target = len(rows) / count
+    chunks = [[]]
+    size = 0
+    for sport_games in sports.values():
+        for game_rows in sport_games.values():
+            if size >= target * len(chunks):
+                chunks.append([])
+            chunks[-1].extend(game_rows)
+            size += len(game_rows)
+    return [chunk for chunk in chunks if chunk]
+
+def analyze_chunk(rows, now, settings):
+    # Runs in a worker process. It gets plain OddsRow tuples and returns plain result dicts, its games
+    # as plain dicts with the symbol names their ids refer to, and what it recorded in METRICS. The
+    # parent's settings come along, as a long-lived pool may predate a reload.
+    configure(*settings)
+    METRICS.reset()
+    positive_ev_bets, games, arbitrage_opportunities = analyze_odds(rows, now, workers=1)
+    games = {sport: {game: dict(data) for game, data in sport_games.items()} for sport, sport_games in games.items()}
+    return (positive_ev_bets, arbitrage_opportunities, games, list(BOOKMAKERS.names), list(TEAMS.names),
+            METRICS.state())
+
+def translate_quotes(games, bookmaker_names, team_names):
+    # Quotes collected in another process carry its symbol ids; they are rewritten to this process's.
+    # Forked workers start from the parent's tables, so usually there is nothing to rewrite.
+    bookmakers = [BOOKMAKERS.intern(name) for name in bookmaker_names]
+    teams = [TEAMS.intern(name) for name in team_names]
+    if bookmakers == list(range(len(bookmakers))) and teams == list(range(len(teams))):
+        return games
+    for sport_games in games.values():
+        for data in sport_games.values():
+            for market, quotes in data.items():
+                if market == 'total':
+                    data[market] = [quote._replace(bookmaker=bookmakers[quote.bookmaker]) for quote in quotes]
+                else:
+                    data[market] = [quote._replace(team=teams[quote.team], bookmaker=bookmakers[quote.bookmaker],
+                                                   opponent=None if quote.opponent is None else teams[quote.opponent])
+                                    for quote in quotes]
+    return games
+
+def analyze_odds_parallel(source, now=None, workers=None, executor=None):
+    # Games are independent, so each worker analyzes a contiguous chunk of them; concatenating the chunk
+    # results in order gives exactly the sequential results and ordering. Every row is parsed once, in
+    # the worker that analyzes it, and the workers' games and metrics are merged here. executor, if
+    # given, must be a process pool. With one worker this is just analyze_odds.
+    workers = ANALYSIS_WORKERS if workers is None else workers
+    if workers <= 1:
+        return analyze_odds(source, now, workers=1)
+    now = now or datetime.now(EST)
+    rows = list(iter_odds_rows(source))
+    own_executor = executor is None
+    if own_executor:
+        executor = ProcessPoolExecutor(max_workers=workers)
+    try:
+        with METRICS.timer('analyze_parallel', workers=workers):
+            settings = analysis_settings()
+            futures = [executor.submit(analyze_chunk, chunk, now, settings)
+                       for chunk in game_chunks(rows, workers * CHUNKS_PER_WORKER)]
+            positive_ev_bets = []
+            arbitrage_opportunities = []
+            games = {}
+            for future in futures:
+                chunk_bets, chunk_opportunities, chunk_games, bookmaker_names, team_names, metrics = future.result()
+                positive_ev_bets.extend(chunk_bets)
+                arbitrage_opportunities.extend(chunk_opportunities)
+                for sport, sport_games in translate_quotes(chunk_games, bookmaker_names, team_names).items():
+                    games.setdefault(sport, {}).update(sport_games)
+                METRICS.merge(metrics)
+    finally:
+        if own_executor:
+            executor.shutdown()
     return positive_ev_bets, games, arbitrage_opportunities
 
 def format_bet_recommendation(bet):
@@ -362,80 +541,50 @@ def format_bet_recommendation(bet):
     return base_string
 
 def format_arbitrage_opportunity(opportunity):
-    base_string = (f"Market: {opportunity['Market']}\n"
-                   f"Date: {opportunity['Date']}\n"
-                   f"Profit: {opportunity['Profit']:.2f}%\n"
-                   f"Total Investment: {opportunity['Total Investment']:.2f}\n"
-                   f"Bets:\n")
-    
+    # Lines are collected and joined once; reports list thousands of these on a large slate
+    parts = [f"{opportunity['Sport']} - {opportunity['Game']}\n"] if 'Game' in opportunity else []
+    parts.append(f"Category: {opportunity.get('Category', 'Arbitrage')}\n"
+                 f"Market: {opportunity['Market']}\n"
+                 f"Date: {opportunity['Date']}\n"
+                 f"Profit: {opportunity['Profit']:.2f}%\n")
+    if 'Middle Profit' in opportunity:
+        parts.append(f"Profit If Middle Hits: {opportunity['Middle Profit']:.2f}%\n"
+                     f"Middle Width: {opportunity['Middle Width']}\n")
+    parts.append(f"Total Investment: {opportunity['Total Investment']:.2f}\n"
+                 f"Bets:\n")
+
     for bet in opportunity['Bets']:
         american_odds = decimal_to_american(bet['Odds'])
-        base_string += (f"  - Type: {bet['Type']}\n"
-                        f"    Bookmaker: {bet['Bookmaker']}\n"
-                        f"    Odds: {bet['Odds']:.2f} (Decimal) / {american_odds} (American)\n"
-                        f"    Stake: {bet['Stake']:.2f}\n")
+        parts.append(f"  - Type: {bet['Type']}\n"
+                     f"    Bookmaker: {bet['Bookmaker']}\n"
+                     f"    Odds: {bet['Odds']:.2f} (Decimal) / {american_odds} (American)\n"
+                     f"    Stake: {bet['Stake']:.2f}\n")
+        if 'Spread' in bet:
+            parts.append(f"    Spread: {bet['Spread']}\n")
         if 'Total' in bet:
-            base_string += f"    Total: {bet['Total']}\n"
-    
-    return base_string
+            parts.append(f"    Total: {bet['Total']}\n")
 
-def main(filename):
-    positive_ev_bets, games, arbitrage_opportunities = analyze_odds(filename)
-    
-    os.makedirs('logs', exist_ok=True)
-    log_filename = f"logs/betting_recommendations_{datetime.now(EST).strftime('%Y%m%d_%H%M%S')}.txt"
-    
-    with open(log_filename, 'w') as log_file:
-        log_file.write("Betting Recommendations:\n\n")
-        
-        log_file.write("Configuration:\n")
-        log_file.write(f"Allowed Bookmakers: {', '.join(ALLOWED_BOOKMAKERS)}\n")
-        log_file.write(f"Max Days Ahead: {MAX_DAYS_AHEAD}\n")
-        log_file.write(f"Max Opportunities Per Game: {MAX_OPPORTUNITIES_PER_GAME}\n")
-        log_file.write(f"EV Range: {MIN_EV_THRESHOLD:.2%} to {MAX_EV_THRESHOLD:.2%}\n\n")
-
-        log_file.write("Data Summary:\n")
-        for sport, sport_games in games.items():
-            log_file.write(f"{sport}:\n")
-            for game, data in sport_games.items():
-                log_file.write(f"  {game}:\n")
-                for market in ['moneyline', 'spread', 'total']:
-                    if market in data:
-                        log_file.write(f"    {market.capitalize()}: {len(data[market])} odds\n")
-        log_file.write("\n")
-
-        if positive_ev_bets:
-            log_file.write("High Value Bets:\n")
-            for bet in sorted(positive_ev_bets, key=lambda x: x['EV'], reverse=True)[:10]:  # Top 10 EV bets
-                log_file.write(format_bet_recommendation(bet))
-                log_file.write("\n")
-        else:
-            log_file.write("No high value bets found.\n")
+    return ''.join(parts)
 
-        if arbitrage_opportunities:
-            log_file.write("\nArbitrage Opportunities:\n")
-            for opportunity in sorted(arbitrage_opportunities, key=lambda x: x['Profit'], reverse=True):
-                log_file.write(format_arbitrage_opportunity(opportunity))
-                log_file.write("\n")
-        else:
-            log_file.write("\nNo arbitrage opportunities found.\n")
-
-        # Summary at the bottom
-        log_file.write("\nBetting Strategy Summary:\n")
-        log_file.write(f"- High Value Bets: {len(positive_ev_bets)}\n")
-        log_file.write(f"- Arbitrage Opportunities: {len(arbitrage_opportunities)}\n")
-
-    print(f"Betting recommendations have been saved to {log_filename}")
-    
-    # Print the summary to the console
-    with open(log_filename, 'r') as log_file:
-        content = log_file.read()
-        print(content)
-    
-    return log_filename
+def main(source, notifier=None, fetched_at=None, store=None, sections=None, console=None, now=None):
+    # store: an OpportunityStore that keeps every opportunity found, for querying later. The report is
+    # rendered once and printed to console (sys.stdout by default); sections picks what it includes
+    # (see analysis.report). EV bets given a stake by the portfolio carry it as 'Stake'. now: the time
+    # the odds were captured, for analyzing an old snapshot; the current time by default.
+    from analysis.report import write_report  # analysis.report imports this module
+    positive_ev_bets, games, arbitrage_opportunities = analyze_odds(source, now)
+    with METRICS.timer('portfolio'):
+        portfolio = size_portfolio(positive_ev_bets, arbitrage_opportunities)
+    for position in portfolio.positions:
+        if position.category == 'EV':
+            position.candidate['Stake'] = position.stake
+    if notifier is not None:
+        notifier.publish(arbitrage_opportunities, positive_ev_bets, fetched_at)
+    if store is not None:
+        store.record(positive_ev_bets, arbitrage_opportunities, fetched_at)
+    return write_report(positive_ev_bets, games, arbitrage_opportunities, sections, console, portfolio=portfolio)
 
 if __name__ == "__main__":
-    import sys
     if len(sys.argv) != 2:
         print("Usage: python script_name.py <path_to_csv_file>")
         sys.exit(1)
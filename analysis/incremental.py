@@ -0,0 +1,157 @@
+import time
+from collections import defaultdict
+from typing import NamedTuple
+
+from analysis import ev_analysis
+from analysis.ev_analysis import (EventTimes, find_arbitrage_opportunities,
+                                  find_positive_ev_bets, iter_odds_rows, market_consensus, row_quotes)
+from analysis.quotes import BOOKMAKERS, in_mask
+from monitoring.metrics import METRICS
+
+class Delta(NamedTuple):
+    # Results that appeared, changed price or dropped out since the previous snapshot
+    new: list
+    changed: list
+    expired: list
+
+def bet_key(bet):
+    return (bet['Sport'], bet['Game'], bet['Bet Type'], bet.get('Team'), bet['Bookmaker'],
+            bet.get('Spread'), bet.get('Total'))
+
+def opportunity_key(opportunity):
+    return (opportunity['Sport'], opportunity['Game'], opportunity['Category'], opportunity['Market'],
+            opportunity['Date'], tuple((bet['Type'], bet['Bookmaker'], bet.get('Spread'), bet.get('Total'))
+                                       for bet in opportunity['Bets']))
+
+def bet_value(bet):
+    return bet['Odds'], bet['EV']
+
+def opportunity_value(opportunity):
+    return tuple(bet['Odds'] for bet in opportunity['Bets']), opportunity['Profit']
+
+def diff_results(previous, current, key, value):
+    old = {key(result): result for result in previous}
+    new = {key(result): result for result in current}
+    return Delta([result for k, result in new.items() if k not in old],
+                 [result for k, result in new.items() if k in old and value(old[k]) != value(result)],
+                 [result for k, result in old.items() if k not in new])
+
+def evaluate_market(sport, game, market, bets, consensus=None):
+    opportunities = find_arbitrage_opportunities({market: bets}, sport)
+    for opportunity in opportunities:
+        opportunity['Sport'] = sport
+        opportunity['Game'] = game
+    return find_positive_ev_bets(bets, market, sport, game, consensus), opportunities
+
+class IncrementalAnalyzer:
+    # Keeps the previous snapshot's bookmaker rows and per-market results. A row that comes back
+    # unchanged reuses its quote records, and only the (event, market) pairs where some bookmaker's
+    # quotes changed, appeared or disappeared are re-evaluated. Rows are held per bookmaker and start
+    # time, so games of the same matchup on different dates (a series, a rematch) keep their own rows
+    # and are analyzed together under the one game name, as analyze_odds does. watched_bookmakers: books outside
+    # ALLOWED_BOOKMAKERS whose changed rows are still reported in changed_rows (for the line history)
+    # but never analyzed.
+    def __init__(self, watched_bookmakers=()):
+        self.watched = {BOOKMAKERS.intern(bookmaker) for bookmaker in watched_bookmakers}
+        self.watched_rows = {}
+        self.events = {}
+        self.results = {}
+        self.markets_evaluated = 0
+        self.changed_rows = []  # (event, quotes) of the bookmaker rows that changed in the last update
+        self.invalidated = False
+
+    def invalidate(self):
+        # The analysis settings changed: the next update re-evaluates every market, not just the ones
+        # whose quotes moved. Bookmakers or events that the new settings filter out still drop out as
+        # usual, and the results are diffed against the old ones.
+        self.invalidated = True
+
+    def update(self, source, now=None):
+        start = time.perf_counter()
+        event_times = EventTimes(now)
+        events = defaultdict(dict)
+        changed = set()
+        changed_rows = []
+        watched_rows = {}
+
+        for row in iter_odds_rows(source):
+            bookmaker = BOOKMAKERS.intern(row.bookmaker)
+            allowed = in_mask(ev_analysis.ALLOWED_BOOKMAKER_MASK, bookmaker)
+            if not allowed and bookmaker not in self.watched:
+                continue
+            commence_time, est_start_time, in_window = event_times.get(row.start_time)
+            if not in_window:
+                continue
+
+            event = (row.sport, f"{row.home_team} vs {row.away_team}")
+            slot = (bookmaker, row.start_time)
+            if not allowed:
+                watched_rows[event + slot] = row
+                if self.watched_rows.get(event + slot) != row:
+                    changed_rows.append((event, row_quotes(row, bookmaker, commence_time, est_start_time)))
+                continue
+            previous = self.events.get(event, {}).get(slot)
+            if previous is not None and previous[0] == row:
+                events[event][slot] = previous
+                continue
+            quotes = row_quotes(row, bookmaker, commence_time, est_start_time)
+            events[event][slot] = (row, quotes)
+            changed_rows.append((event, quotes))
+            changed.update(event + (market,) for market, _ in quotes)
+            if previous is not None:
+                changed.update(event + (market,) for market, _ in previous[1])
+
+        # Bookmakers (or whole events) that dropped out of the snapshot
+        for event, slots in self.events.items():
+            for slot, (row, quotes) in slots.items():
+                if slot not in events.get(event, ()):
+                    changed.update(event + (market,) for market, _ in quotes)
+
+        if self.invalidated:
+            changed.update(self.results)
+            self.invalidated = False
+
+        METRICS.observe('parse', time.perf_counter() - start)
+        start = time.perf_counter()
+        previous_bets, previous_opportunities = [], []
+        current_bets, current_opportunities = [], []
+        changed_bets = {}
+        for sport, game, market in changed:
+            positive_ev_bets, opportunities = self.results.pop((sport, game, market), ([], []))
+            previous_bets.extend(positive_ev_bets)
+            previous_opportunities.extend(opportunities)
+            changed_bets[(sport, game, market)] = [quote for _, quotes in events.get((sport, game), {}).values()
+                                                   for quote_market, quote in quotes if quote_market == market]
+
+        # Every changed market is de-vigged in one pass
+        consensus = market_consensus((key, key[2], bets) for key, bets in changed_bets.items())
+        for (sport, game, market), bets in changed_bets.items():
+            if bets:
+                positive_ev_bets, opportunities = evaluate_market(sport, game, market, bets,
+                                                                  consensus[(sport, game, market)])
+                self.results[(sport, game, market)] = (positive_ev_bets, opportunities)
+                current_bets.extend(positive_ev_bets)
+                current_opportunities.extend(opportunities)
+
+        self.events = events
+        self.watched_rows = watched_rows
+        self.changed_rows = changed_rows
+        self.markets_evaluated = len(changed)
+        METRICS.observe('incremental_scan', time.perf_counter() - start)
+        METRICS.set_gauge('markets_evaluated', len(changed))
+        METRICS.set_gauge('markets_tracked', len(self.results))
+        METRICS.set_gauge('open_ev_bets', sum(len(bets) for bets, _ in self.results.values()))
+        for category in ('Arbitrage', 'Middle'):
+            METRICS.set_gauge('open_opportunities', sum(1 for _, opportunities in self.results.values()
+                                                        for opportunity in opportunities
+                                                        if opportunity['Category'] == category), category=category)
+        return (diff_results(previous_bets, current_bets, bet_key, bet_value),
+                diff_results(previous_opportunities, current_opportunities, opportunity_key, opportunity_value))
+
+    @property
+    def positive_ev_bets(self):
+        return [bet for positive_ev_bets, _ in self.results.values() for bet in positive_ev_bets]
+
+    @property
+    def arbitrage_opportunities(self):
+        return [opportunity for _, opportunities in self.results.values() for opportunity in opportunities]
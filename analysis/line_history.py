@@ -0,0 +1,161 @@
+import heapq
+from typing import NamedTuple
+
+import numpy as np
+
+from analysis.ev_analysis import market_line
+from analysis.quotes import BOOKMAKERS, OVER_OUTCOME, TEAMS, UNDER_OUTCOME
+
+HISTORY_LENGTH = 8  # Price changes kept per (event, market, line, outcome, bookmaker); older ones are overwritten
+INITIAL_CAPACITY = 4096  # Quote slots allocated up front; doubled whenever they run out
+SHARP_BOOKMAKERS = {'betonlineag', 'pinnacle', 'circasports'}  # Books whose moves alone count as steam
+STEAM_WINDOW = 10 * 60  # Seconds over which a price move is measured
+STEAM_MOVE = 0.03  # Change in implied probability that counts as a move
+STEAM_MIN_BOOKS = 3  # Books moving the same way within the window that make steam without a sharp book
+LAG_THRESHOLD = 0.02  # How far a book's implied probability may trail the movers' before it is flagged as lagging
+
+class SteamMove(NamedTuple):
+    sport: str
+    game: str
+    market: str
+    line: float
+    outcome: str
+    direction: int  # +1 when the outcome shortened (implied probability up), -1 when it drifted
+    movers: tuple  # Bookmakers that moved
+    lagging: tuple  # (bookmaker, odds) of books still offering the pre-move price
+    consensus_odds: float  # Average price of the movers after the move
+
+class LineHistory:
+    # Rolling price history per quote, held in preallocated numpy rings: one row per quote slot,
+    # a head index per row, and a free list so slots of finished events are reused. A quote is
+    # written only when its price changes, and every update, lookup and eviction touches a fixed
+    # number of entries, so the cost per quote does not grow with the size of the slate.
+    def __init__(self, length=HISTORY_LENGTH, capacity=INITIAL_CAPACITY):
+        self.length = length
+        self.times = np.zeros((capacity, length))
+        self.prices = np.zeros((capacity, length))
+        self.heads = np.zeros(capacity, dtype=np.int64)
+        self.counts = np.zeros(capacity, dtype=np.int64)
+        self.free = list(range(capacity - 1, -1, -1))
+        self.lines = {}  # (sport, game, market, line, outcome) -> {bookmaker: slot}
+        self.moves = {}  # Same key -> {bookmaker: (time, implied probability change)} within the window
+        self.steamed = {}  # Same key -> (time, direction) of the last steam reported
+        self.expiries = []  # Heap of (commence time, key); a line is dropped once its event starts
+        self.sharp = {BOOKMAKERS.intern(bookmaker) for bookmaker in SHARP_BOOKMAKERS}
+
+    def __len__(self):
+        return len(self.times) - len(self.free)
+
+    def allocate(self):
+        if not self.free:
+            capacity = len(self.times)
+            self.times = np.concatenate([self.times, np.zeros_like(self.times)])
+            self.prices = np.concatenate([self.prices, np.zeros_like(self.prices)])
+            self.heads = np.concatenate([self.heads, np.zeros_like(self.heads)])
+            self.counts = np.concatenate([self.counts, np.zeros_like(self.counts)])
+            self.free = list(range(2 * capacity - 1, capacity - 1, -1))
+        slot = self.free.pop()
+        self.heads[slot] = self.counts[slot] = 0
+        return slot
+
+    def last_price(self, slot):
+        return self.prices[slot, self.heads[slot] - 1]
+
+    def history(self, key, bookmaker):
+        # (time, price) pairs of one quote, oldest first
+        slot = self.lines.get(key, {}).get(BOOKMAKERS.intern(bookmaker))
+        if slot is None:
+            return []
+        count = self.counts[slot]
+        order = (self.heads[slot] - count + np.arange(count)) % self.length
+        return list(zip(self.times[slot, order].tolist(), self.prices[slot, order].tolist()))
+
+    def window_start_price(self, slot, now):
+        # Oldest price still inside the steam window, or the newest before it
+        price = self.last_price(slot)
+        for back in range(2, self.counts[slot] + 1):
+            position = (self.heads[slot] - back) % self.length
+            price = self.prices[slot, position]
+            if now - self.times[slot, position] > STEAM_WINDOW:
+                break
+        return price
+
+    def update(self, key, bookmaker, price, now, commence_time):
+        # Records one quote (bookmaker is an interned id, times are epoch seconds). Returns the direction
+        # of the move it completes (+1 shortening, -1 drifting), or 0.
+        slots = self.lines.get(key)
+        if slots is None:
+            slots = self.lines[key] = {}
+            heapq.heappush(self.expiries, (commence_time, key))
+        slot = slots.get(bookmaker)
+        if slot is None:
+            slot = slots[bookmaker] = self.allocate()
+        elif self.last_price(slot) == price:
+            return 0
+
+        head = self.heads[slot]
+        self.times[slot, head] = now
+        self.prices[slot, head] = price
+        self.heads[slot] = (head + 1) % self.length
+        self.counts[slot] = min(self.counts[slot] + 1, self.length)
+        if self.counts[slot] < 2:
+            return 0
+
+        change = 1 / price - 1 / self.window_start_price(slot, now)
+        if abs(change) < STEAM_MOVE:
+            return 0
+        self.moves.setdefault(key, {})[bookmaker] = (now, change)
+        return 1 if change > 0 else -1
+
+    def check_steam(self, key, now, direction):
+        moves = self.moves[key]
+        movers = [bookmaker for bookmaker, (time, change) in moves.items()
+                  if now - time <= STEAM_WINDOW and change * direction > 0]
+        if len(movers) < STEAM_MIN_BOOKS and not self.sharp.intersection(movers):
+            return None
+        last = self.steamed.get(key)
+        if last is not None and last[1] == direction and now - last[0] <= STEAM_WINDOW:
+            return None
+        self.steamed[key] = (now, direction)
+
+        slots = self.lines[key]
+        target = sum(1 / self.last_price(slots[bookmaker]) for bookmaker in movers) / len(movers)
+        lagging = []
+        for bookmaker, slot in slots.items():
+            odds = float(self.last_price(slot))
+            if bookmaker not in movers and (target - 1 / odds) * direction >= LAG_THRESHOLD:
+                lagging.append((BOOKMAKERS.name(bookmaker), odds))
+        sport, game, market, line, outcome = key
+        return SteamMove(sport, game, market, line, TEAMS.name(outcome), direction,
+                         tuple(BOOKMAKERS.name(bookmaker) for bookmaker in movers), tuple(lagging), 1 / target)
+
+    def observe(self, rows, now):
+        # Feeds (event, quotes) pairs as built by row_quotes, normally the rows that changed since the
+        # last poll. Steam is checked once every row is in, so books moving in the same poll count together.
+        moved = {}
+        for (sport, game), quotes in rows:
+            for market, quote in quotes:
+                commence_time = quote.commence_time.timestamp()
+                if market == 'total':
+                    sides = ((OVER_OUTCOME, quote.over_odds), (UNDER_OUTCOME, quote.under_odds))
+                else:
+                    sides = ((quote.team, quote.odds),)
+                line = market_line(quote, market)
+                for outcome, odds in sides:
+                    key = (sport, game, market, line, outcome)
+                    direction = self.update(key, quote.bookmaker, odds, now, commence_time)
+                    if direction:
+                        moved[key] = direction
+        steam = [self.check_steam(key, now, direction) for key, direction in moved.items()]
+        return [move for move in steam if move is not None]
+
+    def evict(self, now):
+        # Drops every line whose event has started, freeing its slots
+        evicted = 0
+        while self.expiries and self.expiries[0][0] <= now:
+            _, key = heapq.heappop(self.expiries)
+            self.free.extend(self.lines.pop(key).values())
+            self.moves.pop(key, None)
+            self.steamed.pop(key, None)
+            evicted += 1
+        return evicted
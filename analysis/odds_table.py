@@ -0,0 +1,351 @@
+from array import array
+from datetime import date
+
+import numpy as np
+
+from analysis import ev_analysis
+from analysis.ev_analysis import (EventTimes, arbitrage_opportunity, best_middle_pairs, iter_odds_rows, middle_opportunity)
+from analysis.devig import bookmaker_weights, fair_probabilities
+from analysis.quotes import AWAY, DRAW, HOME
+from analysis.stakes import stake_limits, stake_plans
+
+# Market codes, in the order analyze_odds evaluates them
+MONEYLINE, SPREAD, TOTAL = 0, 1, 2
+MARKET_NAMES = ['moneyline', 'spread', 'total']
+MARKET_BET_TYPES = ['Moneyline', 'Spread', 'Total']
+# Per-quote columns, set by freeze
+COLUMNS = ['event', 'market', 'outcome', 'line', 'line_key', 'side', 'bookmaker', 'price', 'start', 'day',
+           'implied_probability']
+
+class OddsTable:
+    # Columnar store of every quote in a snapshot: one entry per (event, market, outcome, bookmaker).
+    # Strings live in small lookup tables and the columns hold integer codes into them.
+    def __init__(self):
+        self.event_keys = {}
+        self.event_sport = []
+        self.event_game = []
+        self.names = {}
+        self.name_list = []
+        self.bookmakers = {}
+        self.bookmaker_list = []
+        self.start_times = {}
+        self.start_time_list = []
+        self.commence_time_list = []
+        self.days = []
+        self.lines = {}
+        self.line_list = []
+
+        self._event = array('i')
+        self._market = array('b')
+        self._outcome = array('i')
+        self._line = array('d')
+        self._line_key = array('i')
+        self._side = array('b')
+        self._bookmaker = array('h')
+        self._price = array('d')
+        self._start = array('i')
+        self.group_cache = {}
+        self.devig_cache = {}
+
+    @classmethod
+    def from_rows(cls, source, now=None, bookmakers=None):
+        # Same filtering as analyze_odds: events inside MAX_DAYS_AHEAD from ALLOWED_BOOKMAKERS (or the
+        # given bookmakers) only
+        bookmakers = ev_analysis.ALLOWED_BOOKMAKERS if bookmakers is None else bookmakers
+        table = cls()
+        event_times = EventTimes(now)
+        for row in iter_odds_rows(source):
+            bookmaker = row.bookmaker.lower()
+            if bookmaker not in bookmakers:
+                continue
+            commence_time, est_start_time, in_window = event_times.get(row.start_time)
+            if not in_window:
+                continue
+            table.add_row(row, bookmaker, commence_time, est_start_time)
+        table.freeze()
+        return table
+
+    def code(self, lookup, values, value):
+        if value not in lookup:
+            lookup[value] = len(values)
+            values.append(value)
+        return lookup[value]
+
+    def add_quote(self, event, market, outcome, side, line, market_line, bookmaker, price, start):
+        self._event.append(event)
+        self._market.append(market)
+        self._outcome.append(self.code(self.names, self.name_list, outcome))
+        self._side.append(side)
+        self._line.append(line)
+        # Line shared by both sides of the market (home spread or total), None for moneylines
+        self._line_key.append(self.code(self.lines, self.line_list, market_line))
+        self._bookmaker.append(bookmaker)
+        self._price.append(price)
+        self._start.append(start)
+
+    def add_row(self, row, bookmaker_name, commence_time, est_start_time):
+        event_key = (row.sport, f"{row.home_team} vs {row.away_team}")
+        if event_key not in self.event_keys:
+            self.event_keys[event_key] = len(self.event_sport)
+            self.event_sport.append(row.sport)
+            self.event_game.append(event_key[1])
+        event = self.event_keys[event_key]
+        bookmaker = self.code(self.bookmakers, self.bookmaker_list, bookmaker_name)
+        if row.start_time not in self.start_times:
+            self.start_times[row.start_time] = len(self.start_time_list)
+            self.start_time_list.append(est_start_time)
+            self.commence_time_list.append(commence_time)
+            self.days.append(commence_time.toordinal())
+        start = self.start_times[row.start_time]
+        nan = float('nan')
+
+        if row.home_odds is not None and row.away_odds is not None:
+            self.add_quote(event, MONEYLINE, row.home_team, HOME, nan, None, bookmaker, row.home_odds, start)
+            self.add_quote(event, MONEYLINE, row.away_team, AWAY, nan, None, bookmaker, row.away_odds, start)
+            if row.sport.lower()[:6] == 'soccer' and row.draw_odds is not None:
+                self.add_quote(event, MONEYLINE, 'Draw', DRAW, nan, None, bookmaker, row.draw_odds, start)
+
+        if row.home_spread is not None and row.home_spread_odds is not None and row.away_spread_odds is not None:
+            self.add_quote(event, SPREAD, row.home_team, HOME, row.home_spread, row.home_spread, bookmaker, row.home_spread_odds, start)
+            self.add_quote(event, SPREAD, row.away_team, AWAY, -row.home_spread, row.home_spread, bookmaker, row.away_spread_odds, start)
+
+        if row.over is not None and row.over_odds is not None and row.under_odds is not None:
+            self.add_quote(event, TOTAL, 'Over', HOME, row.over, row.over, bookmaker, row.over_odds, start)
+            self.add_quote(event, TOTAL, 'Under', AWAY, row.over, row.over, bookmaker, row.under_odds, start)
+
+    def freeze(self):
+        self.event = np.frombuffer(self._event, dtype=np.int32)
+        self.market = np.frombuffer(self._market, dtype=np.int8)
+        self.outcome = np.frombuffer(self._outcome, dtype=np.int32)
+        self.line = np.frombuffer(self._line, dtype=np.float64)
+        self.line_key = np.frombuffer(self._line_key, dtype=np.int32)
+        self.side = np.frombuffer(self._side, dtype=np.int8)
+        self.bookmaker = np.frombuffer(self._bookmaker, dtype=np.int16)
+        self.price = np.frombuffer(self._price, dtype=np.float64)
+        self.start = np.frombuffer(self._start, dtype=np.int32)
+        self.day = np.asarray(self.days, dtype=np.int32)[self.start] if len(self.start) else np.zeros(0, dtype=np.int32)
+        self.event_is_soccer = np.array([sport.lower()[:6] == 'soccer' for sport in self.event_sport], dtype=bool)
+        self.implied_probability = implied_probabilities(self.price)
+
+    def __len__(self):
+        return len(self.price)
+
+    def select(self, rows):
+        # A table of some of these rows (an index or boolean mask), sharing the lookup tables. Scans of it
+        # match scans of a table built from just those quotes.
+        table = object.__new__(OddsTable)
+        table.__dict__.update((name, value) for name, value in self.__dict__.items() if not name.startswith('_'))
+        for column in COLUMNS:
+            setattr(table, column, getattr(self, column)[rows])
+        table.group_cache = {}
+        table.devig_cache = {}
+        return table
+
+    def bookmaker_rows(self, bookmakers):
+        # Mask of the quotes from the given bookmakers
+        codes = [self.bookmakers[bookmaker] for bookmaker in bookmakers if bookmaker in self.bookmakers]
+        return np.isin(self.bookmaker, codes)
+
+    def groups(self, *columns):
+        # group_ids over the whole table, computed once per key and shared by the EV, arbitrage and
+        # middle passes; a pass working on some rows indexes into it
+        if columns not in self.group_cache:
+            self.group_cache[columns] = group_ids(*(getattr(self, column) for column in columns))
+        return self.group_cache[columns]
+
+    @property
+    def nbytes(self):
+        return sum(getattr(self, column).nbytes for column in COLUMNS)
+
+def implied_probabilities(prices):
+    return 1 / prices
+
+def group_ids(*columns):
+    # Dense group id per row for each distinct combination of the key columns, numbered in order of first appearance
+    if len(columns[0]) == 0:
+        return np.zeros(0, dtype=np.int64), 0
+    key = np.zeros(len(columns[0]), dtype=np.int64)
+    for column in columns:
+        column = column.astype(np.int64) - int(column.min())
+        key = key * (int(column.max()) + 1) + column
+    _, first, inverse = np.unique(key, return_index=True, return_inverse=True)
+    rank = np.empty(len(first), dtype=np.int64)
+    rank[np.argsort(first, kind='stable')] = np.arange(len(first))
+    return rank[inverse.ravel()], len(first)
+
+def group_first_max(groups, values, positions):
+    # Index (into rows) of the highest value per group, keeping the earliest row on ties
+    order = np.lexsort((positions, -values, groups))
+    is_first = np.ones(len(order), dtype=bool)
+    is_first[1:] = groups[order][1:] != groups[order][:-1]
+    return order[is_first]
+
+def devig(table, method=None):
+    # Fair probability of every quote's outcome from the weighted market consensus, every
+    # (event, market, line) at once. Cached on the table, with the line and outcome ids it used.
+    if method not in table.devig_cache:
+        outcome_groups, outcome_count = table.groups('event', 'market', 'line_key', 'outcome')
+        market_groups, _ = table.groups('event', 'market', 'line_key')
+        outcome_markets = np.zeros(outcome_count, dtype=np.int64)
+        outcome_markets[outcome_groups] = market_groups
+        weights = bookmaker_weights(table.bookmaker_list)[table.bookmaker] if len(table) else np.zeros(0)
+        fair = fair_probabilities(table.implied_probability, weights, outcome_groups, outcome_markets, method)
+        table.devig_cache[method] = (fair[outcome_groups], market_groups, outcome_markets)
+    return table.devig_cache[method]
+
+def best_prices(table, rows, groups):
+    # Best price row per group (the keys plus the outcome), in order of each outcome's first appearance
+    groups = groups[rows]
+    best = group_first_max(groups, table.price[rows], np.arange(len(rows)))
+    first_seen = np.full(groups.max() + 1 if len(groups) else 0, len(rows), dtype=np.int64)
+    np.minimum.at(first_seen, groups, np.arange(len(rows)))
+    best = best[np.argsort(first_seen[groups[best]], kind='stable')]
+    return rows[best]
+
+def arbitrage_sums(table, best_rows, groups, count):
+    # Sum of best implied probabilities per market; an arbitrage exists wherever it is below 1
+    groups = groups[best_rows]
+    sums = np.bincount(groups, weights=table.implied_probability[best_rows], minlength=count)
+    sizes = np.bincount(groups, minlength=count)
+    return groups, sums, sizes
+
+def solved_opportunities(candidates):
+    # candidates: (sport, game, market, date, legs). Stakes for every market with the same number of
+    # outcomes are solved in one vectorized pass; opportunities keep the candidates' order.
+    plans = [None] * len(candidates)
+    for size in set(len(candidate[4]) for candidate in candidates):
+        positions = [i for i, candidate in enumerate(candidates) if len(candidate[4]) == size]
+        legs = [candidates[i][4] for i in positions]
+        for i, plan in zip(positions, stake_plans([[leg['Odds'] for leg in bets] for bets in legs],
+                                                  [stake_limits([leg['Bookmaker'] for leg in bets]) for bets in legs])):
+            plans[i] = plan
+    opportunities = []
+    for (sport, game, market, date, legs), plan in zip(candidates, plans):
+        opportunity = arbitrage_opportunity(market, date, legs, plan) if plan is not None else None
+        if opportunity:
+            opportunity['Sport'] = sport
+            opportunity['Game'] = game
+            opportunities.append(opportunity)
+    return opportunities
+
+def find_arbitrage(table):
+    # Candidates are found for the whole slate at once; only markets whose best prices sum below 1
+    # reach the stake solver
+    candidates = []
+    sided = np.flatnonzero(table.market != TOTAL)
+    if len(sided):
+        best = best_prices(table, sided, table.groups('event', 'market', 'day', 'line_key', 'outcome')[0])
+        groups, total_prob, sizes = arbitrage_sums(table, best, *table.groups('event', 'market', 'day', 'line_key'))
+        # Soccer moneylines with a draw quoted are three-way markets; everything else must be two-way
+        soccer_moneyline = np.zeros(len(total_prob), dtype=bool)
+        soccer_moneyline[groups] = table.event_is_soccer[table.event[best]] & (table.market[best] == MONEYLINE)
+        valid = ((soccer_moneyline & (sizes == 3)) | (sizes == 2)) & (total_prob < 1)
+
+        for group in np.flatnonzero(valid):
+            legs = np.flatnonzero(groups == group)
+            first = best[legs[0]]
+            bets = [{'Type': table.name_list[table.outcome[best[leg]]], 'Odds': float(table.price[best[leg]]),
+                     'Bookmaker': table.bookmaker_list[table.bookmaker[best[leg]]]}
+                    for leg in legs]
+            if table.market[first] == SPREAD:
+                for bet, leg in zip(bets, legs):
+                    bet['Spread'] = float(table.line[best[leg]])
+            candidates.append((table.event_sport[table.event[first]], table.event_game[table.event[first]],
+                               MARKET_BET_TYPES[table.market[first]], table.start_time_list[table.start[first]][:10], bets))
+
+    totals = np.flatnonzero(table.market == TOTAL)
+    if len(totals):
+        over = totals[table.outcome[totals] == table.names.get('Over', -1)]
+        under = totals[table.outcome[totals] == table.names.get('Under', -1)]
+        over_groups, _ = group_ids(table.event[over], table.day[over], table.line_key[over])
+        # Over and Under quotes are always added in pairs, so both sides share the same groups
+        best_over = over[group_first_max(over_groups, table.price[over], np.arange(len(over)))]
+        best_under = under[group_first_max(over_groups, table.price[under], np.arange(len(under)))]
+        total_prob = table.implied_probability[best_over] + table.implied_probability[best_under]
+
+        for i in np.flatnonzero(total_prob < 1):
+            o, u = best_over[i], best_under[i]
+            candidates.append((table.event_sport[table.event[o]], table.event_game[table.event[o]], 'Total',
+                               table.start_time_list[table.start[o]][:10], [
+                {'Type': 'Over', 'Odds': float(table.price[o]), 'Bookmaker': table.bookmaker_list[table.bookmaker[o]], 'Total': float(table.line[o])},
+                {'Type': 'Under', 'Odds': float(table.price[u]), 'Bookmaker': table.bookmaker_list[table.bookmaker[u]], 'Total': float(table.line[u])}
+            ]))
+
+    opportunities = solved_opportunities(candidates)
+    opportunities.extend(find_middles(table))
+    return opportunities
+
+def find_middles(table):
+    # Best quote per (event, market, day, line, side), then the same cross-line sweep the dict engine uses
+    opportunities = []
+    lined = np.flatnonzero(table.market != MONEYLINE)
+    if not len(lined):
+        return opportunities
+    groups = table.groups('event', 'market', 'day', 'line_key', 'side')[0][lined]
+    best = lined[np.sort(group_first_max(groups, table.price[lined], np.arange(len(lined))))]
+    market_groups, market_count = group_ids(table.event[best], table.market[best], table.day[best])
+
+    sides = [([], []) for _ in range(market_count)]
+    for row, group in zip(best, market_groups):
+        market = table.market[row]
+        line = float(table.line[row])
+        leg = {'Type': table.name_list[table.outcome[row]], 'Odds': float(table.price[row]),
+               'Bookmaker': table.bookmaker_list[table.bookmaker[row]]}
+        if market == TOTAL:
+            leg['Total'] = line
+            threshold = line
+        else:
+            leg['Spread'] = line
+            threshold = -line if table.side[row] == HOME else line
+        sides[group][table.side[row]].append((threshold, leg['Odds'], leg))
+
+    first_rows = best[np.unique(market_groups, return_index=True)[1]]
+    for (low_side, high_side), row in zip(sides, first_rows):
+        market = MARKET_NAMES[table.market[row]]
+        day = date.fromordinal(int(table.day[row]))
+        for low, high in best_middle_pairs(low_side, high_side):
+            opportunity = middle_opportunity(market, day, low, high)
+            if opportunity:
+                opportunity['Sport'] = table.event_sport[table.event[row]]
+                opportunity['Game'] = table.event_game[table.event[row]]
+                opportunities.append(opportunity)
+    return opportunities
+
+def find_positive_ev(table, min_ev=None, max_ev=None):
+    # EV bounds default to MIN_EV_THRESHOLD and MAX_EV_THRESHOLD
+    min_ev = ev_analysis.MIN_EV_THRESHOLD if min_ev is None else min_ev
+    max_ev = ev_analysis.MAX_EV_THRESHOLD if max_ev is None else max_ev
+    positive_ev_bets = []
+    if not len(table):
+        return positive_ev_bets
+    true_prob, market_groups, outcome_markets = devig(table)
+    ev = true_prob * (table.price - 1) - (1 - true_prob)
+
+    # Soccer moneylines are only priced once all three outcomes (including the draw) are quoted
+    outcome_counts = np.bincount(outcome_markets, minlength=market_groups.max() + 1)
+    has_draw = np.zeros(len(outcome_counts), dtype=bool)
+    has_draw[market_groups[table.outcome == table.names.get('Draw', -1)]] = True
+    three_way = table.event_is_soccer[table.event] & (table.market == MONEYLINE)
+    priced = ~three_way | ((outcome_counts[market_groups] == 3) & has_draw[market_groups])
+
+    for row in np.flatnonzero(priced & (ev >= min_ev) & (ev <= max_ev)):
+        event = table.event[row]
+        bet = {
+            'Sport': table.event_sport[event],
+            'Game': table.event_game[event],
+            'Bookmaker': table.bookmaker_list[table.bookmaker[row]],
+            'Bet Type': MARKET_BET_TYPES[table.market[row]],
+            'Odds': float(table.price[row]),
+            'EV': float(ev[row]),
+            'Start Time': table.start_time_list[table.start[row]],
+            'Commence Time': table.commence_time_list[table.start[row]],
+        }
+        if table.market[row] == TOTAL:
+            bet['Bet Type'] = f"Total {table.name_list[table.outcome[row]]}"
+            bet['Total'] = float(table.line[row])
+        else:
+            bet['Team'] = table.name_list[table.outcome[row]]
+            if table.market[row] == SPREAD:
+                bet['Spread'] = float(table.line[row])
+        positive_ev_bets.append(bet)
+    return positive_ev_bets
@@ -0,0 +1,154 @@
+import argparse
+import json
+import os
+import sqlite3
+import time
+
+from analysis.ev_analysis import format_arbitrage_opportunity, format_bet_recommendation
+from monitoring.metrics import METRICS
+
+STORE_FILE = 'data/opportunities.db'  # SQLite database of every opportunity recorded
+DEFAULT_QUERY_LIMIT = 100  # Rows returned by a query unless another limit is given
+
+# One row per opportunity and one per bet of it (an EV bet is a single leg). The headline numbers are
+# columns, so they can be filtered and indexed; the full dict is kept as JSON to rebuild it on read.
+# Legs repeat the recording time so a bookmaker's recent legs are one index range.
+# profit is a percentage for every category: the EV of a bet, the guaranteed return of an arbitrage
+# or middle.
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS opportunities (
+    id INTEGER PRIMARY KEY,
+    recorded_at REAL NOT NULL,
+    category TEXT NOT NULL,
+    sport TEXT NOT NULL,
+    game TEXT NOT NULL,
+    market TEXT NOT NULL,
+    profit REAL NOT NULL,
+    investment REAL,
+    details TEXT NOT NULL
+);
+CREATE TABLE IF NOT EXISTS legs (
+    opportunity_id INTEGER NOT NULL REFERENCES opportunities(id),
+    recorded_at REAL NOT NULL,
+    bookmaker TEXT NOT NULL,
+    outcome TEXT,
+    odds REAL NOT NULL,
+    stake REAL
+);
+CREATE INDEX IF NOT EXISTS opportunities_sport ON opportunities (sport, category, recorded_at);
+CREATE INDEX IF NOT EXISTS opportunities_game ON opportunities (game, recorded_at);
+CREATE INDEX IF NOT EXISTS opportunities_market ON opportunities (market, recorded_at);
+CREATE INDEX IF NOT EXISTS opportunities_time ON opportunities (recorded_at);
+CREATE INDEX IF NOT EXISTS legs_bookmaker ON legs (bookmaker, recorded_at, opportunity_id);
+CREATE INDEX IF NOT EXISTS legs_opportunity ON legs (opportunity_id);
+"""
+
+def ev_row(bet):
+    # Over and Under bets are filed under the Total market, like totals arbitrage
+    return ('EV', bet['Sport'], bet['Game'], bet['Bet Type'].split()[0], bet['EV'] * 100, None,
+            [(bet['Bookmaker'], bet.get('Team', bet['Bet Type']), bet['Odds'], bet.get('Stake'))])
+
+def opportunity_row(opportunity):
+    return (opportunity['Category'], opportunity['Sport'], opportunity['Game'], opportunity['Market'],
+            opportunity['Profit'], opportunity['Total Investment'],
+            [(bet['Bookmaker'], bet['Type'], bet['Odds'], bet['Stake']) for bet in opportunity['Bets']])
+
+class OpportunityStore:
+    # Append-only: every run or scan cycle adds its opportunities in one transaction, and queries
+    # filter on the indexed columns. Other processes can read the file while it is being written.
+    def __init__(self, filename=STORE_FILE):
+        if filename != ':memory:':
+            os.makedirs(os.path.dirname(filename) or '.', exist_ok=True)
+        self.connection = sqlite3.connect(filename, check_same_thread=False)
+        self.connection.execute("PRAGMA journal_mode=WAL")
+        self.connection.execute("PRAGMA synchronous=NORMAL")
+        self.connection.executescript(SCHEMA)
+
+    def __len__(self):
+        return self.connection.execute("SELECT COUNT(*) FROM opportunities").fetchone()[0]
+
+    def record(self, positive_ev_bets=(), arbitrage_opportunities=(), recorded_at=None):
+        # Batched insert of one run's results; returns the number of opportunities stored
+        recorded_at = recorded_at or time.time()
+        entries = [(ev_row(bet), bet) for bet in positive_ev_bets]
+        entries += [(opportunity_row(opportunity), opportunity) for opportunity in arbitrage_opportunities]
+        if not entries:
+            return 0
+        with METRICS.timer('store_write'), self.connection:
+            # The write lock is taken up front, so the ids handed out below stay ours
+            self.connection.execute("BEGIN IMMEDIATE")
+            first_id = self.connection.execute("SELECT COALESCE(MAX(id), 0) + 1 FROM opportunities").fetchone()[0]
+            self.connection.executemany(
+                "INSERT INTO opportunities VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                [(first_id + i, recorded_at, *row[:6], json.dumps(entry, default=str))
+                 for i, (row, entry) in enumerate(entries)])
+            self.connection.executemany(
+                "INSERT INTO legs VALUES (?, ?, ?, ?, ?, ?)",
+                [(first_id + i, recorded_at, *leg) for i, (row, _) in enumerate(entries) for leg in row[6]])
+        METRICS.increment('opportunities_stored', len(entries))
+        return len(entries)
+
+    def query(self, category=None, sport=None, game=None, market=None, bookmaker=None, min_profit=None,
+              since=None, until=None, limit=DEFAULT_QUERY_LIMIT):
+        # Opportunity dicts, most profitable first, with 'Recorded At' added. since/until are epoch
+        # seconds; every filter left as None matches everything.
+        conditions, params = [], []
+        for column, value in (('category', category), ('sport', sport), ('game', game), ('market', market)):
+            if value is not None:
+                conditions.append(f"{column} = ?")
+                params.append(value)
+        times, time_params = [], []
+        if since is not None:
+            times.append("recorded_at >= ?")
+            time_params.append(since)
+        if until is not None:
+            times.append("recorded_at < ?")
+            time_params.append(until)
+        conditions += times
+        params += time_params
+        if bookmaker is not None:
+            conditions.append("id IN (SELECT opportunity_id FROM legs WHERE "
+                              + " AND ".join(["bookmaker = ?"] + times) + ")")
+            params += [bookmaker] + time_params
+        if min_profit is not None:
+            conditions.append("profit >= ?")
+            params.append(min_profit)
+        sql = "SELECT recorded_at, details FROM opportunities"
+        if conditions:
+            sql += " WHERE " + " AND ".join(conditions)
+        sql += " ORDER BY profit DESC"
+        if limit is not None:
+            sql += " LIMIT ?"
+            params.append(limit)
+        with METRICS.timer('store_query'):
+            rows = self.connection.execute(sql, params).fetchall()
+        return [dict(json.loads(details), **{'Recorded At': recorded_at}) for recorded_at, details in rows]
+
+    def close(self):
+        self.connection.close()
+
+def main(argv=None):
+    # e.g. python -m analysis.opportunity_store --category Arbitrage --sport basketball_nba --min-profit 1 --hours 24
+    parser = argparse.ArgumentParser(description="Query recorded opportunities")
+    parser.add_argument('--file', default=STORE_FILE)
+    parser.add_argument('--category', choices=['EV', 'Arbitrage', 'Middle'])
+    parser.add_argument('--sport')
+    parser.add_argument('--game')
+    parser.add_argument('--market')
+    parser.add_argument('--bookmaker')
+    parser.add_argument('--min-profit', type=float, help="percent")
+    parser.add_argument('--hours', type=float, help="only opportunities recorded in the last N hours")
+    parser.add_argument('--limit', type=int, default=DEFAULT_QUERY_LIMIT)
+    args = parser.parse_args(argv)
+
+    store = OpportunityStore(args.file)
+    since = time.time() - args.hours * 3600 if args.hours is not None else None
+    results = store.query(args.category, args.sport, args.game, args.market, args.bookmaker, args.min_profit,
+                          since, limit=args.limit)
+    for opportunity in results:
+        print(format_arbitrage_opportunity(opportunity) if 'Bets' in opportunity else format_bet_recommendation(opportunity))
+    print(f"{len(results)} opportunities")
+    store.close()
+
+if __name__ == "__main__":
+    main()
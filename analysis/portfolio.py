@@ -0,0 +1,235 @@
+import heapq
+from typing import NamedTuple
+
+import numpy as np
+
+from analysis.stakes import STAKE_UNIT, solve_stakes, stake_limits
+
+BANKROLL = 1000  # Bankroll the portfolio is sized against
+KELLY_FRACTION = 0.25  # Share of the full-Kelly portfolio that is staked
+MAX_BANKROLL_FRACTION = 0.5  # Most of the bankroll staked at once, across every position
+MAX_GAME_FRACTION = 0.1  # Most of the bankroll staked on one game, across its markets
+MAX_BOOKMAKER_FRACTION = 0.25  # Most of the bankroll staked at one bookmaker
+MAX_BET_FRACTION = 0.05  # Most of the bankroll staked on one EV bet
+MAX_CANDIDATES = 500  # Best EV bets and arbitrage opportunities considered; the rest get no stake
+SCENARIOS = 2000  # Simulated outcomes of every game the expected log growth is averaged over
+MAX_ITERATIONS = 300  # Gradient steps of the solver
+PROJECTION_ITERATIONS = 10  # Rounds of alternating projections onto the caps per gradient step
+TOLERANCE = 1e-10  # The solver stops once a step improves the expected log growth by less than this
+SEED = 0  # Fixed, so the same candidates get the same stakes every cycle
+
+# Which way a bet's outcome depends on its game's simulated draws
+HOME, AWAY, DRAW, OVER, UNDER, RISKLESS = range(6)
+
+class Position(NamedTuple):
+    category: str  # 'EV', 'Arbitrage' or 'Middle'
+    stake: float  # Total stake, across an opportunity's legs
+    expected_profit: float
+    candidate: dict  # The EV bet or opportunity, as analyze_odds returned it
+    legs: tuple  # Stakes of an opportunity's legs, in the order of its Bets; () for an EV bet
+
+class Portfolio(NamedTuple):
+    positions: list  # Largest stake first
+    bankroll: float
+    staked: float
+    expected_profit: float
+    growth: float  # Expected log growth of the bankroll over the simulated outcomes
+
+def bet_direction(bet):
+    home_team, _, away_team = bet['Game'].partition(' vs ')
+    if bet['Bet Type'].startswith('Total'):
+        return OVER if bet['Bet Type'].endswith('Over') else UNDER
+    if bet.get('Team') == 'Draw':
+        return DRAW
+    return HOME if bet.get('Team') == home_team else AWAY
+
+def select_candidates(positive_ev_bets, arbitrage_opportunities, max_candidates=None):
+    # The best EV bets and guaranteed-profit opportunities, by expected return per dollar. A middle is
+    # only taken for its guaranteed profit, so middles that can lose money are left out.
+    max_candidates = MAX_CANDIDATES if max_candidates is None else max_candidates
+    riskless = [opportunity for opportunity in arbitrage_opportunities if opportunity['Profit'] > 0]
+    candidates = [(bet['EV'], 'EV', bet) for bet in positive_ev_bets if bet['EV'] > 0]
+    candidates += [(opportunity['Profit'] / 100, opportunity['Category'], opportunity) for opportunity in riskless]
+    return heapq.nlargest(max_candidates, candidates, key=lambda candidate: candidate[0])
+
+def scenario_returns(candidates, scenarios, rng):
+    # (scenarios, candidates) returns per dollar staked. Each game draws one uniform number for its
+    # result and one for its total. A side bet with win probability p wins when the result draw is
+    # below p (home) or above 1 - p (away); totals work the same on the total draw. A draw bet wins
+    # just above the home win region, [p_home, p_home + p_draw), taking p_home from the game's home
+    # moneyline bets, else just below the away region, and never running into the away region (the
+    # sides' edges can add up to more than 1), so a draw never wins alongside either side. So
+    # bets on one game are correlated: two books' prices on one outcome win together, a team's
+    # moneyline and spread are nested, and exclusive outcomes never win together.
+    games = {}
+    game = np.empty(len(candidates), dtype=np.int64)
+    direction = np.empty(len(candidates), dtype=np.int64)
+    probability = np.empty(len(candidates))
+    odds = np.empty(len(candidates))
+    riskless_return = np.zeros(len(candidates))
+    for i, (value, category, candidate) in enumerate(candidates):
+        game[i] = games.setdefault((candidate['Sport'], candidate['Game']), len(games))
+        if category == 'EV':
+            direction[i] = bet_direction(candidate)
+            odds[i] = candidate['Odds']
+            probability[i] = (1 + value) / odds[i]  # EV = p * odds - 1
+        else:
+            direction[i] = RISKLESS
+            odds[i] = 1
+            probability[i] = 1
+            riskless_return[i] = value
+
+    # Win probabilities of each game's sides, where some moneyline bet gives them
+    moneyline = np.array([category == 'EV' and candidate['Bet Type'] == 'Moneyline'
+                          for _, category, candidate in candidates])
+    home = np.full(len(games), np.nan)
+    away = np.full(len(games), np.nan)
+    home[game[moneyline & (direction == HOME)]] = probability[moneyline & (direction == HOME)]
+    away[game[moneyline & (direction == AWAY)]] = probability[moneyline & (direction == AWAY)]
+    draw_start = np.where(~np.isnan(home[game]), home[game],
+                          np.where(~np.isnan(away[game]), 1 - away[game] - probability, (1 - probability) / 2))
+    draw_end = np.fmin(draw_start + probability, 1 - away[game])
+
+    results = rng.random((scenarios, len(games)))
+    totals = rng.random((scenarios, len(games)))
+    draws = np.where((direction == OVER) | (direction == UNDER), totals[:, game], results[:, game])
+    wins = np.select([(direction == HOME) | (direction == OVER), (direction == AWAY) | (direction == UNDER),
+                      direction == DRAW],
+                     [draws < probability, draws > 1 - probability,
+                      (draws >= draw_start) & (draws < draw_end)],
+                     True)
+    returns = np.where(wins, odds - 1, -1.0)
+    returns[:, direction == RISKLESS] = riskless_return[direction == RISKLESS]
+    return returns, game, len(games)
+
+def exposure_groups(candidates, game, game_count):
+    # (groups, candidates) share of each candidate's stake counted against each cap: its game, the
+    # bookmakers of its legs, and the whole bankroll
+    bookmakers = {}
+    for _, _, candidate in candidates:
+        for leg in candidate.get('Bets', [candidate]):
+            bookmakers.setdefault(leg['Bookmaker'], len(bookmakers))
+    groups = np.zeros((game_count + len(bookmakers) + 1, len(candidates)))
+    groups[game, np.arange(len(candidates))] = 1
+    for i, (_, _, candidate) in enumerate(candidates):
+        legs = candidate.get('Bets')
+        if legs is None:
+            groups[game_count + bookmakers[candidate['Bookmaker']], i] = 1
+        else:
+            for leg in legs:
+                groups[game_count + bookmakers[leg['Bookmaker']], i] += leg['Stake'] / candidate['Total Investment']
+    groups[-1] = 1
+    caps = np.concatenate([np.full(game_count, MAX_GAME_FRACTION), np.full(len(bookmakers), MAX_BOOKMAKER_FRACTION),
+                           [MAX_BANKROLL_FRACTION]])
+    return groups, caps
+
+def cap_projection(groups, caps):
+    # Projection onto one family of caps. Caps in a family barely overlap (games never do, bookmakers
+    # only through an opportunity's legs), so each over-cap group is pulled back along its own row.
+    norms = (groups ** 2).sum(axis=1)
+    return lambda fractions: fractions - groups.T @ (np.maximum(groups @ fractions - caps, 0) / norms)
+
+def project(fractions, upper, families, groups, caps):
+    # Into the feasible set: Dykstra's alternating projections onto the [0, upper] box and each family
+    # of caps, which, unlike scaling everything down, lets stake move from one candidate to another
+    # while a cap binds. A last pass scales every candidate down by the most any of its groups is still
+    # over its cap, so the result is always feasible.
+    projections = [lambda point: np.clip(point, 0, upper)] + families
+    corrections = [np.zeros_like(fractions) for _ in projections]
+    for _ in range(PROJECTION_ITERATIONS):
+        for i, projection in enumerate(projections):
+            point = fractions + corrections[i]
+            fractions = projection(point)
+            corrections[i] = point - fractions
+    fractions = np.clip(fractions, 0, upper)
+    load = groups @ fractions / caps
+    over = np.where(groups > 0, load[:, None], 1).max(axis=0)
+    return fractions / np.maximum(over, 1)
+
+def expected_log_growth(returns, fractions):
+    wealth = 1 + returns @ fractions
+    if wealth.min() <= 0:
+        return -np.inf
+    return np.log(wealth).mean()
+
+def solve_kelly(returns, upper, groups, caps, game_count):
+    # Projected gradient ascent on the expected log growth, with the step halved whenever it would not
+    # improve and grown after every step that does
+    families = [cap_projection(groups[rows], caps[rows])
+                for rows in (slice(0, game_count), slice(game_count, -1), slice(-1, None))]
+    fractions = np.zeros(returns.shape[1])
+    growth = 0.0
+    step = 1.0
+    for _ in range(MAX_ITERATIONS):
+        gradient = returns.T @ (1 / (1 + returns @ fractions)) / len(returns)
+        while step > 1e-12:
+            candidate = project(fractions + step * gradient, upper, families, groups, caps)
+            candidate_growth = expected_log_growth(returns, candidate)
+            if candidate_growth > growth:
+                break
+            step /= 2
+        else:
+            break
+        improvement = candidate_growth - growth
+        fractions, growth = candidate, candidate_growth
+        step *= 1.5
+        if improvement < TOLERANCE:
+            break
+    return fractions
+
+def size_portfolio(positive_ev_bets, arbitrage_opportunities, bankroll=None, kelly_fraction=None, seed=SEED):
+    # Simultaneous fractional-Kelly stakes for the current EV bets and opportunities, within the game,
+    # bookmaker, bet and bankroll caps. The full-Kelly portfolio is solved with every cap divided by the
+    # Kelly fraction and then scaled down by it, so the stakes stay inside the caps as given.
+    bankroll = BANKROLL if bankroll is None else bankroll
+    kelly_fraction = KELLY_FRACTION if kelly_fraction is None else kelly_fraction
+    candidates = select_candidates(positive_ev_bets, arbitrage_opportunities)
+    if not candidates:
+        return Portfolio([], bankroll, 0, 0, 0)
+
+    returns, game, game_count = scenario_returns(candidates, SCENARIOS, np.random.default_rng(seed))
+    groups, caps = exposure_groups(candidates, game, game_count)
+    # An opportunity's stakes were solved for its own bookmaker limits, so it is never scaled past them
+    upper = np.array([MAX_BET_FRACTION if category == 'EV' else candidate['Total Investment'] / bankroll
+                      for _, category, candidate in candidates])
+    fractions = solve_kelly(returns, upper / kelly_fraction, groups, caps / kelly_fraction, game_count)
+    fractions *= kelly_fraction
+
+    stakes = fractions * bankroll
+    if STAKE_UNIT:
+        stakes = np.floor(stakes / STAKE_UNIT + 1e-9) * STAKE_UNIT
+    positions = []
+    for i, ((value, category, candidate), stake) in enumerate(zip(candidates, stakes.tolist())):
+        if stake <= 0:
+            continue
+        if category == 'EV':
+            positions.append(Position(category, stake, stake * value, candidate, ()))
+            continue
+        # The legs are solved again for the smaller total, so they stay in whole units and within the
+        # bookmaker limits; scaling the opportunity's own stakes would keep neither
+        legs = candidate['Bets']
+        plan = solve_stakes([leg['Odds'] for leg in legs], bankroll=stake,
+                            limits=stake_limits([leg['Bookmaker'] for leg in legs]))
+        if plan is None or not plan.investment:
+            stakes[i] = 0
+            continue
+        stakes[i] = plan.investment
+        positions.append(Position(category, plan.investment, plan.profit, candidate, plan.stakes))
+    positions.sort(key=lambda position: position.stake, reverse=True)
+    return Portfolio(positions, bankroll, float(stakes.sum()),
+                     float(sum(position.expected_profit for position in positions)),
+                     float(expected_log_growth(returns, stakes / bankroll)))
+
+def format_position(position):
+    candidate = position.candidate
+    line = f"  {position.stake:8.2f}  {candidate['Sport']} - {candidate['Game']}: "
+    if position.category == 'EV':
+        return line + (f"{candidate['Bet Type']} {candidate.get('Team', '')} @ {candidate['Odds']:.2f} "
+                       f"({candidate['Bookmaker']}), {candidate['EV']:.2%} EV\n")
+    legs = ', '.join(f"{leg['Type']} @ {leg['Odds']:.2f} ({leg['Bookmaker']}) {stake:.2f}"
+                     for leg, stake in zip(candidate['Bets'], position.legs))
+    return line + f"{position.category} {candidate['Market']}, {candidate['Profit']:.2f}% profit: {legs}\n"
+
+def format_portfolio(portfolio):
+    return (f"Staked {portfolio.staked:.2f} of {portfolio.bankroll:.2f} across {len(portfolio.positions)} positions, "
+            f"expected profit {portfolio.expected_profit:.2f}, expected log growth {portfolio.growth:.4%}\n")
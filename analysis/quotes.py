@@ -0,0 +1,74 @@
+from datetime import datetime
+from typing import NamedTuple, Optional
+
+# Side codes shared by every quote record: home team / Over, away team / Under, and the soccer draw
+HOME, AWAY, DRAW = 0, 1, 2
+
+class SymbolTable:
+    # Interns names to small consecutive integers. Raw spellings (e.g. bookmakers in older CSV
+    # snapshots) are remembered as aliases so each one is normalized only the first time it is seen.
+    __slots__ = ('ids', 'names', 'aliases', 'normalize')
+
+    def __init__(self, normalize=None):
+        self.ids = {}
+        self.names = []
+        self.aliases = {}
+        self.normalize = normalize
+
+    def intern(self, raw_name):
+        symbol = self.aliases.get(raw_name)
+        if symbol is None:
+            name = self.normalize(raw_name) if self.normalize else raw_name
+            symbol = self.ids.get(name)
+            if symbol is None:
+                symbol = self.ids[name] = len(self.names)
+                self.names.append(name)
+            self.aliases[raw_name] = symbol
+        return symbol
+
+    def name(self, symbol):
+        return self.names[symbol]
+
+    def __len__(self):
+        return len(self.names)
+
+# Process-wide symbol tables. Bookmakers are keyed by their lowercase API key; TEAMS also holds the
+# fixed Draw/Over/Under outcomes so every outcome fits in one integer column.
+BOOKMAKERS = SymbolTable(normalize=str.lower)
+TEAMS = SymbolTable()
+DRAW_OUTCOME = TEAMS.intern('Draw')
+OVER_OUTCOME = TEAMS.intern('Over')
+UNDER_OUTCOME = TEAMS.intern('Under')
+
+def bookmaker_mask(bookmakers):
+    # Bitmask of bookmaker ids; membership is a shift and an AND instead of a string set lookup
+    mask = 0
+    for bookmaker in bookmakers:
+        mask |= 1 << BOOKMAKERS.intern(bookmaker)
+    return mask
+
+def in_mask(mask, symbol):
+    return (mask >> symbol) & 1
+
+class SideQuote(NamedTuple):
+    # One bookmaker's price on one side of a moneyline or spread market
+    team: int
+    opponent: Optional[int]
+    bookmaker: int
+    odds: float
+    implied_probability: float
+    commence_time: datetime
+    start_time: str
+    side: int
+    spread: Optional[float] = None
+
+class TotalQuote(NamedTuple):
+    # One bookmaker's Over/Under pair on a total
+    total: float
+    bookmaker: int
+    over_odds: float
+    under_odds: float
+    over_implied_probability: float
+    under_implied_probability: float
+    commence_time: datetime
+    start_time: str
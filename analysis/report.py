@@ -0,0 +1,124 @@
+import heapq
+import json
+import os
+import sys
+from datetime import datetime
+
+from analysis import ev_analysis
+from analysis.ev_analysis import (EST, MAX_OPPORTUNITIES_PER_GAME, TOP_EV_BETS, format_arbitrage_opportunity,
+                                  format_bet_recommendation)
+from analysis.portfolio import format_portfolio, format_position
+from monitoring.metrics import METRICS
+
+REPORT_DIR = 'logs'  # Recommendation reports are written here
+# Sections rendered by default
+REPORT_SECTIONS = ('configuration', 'data_summary', 'ev_bets', 'arbitrage', 'portfolio', 'summary')
+DATA_SUMMARY_MAX_GAMES = 200  # Larger slates leave the per-game data summary out unless it is asked for
+WRITE_JSON_REPORT = True  # Also save the results as JSON next to the text report, for other tools
+MARKETS = ['moneyline', 'spread', 'total']
+
+def report_sections(games, sections=None):
+    if sections is not None:
+        return sections
+    if sum(len(sport_games) for sport_games in games.values()) > DATA_SUMMARY_MAX_GAMES:
+        return tuple(section for section in REPORT_SECTIONS if section != 'data_summary')
+    return REPORT_SECTIONS
+
+def render_report(top_bets, games, ranked_opportunities, bet_count, sections, portfolio=None):
+    # The whole text report as one string: parts are collected in a list and joined once
+    parts = ["Betting Recommendations:\n\n"]
+    if 'configuration' in sections:
+        parts.append("Configuration:\n"
+                     f"Allowed Bookmakers: {', '.join(ev_analysis.ALLOWED_BOOKMAKERS)}\n"
+                     f"Max Days Ahead: {ev_analysis.MAX_DAYS_AHEAD}\n"
+                     f"Max Opportunities Per Game: {MAX_OPPORTUNITIES_PER_GAME}\n"
+                     f"EV Range: {ev_analysis.MIN_EV_THRESHOLD:.2%} to {ev_analysis.MAX_EV_THRESHOLD:.2%}\n\n")
+
+    if 'data_summary' in sections:
+        # One line per game, with the quote count of every market it has
+        parts.append("Data Summary:\n")
+        for sport, sport_games in games.items():
+            parts.append(f"{sport}:\n")
+            parts.extend(f"  {game}: " + ", ".join(f"{market.capitalize()} {len(data[market])}"
+                                                   for market in MARKETS if market in data) + " odds\n"
+                         for game, data in sport_games.items())
+        parts.append("\n")
+
+    if 'ev_bets' in sections:
+        if top_bets:
+            parts.append("High Value Bets:\n")
+            for bet in top_bets:
+                parts.append(format_bet_recommendation(bet))
+                parts.append("\n")
+        else:
+            parts.append("No high value bets found.\n")
+
+    if 'arbitrage' in sections:
+        if ranked_opportunities:
+            parts.append("\nArbitrage Opportunities:\n")
+            for opportunity in ranked_opportunities:
+                parts.append(format_arbitrage_opportunity(opportunity))
+                parts.append("\n")
+        else:
+            parts.append("\nNo arbitrage opportunities found.\n")
+
+    if 'portfolio' in sections and portfolio is not None:
+        parts.append("\nPortfolio:\n")
+        parts.append(format_portfolio(portfolio))
+        parts.extend(format_position(position) for position in portfolio.positions)
+
+    if 'summary' in sections:
+        middles = sum(1 for opportunity in ranked_opportunities if opportunity['Category'] == 'Middle')
+        parts.append("\nBetting Strategy Summary:\n"
+                     f"- High Value Bets: {bet_count}\n"
+                     f"- Arbitrage Opportunities: {len(ranked_opportunities) - middles}\n"
+                     f"- Middles: {middles}\n")
+    return ''.join(parts)
+
+def report_data(top_bets, games, ranked_opportunities, bet_count, generated_at, portfolio=None):
+    # The same results for other tools; each game's quote counts are kept only as a per-sport total
+    data = {
+        'generated_at': generated_at.isoformat(),
+        'configuration': {'allowed_bookmakers': sorted(ev_analysis.ALLOWED_BOOKMAKERS),
+                          'max_days_ahead': ev_analysis.MAX_DAYS_AHEAD,
+                          'min_ev': ev_analysis.MIN_EV_THRESHOLD, 'max_ev': ev_analysis.MAX_EV_THRESHOLD},
+        'games': {sport: len(sport_games) for sport, sport_games in games.items()},
+        'ev_bet_count': bet_count,
+        'top_ev_bets': top_bets,
+        'arbitrage_opportunities': ranked_opportunities,
+    }
+    if portfolio is not None:
+        data['portfolio'] = {'staked': portfolio.staked, 'expected_profit': portfolio.expected_profit,
+                             'growth': portfolio.growth,
+                             'positions': [position._asdict() for position in portfolio.positions]}
+    return data
+
+def write_report(positive_ev_bets, games, arbitrage_opportunities, sections=None, console=None,
+                 json_report=None, directory=REPORT_DIR, portfolio=None):
+    # Renders the report once and sends the same text to the log file and the console (sys.stdout
+    # unless another stream is given). Returns the log file name. portfolio: the stakes from
+    # analysis.portfolio.size_portfolio, listed in the portfolio section.
+    console = sys.stdout if console is None else console
+    json_report = WRITE_JSON_REPORT if json_report is None else json_report
+    generated_at = datetime.now(EST)
+    with METRICS.timer('report_render'):
+        top_bets = heapq.nlargest(TOP_EV_BETS, positive_ev_bets, key=lambda x: x['EV'])
+        ranked_opportunities = sorted(arbitrage_opportunities, key=lambda x: x['Profit'], reverse=True)
+        text = render_report(top_bets, games, ranked_opportunities, len(positive_ev_bets),
+                             report_sections(games, sections), portfolio)
+
+    os.makedirs(directory, exist_ok=True)
+    log_filename = os.path.join(directory, f"betting_recommendations_{generated_at.strftime('%Y%m%d_%H%M%S')}.txt")
+    with METRICS.timer('report_write'):
+        with open(log_filename, 'w') as log_file:
+            log_file.write(text)
+        if json_report:
+            # dumps encodes in C in one go; dump streams through the pure Python encoder
+            data = json.dumps(report_data(top_bets, games, ranked_opportunities, len(positive_ev_bets), generated_at,
+                                          portfolio), default=str)
+            with open(log_filename[:-4] + '.json', 'w', encoding='utf-8') as json_file:
+                json_file.write(data)
+        console.write(f"Betting recommendations have been saved to {log_filename}\n")
+        console.write(text)
+        console.write("\n")
+    return log_filename
@@ -0,0 +1,125 @@
+from typing import NamedTuple
+
+import numpy as np
+
+BANKROLL = 1000  # Most money put on one opportunity, across all of its legs
+STAKE_UNIT = 1  # Stakes are placed in multiples of this (whole dollars); 0 keeps exact fractional stakes
+BOOKMAKER_STAKE_LIMITS = {}  # Maximum stake per bet by bookmaker key, e.g. {'bovada': 500}
+MAX_ROUNDING_CANDIDATES = 4096  # Payout targets tried per leg when rounding; plenty for any realistic margin
+SOLVER_CHUNK_SIZE = 1 << 20  # Candidate stakes evaluated per numpy pass, bounding the solver's memory
+FIRST_PASS_TARGETS = 4  # Highest targets per leg tried before the window is narrowed
+
+class StakePlan(NamedTuple):
+    stakes: tuple
+    investment: float
+    payout: float  # Guaranteed: the smallest payout over all outcomes
+    profit: float  # Guaranteed profit, payout - investment
+
+def stake_limits(bookmakers):
+    return [BOOKMAKER_STAKE_LIMITS.get(bookmaker, np.inf) for bookmaker in bookmakers]
+
+def search_targets(odds, inverse, limits, top, counts, bankroll, unit):
+    # Best stakes over the targets top, top - 1, ... (counts of them) units of each leg, highest target
+    # first on ties. Problems needing similar numbers of targets share a pass, each pass within the
+    # chunk size. Returns (stakes, profits); NaN stakes and -inf profit where nothing is feasible.
+    problems, legs = odds.shape
+    stakes = np.full((problems, legs), np.nan)
+    best_profits = np.full(problems, -np.inf)
+    steps = odds * unit
+    widths = np.maximum(counts.max(axis=1), 1)
+    order = np.argsort(widths, kind='stable')
+    costs = widths[order] * legs * legs
+    start = 0
+    while start < problems:
+        end = start + max(int(np.searchsorted(np.arange(1, problems - start + 1) * costs[start:], SOLVER_CHUNK_SIZE,
+                                              side='right')), 1)
+        rows = order[start:end]
+        offsets = np.arange(widths[rows[-1]])
+        targets = (top[rows][:, :, None] - offsets) * steps[rows][:, :, None]
+        targets[offsets >= counts[rows][:, :, None]] = 0
+        targets = -np.sort(-targets.reshape(len(rows), -1), axis=1)
+        # The epsilon keeps a leg that is exactly on a unit from rounding up a whole unit
+        candidates = np.ceil(targets[:, :, None] * inverse[rows][:, None, :] / unit - 1e-9) * unit
+        investments = candidates.sum(axis=2)
+        profits = (candidates * odds[rows][:, None, :]).min(axis=2) - investments
+        infeasible = (targets <= 0) | (investments > bankroll + 1e-9) | (candidates > limits[rows][:, None, :]).any(axis=2)
+        profits[infeasible] = -np.inf
+        best = profits.argmax(axis=1)
+        best_profits[rows] = profits[np.arange(len(rows)), best]
+        found = best_profits[rows] > -np.inf
+        stakes[rows[found]] = candidates[np.flatnonzero(found), best[found]]
+        start = end
+    return stakes, best_profits
+
+def round_stakes(odds, inverse, payout, limits, bankroll, unit):
+    # Without rounding the optimum pays the same on every outcome: stake_i = payout / odds_i, with the
+    # payout as large as the bankroll and every leg's limit allow. With a stake unit, the best plan for a
+    # target payout T is stake_i = ceil(T / odds_i) units, and only targets where some leg is exactly on
+    # a unit matter. A plan paying T earns at most T * margin, so once some plan earns P, targets below
+    # P / margin can be skipped. A first pass over the few highest targets finds such a P; a second pass
+    # covers the rest of the window only where that bound leaves targets untried.
+    total_prob = inverse.sum(axis=1)
+    margin = 1 - total_prob
+    steps = odds * unit
+    # The epsilon keeps a binding limit, whose payout over its odds can come out just under a whole unit,
+    # from losing its top target
+    top = np.floor(payout[:, None] / steps + 1e-9)
+    # Rounding costs at most one unit per leg, bounding how far below the payout the optimum can be
+    low = np.maximum(payout - odds.shape[1] * unit * (1 / margin + 1 / total_prob), 0)
+    counts = np.clip(top - np.ceil(low[:, None] / steps) + 1, 0, MAX_ROUNDING_CANDIDATES).astype(np.int64)
+    first_counts = np.minimum(counts, FIRST_PASS_TARGETS)
+    stakes, profits = search_targets(odds, inverse, limits, top, first_counts, bankroll, unit)
+
+    refined = np.maximum(low, profits / margin)
+    counts = np.minimum(counts, np.clip(top - np.ceil(refined[:, None] / steps) + 1, 0, None).astype(np.int64))
+    rows = np.flatnonzero((counts > first_counts).any(axis=1))
+    if len(rows):
+        stakes[rows] = search_targets(odds[rows], inverse[rows], limits[rows], top[rows], counts[rows], bankroll, unit)[0]
+    return stakes
+
+def solve_stakes_batch(odds, limits=None, bankroll=BANKROLL, unit=STAKE_UNIT):
+    # Stakes maximizing the guaranteed profit for many markets with the same number of outcomes at once.
+    # odds and limits are (markets, outcomes) arrays. Returns (stakes, investment, payout, profit); rows
+    # with no rounded plan inside the bankroll and limits come back as NaN.
+    odds = np.asarray(odds, dtype=float)
+    inverse = 1 / odds
+    total_prob = inverse.sum(axis=1)
+    limits = np.full(odds.shape, np.inf) if limits is None else np.asarray(limits, dtype=float)
+    if unit:
+        limits = np.floor(limits / unit) * unit
+    payout = np.minimum(bankroll / total_prob, (limits * odds).min(axis=1))
+    stakes = payout[:, None] * inverse
+    if unit:
+        # Markets without a guaranteed profit to optimize just take the nearest whole units
+        stakes = np.minimum(np.round(stakes / unit) * unit, limits)
+        profitable = total_prob < 1
+        if profitable.any():
+            stakes[profitable] = round_stakes(odds[profitable], inverse[profitable], payout[profitable],
+                                              limits[profitable], bankroll, unit)
+    investment = stakes.sum(axis=1)
+    guaranteed = (stakes * odds).min(axis=1)
+    return stakes, investment, guaranteed, guaranteed - investment
+
+def stake_plans(odds, limits=None, bankroll=BANKROLL, unit=STAKE_UNIT):
+    # One StakePlan (or None) per market
+    stakes, investment, payout, profit = solve_stakes_batch(odds, limits, bankroll, unit)
+    return [None if plan[3] != plan[3] else StakePlan(tuple(plan[0]), *plan[1:])
+            for plan in zip(stakes.tolist(), investment.tolist(), payout.tolist(), profit.tolist())]
+
+def equal_payout_stakes(odds, bankroll=BANKROLL, limits=None):
+    # Exact, unrounded stakes paying the same on every outcome; plain Python, as numpy costs more
+    # than it saves on a handful of legs
+    inverse = [1 / price for price in odds]
+    payout = bankroll / sum(inverse)
+    if limits is not None:
+        payout = min([payout] + [limit * price for limit, price in zip(limits, odds)])
+    stakes = tuple(payout * weight for weight in inverse)
+    investment = sum(stakes)
+    guaranteed = min(stake * price for stake, price in zip(stakes, odds))
+    return StakePlan(stakes, investment, guaranteed, guaranteed - investment)
+
+def solve_stakes(odds, bankroll=BANKROLL, limits=None, unit=STAKE_UNIT):
+    # A single market; None when no rounded plan fits the bankroll and limits
+    if not unit:
+        return equal_payout_stakes(odds, bankroll, limits)
+    return stake_plans([odds], None if limits is None else [limits], bankroll, unit)[0]
@@ -0,0 +1,107 @@
+# Benchmark a backtest parameter sweep on a day of synthetic hourly snapshots with drifting prices and
+# final scores drawn from the true probabilities. The snapshots are parsed once for the whole sweep;
+# the cost of parsing them again for every bookmaker set, as separate runs would, is shown next to
+# it. Sweeps with 1 and N workers must give the same simulations, and every settled arbitrage must
+# return at least its investment plus the profit percentage the sweep thresholds it on.
+#
+# Usage: python -m benchmarks.bench_backtest [snapshots] [events_per_sport] [workers]
+
+import csv
+import io
+import os
+import random
+import sys
+import tempfile
+import time
+from contextlib import redirect_stdout
+from datetime import datetime, timedelta, timezone
+
+from analysis import backtest
+from analysis.backtest import RESULTS_HEADERS, ingest, run_backtest, scan_snapshots
+from analysis.batch_analysis import list_store_snapshots
+from benchmarks.bench_incremental import move_prices
+from benchmarks.synthetic import (DEFAULT_BOOKMAKERS, DEFAULT_MARKETS, DEFAULT_SPORTS, TOTALS, generate_payloads,
+                                  generate_priced_events)
+from scrapers.odds_api import flatten_odds
+from scrapers.snapshot_store import SnapshotStore
+
+BOOKMAKER_SETS = [set(DEFAULT_BOOKMAKERS), set(DEFAULT_BOOKMAKERS[:4]), set(DEFAULT_BOOKMAKERS[2:])]
+MIN_EVS = [0, 0.01, 0.02]
+MAX_EVS = [0.1, 0.15]
+MIN_ARBITRAGE_PROFITS = [0, 0.5]
+CHURN = 0.1  # Share of bookmaker rows repriced between hourly snapshots
+
+def final_score(rng, sport, probabilities):
+    # Winner drawn from the true probabilities; the total scatters around the sport's usual line
+    lines = TOTALS.get(sport, TOTALS['basketball_nba'])
+    total = max(1, round(rng.gauss(sum(lines) / len(lines), sum(lines) / len(lines) * 0.15)))
+    winner = rng.choices(range(len(probabilities)), probabilities)[0]
+    if winner == 2:
+        return total // 2, total // 2
+    margin = max(1, round(abs(rng.gauss(0, total * 0.05 + 1))))
+    loser = max(0, (total - margin) // 2)
+    return (loser + margin, loser) if winner == 0 else (loser, loser + margin)
+
+def write_results(filename, sports, events_per_sport, rng):
+    with open(filename, 'w', newline='', encoding='utf-8') as f:
+        writer = csv.writer(f)
+        writer.writerow(RESULTS_HEADERS)
+        for sport in sports:
+            for event, probabilities in generate_priced_events(sport, events_per_sport, DEFAULT_BOOKMAKERS, 0,
+                                                               DEFAULT_MARKETS):
+                writer.writerow([sport, event['home_team'], event['away_team'], event['commence_time'],
+                                 *final_score(rng, sport, probabilities)])
+
+def main(num_snapshots=24, events_per_sport=30, workers=None):
+    workers = workers or os.cpu_count() or 1
+    rng = random.Random(3)
+    all_data, _ = generate_payloads(DEFAULT_SPORTS, events_per_sport, arbitrage_rate=0.1, ev_rate=0.2)
+    rows = list(flatten_odds(all_data))
+    first_snapshot = datetime.now(timezone.utc) - timedelta(hours=num_snapshots)
+    combinations = len(BOOKMAKER_SETS) * (len(MIN_EVS) * len(MAX_EVS) + 2 * len(MIN_ARBITRAGE_PROFITS)) * 2
+
+    with tempfile.TemporaryDirectory() as workdir:
+        store = SnapshotStore(os.path.join(workdir, 'odds_store'))
+        for hour in range(num_snapshots):
+            store.append(rows, first_snapshot + timedelta(hours=hour))
+            rows = move_prices(rows, CHURN, rng)
+        results_file = os.path.join(workdir, 'results.csv')
+        write_results(results_file, DEFAULT_SPORTS, events_per_sport, rng)
+        snapshots = list_store_snapshots(store.directory)
+        print(f"{len(snapshots)} snapshots of {len(rows)} bookmaker rows, {len(BOOKMAKER_SETS)} bookmaker sets, "
+              f"{combinations} simulations on {os.cpu_count()} CPUs\n")
+
+        start = time.perf_counter()
+        ingest(snapshots, set().union(*BOOKMAKER_SETS))
+        ingest_time = time.perf_counter() - start
+
+        sweeps = {}
+        for count in sorted({1, workers}):
+            start = time.perf_counter()
+            with redirect_stdout(io.StringIO()):
+                sweeps[count] = run_backtest(snapshots, results_file, BOOKMAKER_SETS, MIN_EVS, MAX_EVS,
+                                             MIN_ARBITRAGE_PROFITS, count, workdir)
+            print(f"{f'sweep, {count} worker(s)':<36}{time.perf_counter() - start:8.3f}s")
+        print(f"{'one parse of every snapshot':<36}{ingest_time:8.3f}s")
+        print(f"{'parsing again per bookmaker set':<36}{ingest_time * (len(BOOKMAKER_SETS) - 1):8.3f}s more")
+        assert sweeps[1] == sweeps[workers], "Sweeps differ between worker counts"
+
+        arbitrage = [hit for hit in scan_snapshots(frozenset(DEFAULT_BOOKMAKERS), 0, len(backtest.REPLAY['tables']), 0, 1)
+                     if hit.category == 'Arbitrage' and hit.unit_return is not None]
+        worst = min((hit.unit_return for hit in arbitrage), default=1)
+        assert worst >= 1 - 1e-9, f"An arbitrage lost money: unit return {worst}"
+        # Thresholds apply to profit per dollar invested, the same scale simulate() stakes on
+        short = [hit for hit in arbitrage if hit.unit_return < 1 + hit.value / 100 - 1e-9]
+        assert not short, f"Arbitrage returned less than its guaranteed profit: {short[0]}"
+
+    print(f"\n{len(arbitrage)} settled arbitrage sightings, worst unit return {worst:.4f}")
+    best = {}
+    for row in sweeps[1]:
+        if row[0] not in best or row[11] > best[row[0]][11]:
+            best[row[0]] = row
+    for strategy, row in best.items():
+        print(f"best {strategy:<10} {row[1]:<48} {row[5]:<6} {row[6]:5d} bets, final bankroll {row[11]:10.2f}, "
+              f"max drawdown {row[12]:.1%}")
+
+if __name__ == "__main__":
+    main(*[int(a) for a in sys.argv[1:4]])
@@ -0,0 +1,49 @@
+# Benchmark sequential vs concurrent odds fetching against the local mock Odds API.
+#
+# Usage: python -m benchmarks.bench_fetch [num_sports] [max_concurrent]
+
+import sys
+import time
+
+from benchmarks.mock_odds_api import start_mock_server
+from benchmarks.synthetic import generate_events
+from scrapers import odds_api
+
+def fetch_sequential_unpooled(sports):
+    # Baseline: the original loop, one fresh connection per sport
+    all_data = {}
+    for sport in sports:
+        odds_data = odds_api.fetch_odds(sport)
+        if odds_data:
+            all_data[sport] = odds_data
+    return all_data
+
+def timed(label, fn, server):
+    server.connections = 0
+    start = time.perf_counter()
+    result = fn()
+    elapsed = time.perf_counter() - start
+    print(f"{label:<32} {elapsed:8.3f}s  ({server.connections} connections)")
+    return result, elapsed
+
+def main(num_sports=12, max_concurrent=odds_api.MAX_CONCURRENT_REQUESTS):
+    sports = [f"sport_{i}" for i in range(num_sports)]
+    payloads = {sport: generate_events(sport, num_events=15) for sport in sports}
+    server, base_url = start_mock_server(payloads)
+    odds_api.BASE_URL = base_url
+
+    try:
+        print(f"Fetching {num_sports} sports from mock Odds API at {base_url}\n")
+        baseline, baseline_time = timed("sequential (no session)", lambda: fetch_sequential_unpooled(sports), server)
+        pooled, pooled_time = timed("sequential (pooled session)", lambda: odds_api.fetch_all_odds(sports, max_concurrent=1), server)
+        concurrent, concurrent_time = timed(f"concurrent ({max_concurrent} in flight)", lambda: odds_api.fetch_all_odds(sports, max_concurrent=max_concurrent), server)
+    finally:
+        server.shutdown()
+
+    assert baseline == pooled == concurrent, "Fetch modes returned different data"
+    assert list(concurrent) == sports, "Concurrent fetch changed sport ordering"
+    print(f"\nSpeedup vs baseline: pooled {baseline_time / pooled_time:.2f}x, concurrent {baseline_time / concurrent_time:.2f}x")
+
+if __name__ == "__main__":
+    args = [int(a) for a in sys.argv[1:3]]
+    main(*args)
@@ -0,0 +1,86 @@
+# Benchmark incremental re-evaluation against a full analyze_odds pass when only a few prices move,
+# and check that two games of the same matchup on different dates keep their own rows: both of their
+# arbitrages are found, and an unchanged snapshot re-evaluates nothing.
+#
+# Usage: python -m benchmarks.bench_incremental [num_events] [churn]
+
+import os
+import random
+import sys
+import time
+from contextlib import redirect_stdout
+from datetime import datetime, timedelta, timezone
+
+from analysis.ev_analysis import ALLOWED_BOOKMAKERS, analyze_odds
+from analysis.incremental import IncrementalAnalyzer
+from benchmarks.bench_odds_table import arbitrage_key, ev_key, generate_rows, same_results
+from scrapers.odds_api import OddsRow
+
+def move_prices(rows, churn, rng):
+    # Reprice a fraction of bookmaker rows, as a typical polling cycle would see
+    rows = list(rows)
+    for i in rng.sample(range(len(rows)), int(len(rows) * churn)):
+        rows[i] = rows[i]._replace(home_odds=round(rows[i].home_odds + rng.choice([-0.05, 0.05]), 2),
+                                   over_odds=round(rows[i].over_odds + rng.choice([-0.03, 0.03]), 2))
+    return rows
+
+def check_same_matchup(now):
+    # A series: the same two teams one and two days out, each game with a moneyline arbitrage
+    first, second = sorted(ALLOWED_BOOKMAKERS)[:2]
+    rows = []
+    for days in (1, 2):
+        start_time = (now + timedelta(days=days)).strftime("%Y-%m-%dT%H:%M:%SZ")
+        rows.append(OddsRow('baseball_mlb', 'Home', 'Away', start_time, first, home_odds=2.20, away_odds=1.75))
+        rows.append(OddsRow('baseball_mlb', 'Home', 'Away', start_time, second, home_odds=1.75, away_odds=2.20))
+    positive_ev_bets, _, arbitrage_opportunities = analyze_odds(rows, now)
+    analyzer = IncrementalAnalyzer()
+    analyzer.update(rows, now)
+    bet_order = lambda bet: (ev_key(bet), bet['Start Time'])
+    assert len(arbitrage_opportunities) == 2, arbitrage_opportunities
+    assert same_results(sorted(arbitrage_opportunities, key=arbitrage_key),
+                        sorted(analyzer.arbitrage_opportunities, key=arbitrage_key)), "Same-matchup arbitrages differ"
+    assert same_results(sorted(positive_ev_bets, key=bet_order), sorted(analyzer.positive_ev_bets, key=bet_order)), \
+        "Same-matchup EV results differ"
+    analyzer.update(rows, now)
+    assert analyzer.markets_evaluated == 0, "Unchanged same-matchup rows re-evaluated"
+
+def main(num_events=2000, churn=0.02, cycles=5):
+    rng = random.Random(1)
+    rows = generate_rows(num_events)
+    now = datetime.now(timezone.utc)
+    analyzer = IncrementalAnalyzer()
+    full_time = incremental_time = 0
+    changes = 0
+
+    with open(os.devnull, 'w') as devnull, redirect_stdout(devnull):
+        check_same_matchup(now)
+        analyzer.update(rows, now)
+        for _ in range(cycles):
+            rows = move_prices(rows, churn, rng)
+
+            start = time.perf_counter()
+            positive_ev_bets, games, arbitrage_opportunities = analyze_odds(rows, now)
+            full_time += time.perf_counter() - start
+
+            start = time.perf_counter()
+            bet_delta, opportunity_delta = analyzer.update(rows, now)
+            incremental_time += time.perf_counter() - start
+            changes += sum(len(results) for results in (*bet_delta, *opportunity_delta))
+
+            assert same_results(sorted(positive_ev_bets, key=ev_key), sorted(analyzer.positive_ev_bets, key=ev_key)), \
+                "EV results differ"
+            assert same_results(sorted(arbitrage_opportunities, key=arbitrage_key),
+                                sorted(analyzer.arbitrage_opportunities, key=arbitrage_key)), "Arbitrage results differ"
+
+    total_markets = len(analyzer.results)
+    print(f"{len(rows)} bookmaker rows, {churn:.0%} repriced per cycle, {cycles} cycles "
+          f"(results identical to a full pass, also for a same-matchup series)")
+    print(f"last cycle re-evaluated {analyzer.markets_evaluated} markets, "
+          f"{changes / cycles:.0f} new/changed/expired results per cycle on average\n")
+    print(f"full analyze_odds          {full_time / cycles:8.3f}s per cycle")
+    print(f"incremental update         {incremental_time / cycles:8.3f}s per cycle")
+    print(f"\nSpeedup: {full_time / incremental_time:.1f}x ({total_markets} markets with results tracked)")
+
+if __name__ == "__main__":
+    args = sys.argv[1:3]
+    main(*[int(args[0])] if args else [], *[float(a) for a in args[1:]])
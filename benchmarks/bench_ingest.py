@@ -0,0 +1,52 @@
+# Benchmark streamed long-format ingestion against parsing the whole response with response.json().
+#
+# Usage: python -m benchmarks.bench_ingest [num_events] [props]
+
+import sys
+import time
+import tracemalloc
+
+from benchmarks.mock_odds_api import start_mock_server
+from benchmarks.synthetic import generate_events
+from scrapers import odds_api
+
+SPORT = 'basketball_nba'
+
+def buffered_quotes(sport, session):
+    # The previous path: the full response body and its decoded JSON tree are held while flattening
+    return odds_api.iter_quotes({sport: odds_api.fetch_odds(sport, session)})
+
+def measure(label, ingest, session):
+    tracemalloc.start()
+    start = time.perf_counter()
+    quotes = 0
+    markets = set()
+    for quote in ingest(SPORT, session):
+        quotes += 1
+        markets.add(quote.market)
+    elapsed = time.perf_counter() - start
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    print(f"{label:<26}{quotes:>9}{elapsed:>9.3f}s{peak / 1024 / 1024:>10.1f}MB")
+    return quotes, markets
+
+def main(num_events=60, props=40):
+    payload = generate_events(SPORT, num_events, markets=('h2h', 'spreads', 'totals'), alternate_lines=6, props=props)
+    server, base_url = start_mock_server({SPORT: payload}, latency=0, handshake_latency=0)
+    odds_api.BASE_URL = base_url
+    session = odds_api.create_session()
+    del payload
+
+    try:
+        print(f"{num_events} events, 6 bookmakers, main + alternate lines + {props} player props each\n")
+        print(f"{'':<26}{'quotes':>9}{'time':>10}{'peak':>12}")
+        buffered, markets = measure("response.json() + flatten", buffered_quotes, session)
+        streamed, _ = measure("streamed", odds_api.stream_quotes, session)
+        assert buffered == streamed, "Streamed ingestion lost quotes"
+        print(f"\nmarkets seen: {', '.join(sorted(markets))}")
+    finally:
+        session.close()
+        server.shutdown()
+
+if __name__ == "__main__":
+    main(*[int(a) for a in sys.argv[1:3]])
@@ -0,0 +1,88 @@
+# Benchmark the line-movement history: cost per quote update inside a polling loop, memory held,
+# and whether a planted steam move is caught with its lagging books. Also checks, on payloads carrying
+# the API's display titles ('BetOnline.ag', 'Circa Sports'), that a sharp book moving alone is steam.
+#
+# Usage: python -m benchmarks.bench_line_history [num_events] [cycles] [churn]
+
+import io
+import random
+import sys
+import time
+from contextlib import redirect_stdout
+from datetime import datetime, timezone
+
+from analysis.incremental import IncrementalAnalyzer
+from analysis.line_history import SHARP_BOOKMAKERS, LineHistory
+from benchmarks.bench_incremental import move_prices
+from benchmarks.bench_odds_table import generate_rows
+from benchmarks.synthetic import DEFAULT_BOOKMAKERS, generate_events, h2h_outcomes
+
+STEAM_BOOKMAKERS = ['betonlineag', 'fanduel', 'draftkings']  # The books that move on the planted event
+STEAM_SHORTENING = 0.85  # Planted move: the home price is cut by this factor
+
+def plant_steam(rows, game):
+    return [row._replace(home_odds=round(row.home_odds * STEAM_SHORTENING, 2))
+            if row.home_team == game and row.bookmaker in STEAM_BOOKMAKERS else row for row in rows]
+
+def check_sharp_titles(now):
+    for sharp in ('betonlineag', 'circasports'):
+        events = generate_events('basketball_nba', 1, DEFAULT_BOOKMAKERS + [sharp])
+        analyzer = IncrementalAnalyzer(watched_bookmakers=SHARP_BOOKMAKERS)
+        history = LineHistory()
+        steam = []
+        for cycle in range(2):
+            if cycle:
+                bookmaker = next(bookmaker for bookmaker in events[0]['bookmakers'] if bookmaker['key'] == sharp)
+                outcome = h2h_outcomes(events[0], bookmaker)[events[0]['home_team']]
+                outcome['price'] = round(outcome['price'] * STEAM_SHORTENING, 2)
+            with redirect_stdout(io.StringIO()):
+                analyzer.update({'basketball_nba': events}, now)
+            steam.extend(history.observe(analyzer.changed_rows, time.time() + 30 * cycle))
+        assert [move.movers for move in steam] == [(sharp,)], (sharp, steam)
+
+def main(num_events=2000, cycles=10, churn=0.02):
+    rng = random.Random(2)
+    rows = generate_rows(num_events)
+    now = datetime.now(timezone.utc)
+    check_sharp_titles(now)
+    analyzer = IncrementalAnalyzer()
+    history = LineHistory()
+    clock = time.time()
+    updates = 0
+    elapsed = 0
+    steam = []
+
+    for cycle in range(cycles + 1):
+        if cycle:
+            rows = move_prices(rows, churn, rng)
+        if cycle == cycles // 2:
+            rows = plant_steam(rows, rows[0].home_team)
+        with redirect_stdout(io.StringIO()):
+            analyzer.update(rows, now)
+        clock += 30
+        start = time.perf_counter()
+        steam.extend(history.observe(analyzer.changed_rows, clock))
+        elapsed += time.perf_counter() - start
+        updates += sum(2 if market == 'total' else 1 for _, quotes in analyzer.changed_rows for market, _ in quotes)
+
+    planted = [move for move in steam if move.game == f"{rows[0].home_team} vs {rows[0].away_team}"]
+    tracked = len(history)
+    memory = history.times.nbytes + history.prices.nbytes + history.heads.nbytes + history.counts.nbytes
+    start = time.perf_counter()
+    evicted = history.evict(clock + 60 * 60 * 24 * 30)
+    evict_time = time.perf_counter() - start
+
+    print(f"{len(rows)} bookmaker rows, {cycles} cycles at {churn:.0%} churn: {updates} quote updates, "
+          f"{tracked} quotes tracked ({memory / 1024 / 1024:.1f}MB of history rings)\n")
+    print(f"update cost          {elapsed / updates * 1e6:8.2f}us per quote")
+    print(f"evict {evicted} lines   {evict_time * 1000:8.2f}ms, {len(history)} quotes left\n")
+    print(f"{len(steam)} steam moves flagged")
+    for move in planted:
+        print(f"planted: {move.outcome} {move.market} moved by {', '.join(move.movers)} "
+              f"(sharp: {', '.join(sorted(SHARP_BOOKMAKERS.intersection(move.movers))) or 'none'}), "
+              f"{len(move.lagging)} lagging books: "
+              + ', '.join(f"{bookmaker} @ {odds:.2f}" for bookmaker, odds in move.lagging))
+    assert planted, "Planted steam move was not detected"
+
+if __name__ == "__main__":
+    main(*[float(a) if i == 2 else int(a) for i, a in enumerate(sys.argv[1:4])])
@@ -0,0 +1,97 @@
+# Benchmark the notification dispatcher: how long publishing blocks the scan loop, and the
+# fetch-to-alert latency per sink, with a deliberately slow webhook next to a fast mail server.
+# Also checks that a sink failing a few sends retries on its own, while the sink next to it sends
+# the alert once.
+#
+# Usage: python -m benchmarks.bench_notifications [num_scans] [opportunities_per_scan] [webhook_latency]
+
+import io
+import os
+import statistics
+import sys
+import time
+from contextlib import redirect_stdout
+
+from notifications import dispatcher as dispatcher_module
+from notifications.dispatcher import EmailSink, NotificationDispatcher, StdoutSink, WebhookSink
+from benchmarks.mock_notify import start_mock_smtp, start_mock_webhook
+
+def fake_opportunity(i):
+    return {'Sport': 'basketball_nba', 'Game': f"Home {i} vs Away {i}", 'Category': 'Arbitrage',
+            'Market': 'Moneyline', 'Date': '2026-10-17', 'Profit': 1.5, 'Total Investment': 100, 'Bets': [
+                {'Type': 'Moneyline', 'Team': f"Home {i}", 'Bookmaker': 'fanduel', 'Odds': 2.1, 'Stake': 50},
+                {'Type': 'Moneyline', 'Team': f"Away {i}", 'Bookmaker': 'betmgm', 'Odds': 2.1, 'Stake': 50}]}
+
+class FlakySink:
+    # Fails its first few sends, then records every batch it is given
+    def __init__(self, name, failures):
+        self.name = name
+        self.failures = failures
+        self.batches = []
+
+    def send(self, alerts):
+        if self.failures:
+            self.failures -= 1
+            raise ConnectionError("sink unavailable")
+        self.batches.append([alert.key for alert in alerts])
+
+def check_retries():
+    backoff = dispatcher_module.RETRY_BACKOFF
+    dispatcher_module.RETRY_BACKOFF = 0.01
+    flaky, steady = FlakySink('flaky', dispatcher_module.SEND_RETRIES - 1), FlakySink('steady', 0)
+    dispatcher = NotificationDispatcher([flaky, steady])
+    try:
+        with open(os.devnull, 'w') as devnull, redirect_stdout(devnull):
+            assert dispatcher.publish([fake_opportunity(0)]) == 1
+            time.sleep(0.2)
+            # The unchanged opportunity comes back next cycle; neither sink may send it again
+            assert dispatcher.publish([fake_opportunity(0)]) == 0
+            dispatcher.close()
+    finally:
+        dispatcher_module.RETRY_BACKOFF = backoff
+    assert len(flaky.batches) == 1 and len(steady.batches) == 1, (flaky.batches, steady.batches)
+    assert [worker.failed for worker in dispatcher.workers] == [0, 0]
+
+def percentile(values, fraction):
+    return sorted(values)[min(int(len(values) * fraction), len(values) - 1)] if values else float('nan')
+
+def main(num_scans=20, per_scan=10, webhook_latency=0.5):
+    check_retries()
+    webhook, url = start_mock_webhook(latency=webhook_latency)
+    smtp, smtp_port = start_mock_smtp()
+    # Stdout is captured so the benchmark output stays readable
+    dispatcher = NotificationDispatcher([StdoutSink(io.StringIO()), WebhookSink(url),
+                                         EmailSink(['me@localhost'], port=smtp_port)])
+    for worker in dispatcher.workers:
+        worker.min_interval = 0
+
+    publish_times = []
+    published = 0
+    try:
+        for scan in range(num_scans):
+            # Each scan repeats the previous scan's opportunities plus new ones, as a live market would
+            opportunities = [fake_opportunity(i) for i in range(scan * per_scan // 2, (scan + 2) * per_scan // 2)]
+            start = time.perf_counter()
+            published += dispatcher.publish(opportunities, fetched_at=time.time())
+            publish_times.append(time.perf_counter() - start)
+            time.sleep(0.05)  # The rest of a (very fast) scan cycle
+        start = time.perf_counter()
+        dispatcher.close()
+        drain = time.perf_counter() - start
+    finally:
+        webhook.shutdown()
+        smtp.shutdown()
+
+    print(f"{num_scans} scans x {per_scan} opportunities: {published} published after deduplication, "
+          f"webhook latency {webhook_latency}s per request\n")
+    print(f"publish() per scan: median {statistics.median(publish_times) * 1000:.2f}ms, "
+          f"max {max(publish_times) * 1000:.2f}ms; drain on close {drain:.2f}s\n")
+    print(f"{'sink':<10}{'sent':>6}{'failed':>8}{'p50':>9}{'p95':>9}{'max':>9}  fetch-to-alert")
+    for worker in dispatcher.workers:
+        latencies = list(worker.latencies)
+        print(f"{worker.sink.name:<10}{worker.sent:>6}{worker.failed:>8}{percentile(latencies, 0.5):>8.3f}s"
+              f"{percentile(latencies, 0.95):>8.3f}s{max(latencies, default=float('nan')):>8.3f}s")
+    print(f"\nwebhook received {len(webhook.received)} batches, mail server {len(smtp.received)} messages")
+
+if __name__ == "__main__":
+    main(*[float(a) if i == 2 else int(a) for i, a in enumerate(sys.argv[1:4])])
@@ -0,0 +1,100 @@
+# Benchmark the columnar OddsTable scan against the dict-based analyze_odds on synthetic quotes.
+#
+# Usage: python -m benchmarks.bench_odds_table [num_events]
+
+import contextlib
+import io
+import math
+import random
+import sys
+import time
+from datetime import datetime, timedelta, timezone
+
+from analysis.ev_analysis import ALLOWED_BOOKMAKERS, analyze_odds
+from analysis.odds_table import OddsTable, find_arbitrage, find_positive_ev
+from scrapers.odds_api import OddsRow
+
+SPORTS = ['basketball_nba', 'americanfootball_nfl', 'soccer_epl', 'baseball_mlb']
+
+def generate_rows(num_events, bookmakers=sorted(ALLOWED_BOOKMAKERS), seed=0):
+    rng = random.Random(seed)
+    start = datetime.now(timezone.utc) + timedelta(hours=1)
+    rows = []
+    for i in range(num_events):
+        sport = SPORTS[i % len(SPORTS)]
+        home_team, away_team = f"Home {i}", f"Away {i}"
+        start_time = (start + timedelta(minutes=17 * i % (60 * 24 * 20))).strftime("%Y-%m-%dT%H:%M:%SZ")
+        spread = rng.choice([-7.5, -3.5, -1.5, 1.5, 3.5])
+        total = rng.choice([2.5, 8.5, 44.5, 220.5])
+        for bookmaker in bookmakers:
+            # Books hang slightly different lines, so some markets only match across lines (middles)
+            line_shift = rng.choice([0, 0, 0, -1, 1])
+            vig = rng.uniform(0.97, 1.08)
+            home_prob = rng.uniform(0.3, 0.7)
+            draw = round(1 / (0.25 * vig), 2) if sport.startswith('soccer') else None
+            scale = 0.75 if draw else 1
+            rows.append(OddsRow(
+                sport, home_team, away_team, start_time, bookmaker,
+                home_odds=round(1 / (home_prob * scale * vig), 2),
+                away_odds=round(1 / ((1 - home_prob) * scale * vig), 2),
+                draw_odds=draw,
+                home_spread=spread + line_shift,
+                home_spread_odds=round(rng.uniform(1.8, 2.05), 2),
+                away_spread=-spread - line_shift,
+                away_spread_odds=round(rng.uniform(1.8, 2.05), 2),
+                over=total + line_shift,
+                over_odds=round(rng.uniform(1.8, 2.05), 2),
+                under_odds=round(rng.uniform(1.8, 2.05), 2),
+            ))
+    return rows
+
+def ev_key(bet):
+    return tuple(str(bet.get(k)) for k in ('Sport', 'Game', 'Bookmaker', 'Bet Type', 'Team'))
+
+def arbitrage_key(opportunity):
+    return (opportunity['Sport'], opportunity['Game'], opportunity['Market'], opportunity['Date'],
+            tuple((bet['Type'], bet['Bookmaker'], bet['Odds'], str(bet.get('Spread')), str(bet.get('Total')))
+                  for bet in opportunity['Bets']))
+
+def same_results(expected, actual):
+    if isinstance(expected, (int, float)) and isinstance(actual, (int, float)):
+        return math.isclose(expected, actual, rel_tol=1e-9, abs_tol=1e-12)
+    if type(expected) != type(actual):
+        return False
+    if isinstance(expected, dict):
+        return expected.keys() == actual.keys() and all(same_results(expected[k], actual[k]) for k in expected)
+    if isinstance(expected, list):
+        return len(expected) == len(actual) and all(same_results(e, a) for e, a in zip(expected, actual))
+    return expected == actual
+
+def main(num_events=2000):
+    rows = generate_rows(num_events)
+
+    with contextlib.redirect_stdout(io.StringIO()):
+        start = time.perf_counter()
+        positive_ev_bets, games, arbitrage_opportunities = analyze_odds(rows)
+        dict_time = time.perf_counter() - start
+
+    start = time.perf_counter()
+    table = OddsTable.from_rows(rows)
+    build_time = time.perf_counter() - start
+    start = time.perf_counter()
+    table_ev = find_positive_ev(table)
+    table_arbs = find_arbitrage(table)
+    scan_time = time.perf_counter() - start
+
+    assert same_results(sorted(positive_ev_bets, key=ev_key), sorted(table_ev, key=ev_key)), "EV results differ"
+    assert same_results(sorted(arbitrage_opportunities, key=arbitrage_key), sorted(table_arbs, key=arbitrage_key)), \
+        "Arbitrage results differ"
+
+    print(f"{len(rows)} bookmaker rows, {len(table)} quotes ({table.nbytes / len(table):.0f} bytes/quote in columns)")
+    middles = sum(1 for opportunity in table_arbs if opportunity['Category'] == 'Middle')
+    print(f"{len(table_ev)} +EV bets, {len(table_arbs) - middles} arbitrage opportunities, {middles} middles "
+          f"(identical in both engines)\n")
+    print(f"dict engine (parse + scan)      {dict_time:8.3f}s")
+    print(f"table build                     {build_time:8.3f}s")
+    print(f"table scan (EV + arbitrage)     {scan_time:8.3f}s")
+    print(f"\nSpeedup vs dict engine: scan only {dict_time / scan_time:.1f}x, build + scan {dict_time / (build_time + scan_time):.1f}x")
+
+if __name__ == "__main__":
+    main(*[int(a) for a in sys.argv[1:2]])
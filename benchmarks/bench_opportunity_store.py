@@ -0,0 +1,81 @@
+# Benchmark the SQLite opportunity store: batched inserts of a week of scan results, then the kind of
+# queries the store is for, each checked against a plain Python filter over the same results. Also
+# times heap top-K selection against sorting every EV bet.
+#
+# Usage: python -m benchmarks.bench_opportunity_store [runs] [events_per_sport]
+
+import heapq
+import os
+import sys
+import tempfile
+import time
+
+from analysis.ev_analysis import analyze_odds
+from analysis.opportunity_store import OpportunityStore, ev_row, opportunity_row
+from benchmarks.synthetic import DEFAULT_SPORTS, generate_payloads
+
+WEEK = 7 * 24 * 3600
+
+def main(runs=500, events_per_sport=40):
+    all_data, _ = generate_payloads(DEFAULT_SPORTS, events_per_sport, arbitrage_rate=0.2, ev_rate=0.2)
+    positive_ev_bets, _, arbitrage_opportunities = analyze_odds(all_data)
+    now = time.time()
+    # Runs spread evenly over the last week
+    times = [now - WEEK + WEEK * (run + 1) / runs for run in range(runs)]
+    per_run = len(positive_ev_bets) + len(arbitrage_opportunities)
+    print(f"{runs} runs of {len(positive_ev_bets)} EV bets + {len(arbitrage_opportunities)} opportunities "
+          f"({runs * per_run} rows)\n")
+
+    with tempfile.TemporaryDirectory() as workdir:
+        store = OpportunityStore(os.path.join(workdir, 'opportunities.db'))
+        start = time.perf_counter()
+        for recorded_at in times:
+            store.record(positive_ev_bets, arbitrage_opportunities, recorded_at)
+        elapsed = time.perf_counter() - start
+        assert len(store) == runs * per_run
+        print(f"{'record':<48}{elapsed / runs * 1000:8.2f}ms per run ({runs * per_run / elapsed:,.0f} rows/s)")
+
+        rows = [(ev_row(bet), 'EV') for bet in positive_ev_bets]
+        rows += [(opportunity_row(opportunity), opportunity['Category']) for opportunity in arbitrage_opportunities]
+        day_ago = now - 24 * 3600
+        recent_runs = sum(1 for recorded_at in times if recorded_at >= day_ago)
+        sport = DEFAULT_SPORTS[0]
+        bookmaker = positive_ev_bets[0]['Bookmaker']
+        queries = [
+            ("arbitrage >= 1% for one sport, last day",
+             dict(category='Arbitrage', sport=sport, min_profit=1, since=day_ago, limit=None),
+             lambda row: row[0][0] == 'Arbitrage' and row[0][1] == sport and row[0][4] >= 1, recent_runs),
+            ("EV >= 3% at one bookmaker, last day",
+             dict(category='EV', bookmaker=bookmaker, min_profit=3, since=day_ago, limit=None),
+             lambda row: row[0][0] == 'EV' and row[0][6][0][0] == bookmaker and row[0][4] >= 3, recent_runs),
+            ("every opportunity for one game, all week",
+             dict(game=positive_ev_bets[0]['Game'], limit=None),
+             lambda row: row[0][2] == positive_ev_bets[0]['Game'], runs),
+            ("top 10 of the last hour",
+             dict(since=now - 3600, limit=10), None, None),
+        ]
+        for label, filters, match, matching_runs in queries:
+            store.query(**filters)
+            start = time.perf_counter()
+            results = store.query(**filters)
+            elapsed = time.perf_counter() - start
+            if match is not None:
+                expected = sum(1 for row in rows if match(row)) * matching_runs
+                assert len(results) == expected, f"{label}: {len(results)} results, expected {expected}"
+            assert all(a['Recorded At'] >= filters.get('since', 0) for a in results)
+            print(f"{label:<48}{elapsed * 1000:8.2f}ms ({len(results)} results)")
+        store.close()
+
+    bets = positive_ev_bets * 20
+    start = time.perf_counter()
+    by_sort = sorted(bets, key=lambda x: x['EV'], reverse=True)[:10]
+    sort_time = time.perf_counter() - start
+    start = time.perf_counter()
+    by_heap = heapq.nlargest(10, bets, key=lambda x: x['EV'])
+    heap_time = time.perf_counter() - start
+    assert [bet['EV'] for bet in by_sort] == [bet['EV'] for bet in by_heap]
+    print(f"\ntop 10 of {len(bets)} EV bets: sort {sort_time * 1000:.2f}ms, heap {heap_time * 1000:.2f}ms")
+
+if __name__ == "__main__":
+    args = [int(a) for a in sys.argv[1:3]]
+    main(*args)
@@ -0,0 +1,66 @@
+# Benchmark analyze_odds scaling from 1 to N worker processes on a full synthetic slate. Every parallel
+# run must return the same EV bets and opportunities as the sequential pass, in the same order, the same
+# games and quotes, and count the same results in METRICS. A spawned pool, whose workers intern names
+# in their own order, must give the same quotes once they are translated.
+#
+# Usage: python -m benchmarks.bench_parallel_analysis [num_events] [max_workers]
+
+import multiprocessing
+import os
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime
+
+from analysis.ev_analysis import EST, analyze_odds, analyze_odds_parallel
+from benchmarks.bench_odds_table import generate_rows, same_results
+from monitoring.metrics import METRICS
+
+def same_games(games, other):
+    return other.keys() == games.keys() and all(
+        other[sport].keys() == games[sport].keys() and all(
+            {market: sorted(quotes) for market, quotes in other[sport][game].items()} ==
+            {market: sorted(quotes) for market, quotes in data.items()} for game, data in games[sport].items())
+        for sport in games)
+
+def counters():
+    return {name: value for name, value in ((counter['name'], counter['value'])
+                                             for counter in METRICS.snapshot()['counters'])}
+
+def main(num_events=4000, max_workers=None):
+    max_workers = max_workers or os.cpu_count() or 1
+    rows = generate_rows(num_events)
+    now = datetime.now(EST)
+
+    METRICS.reset()
+    start = time.perf_counter()
+    positive_ev_bets, games, arbitrage_opportunities = analyze_odds(rows, now, workers=1)
+    sequential = time.perf_counter() - start
+    sequential_counters = counters()
+    print(f"{len(rows)} bookmaker rows, {len(positive_ev_bets)} EV bets, {len(arbitrage_opportunities)} opportunities "
+          f"on {os.cpu_count()} CPUs\n")
+    print(f"{'sequential':<24}{sequential:8.3f}s")
+
+    workers = 1
+    while workers <= max_workers:
+        # The pool is started before timing, as a resident scanner would keep one
+        with ProcessPoolExecutor(max_workers=workers) as executor:
+            analyze_odds_parallel(rows[:1], now, workers, executor)
+            METRICS.reset()
+            start = time.perf_counter()
+            parallel_bets, parallel_games, parallel_opportunities = analyze_odds_parallel(rows, now, workers, executor)
+            elapsed = time.perf_counter() - start
+        assert same_results(positive_ev_bets, parallel_bets), f"EV bets differ with {workers} workers"
+        assert same_results(arbitrage_opportunities, parallel_opportunities), \
+            f"Opportunities differ with {workers} workers"
+        assert same_games(games, parallel_games), "Games differ"
+        assert counters() == sequential_counters, f"Counters differ with {workers} workers"
+        print(f"{f'{workers} worker(s)':<24}{elapsed:8.3f}s  ({sequential / elapsed:.2f}x)")
+        workers *= 2
+
+    with ProcessPoolExecutor(max_workers=2, mp_context=multiprocessing.get_context('spawn')) as executor:
+        _, spawned_games, _ = analyze_odds_parallel(rows, now, 2, executor)
+    assert same_games(games, spawned_games), "Games differ from a spawned pool"
+
+if __name__ == "__main__":
+    main(*[int(a) for a in sys.argv[1:3]])
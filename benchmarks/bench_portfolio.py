@@ -0,0 +1,101 @@
+# Benchmark sizing the portfolio of every current EV bet and opportunity on a large slate: solve
+# time for growing candidate counts, every cap respected, opportunity legs in whole units within their
+# bookmaker limits, two books' prices on one outcome sized as one bet rather than two, a home win and a
+# draw never winning together, and an expected log growth at least that of staking each bet at its own
+# fractional Kelly (scaled down to the bankroll cap) over the same simulated outcomes.
+#
+# Usage: python -m benchmarks.bench_portfolio [events_per_sport] [repeats]
+
+import sys
+import time
+from collections import defaultdict
+
+import numpy as np
+
+from analysis import portfolio
+from analysis.ev_analysis import analyze_odds
+from analysis.portfolio import (MAX_BANKROLL_FRACTION, MAX_BET_FRACTION, MAX_BOOKMAKER_FRACTION, MAX_GAME_FRACTION,
+                                SCENARIOS, SEED, expected_log_growth, scenario_returns, select_candidates,
+                                size_portfolio)
+from analysis.stakes import STAKE_UNIT, stake_limits
+from benchmarks.synthetic import DEFAULT_SPORTS, generate_payloads
+
+def check_caps(result):
+    games = defaultdict(float)
+    bookmakers = defaultdict(float)
+    for position in result.positions:
+        candidate = position.candidate
+        games[candidate['Sport'], candidate['Game']] += position.stake
+        if position.category == 'EV':
+            assert position.stake <= MAX_BET_FRACTION * result.bankroll + 1e-6, "Bet cap exceeded"
+            bookmakers[candidate['Bookmaker']] += position.stake
+        else:
+            assert position.stake <= candidate['Total Investment'] + 1e-6, "Opportunity scaled past its stakes"
+            assert abs(sum(position.legs) - position.stake) < 1e-6, "Legs do not add up to the stake"
+            limits = stake_limits([leg['Bookmaker'] for leg in candidate['Bets']])
+            for leg, stake, limit in zip(candidate['Bets'], position.legs, limits):
+                assert stake <= limit, "Leg over its bookmaker limit"
+                assert not STAKE_UNIT or abs(stake / STAKE_UNIT - round(stake / STAKE_UNIT)) < 1e-9, \
+                    "Leg not in whole units"
+                bookmakers[leg['Bookmaker']] += stake
+    assert result.staked <= MAX_BANKROLL_FRACTION * result.bankroll + 1e-6, "Bankroll cap exceeded"
+    assert max(games.values()) <= MAX_GAME_FRACTION * result.bankroll + 1e-6, "Game cap exceeded"
+    assert max(bookmakers.values()) <= MAX_BOOKMAKER_FRACTION * result.bankroll + 1e-6, "Bookmaker cap exceeded"
+
+def check_duplicate_outcome(positive_ev_bets):
+    # The same price at a second bookmaker adds no new information, so the pair must be staked about
+    # as much as the one bet; sizing them independently would double the exposure
+    bet = min(positive_ev_bets, key=lambda bet: abs(bet['EV'] - 0.04) + abs(bet['Odds'] - 2.0))
+    single = size_portfolio([bet], [])
+    pair = size_portfolio([bet, dict(bet, Bookmaker=bet['Bookmaker'] + ' (copy)')], [])
+    assert 0 < pair.staked <= single.staked * 1.1 + 1, (single.staked, pair.staked)
+    return single.staked, pair.staked
+
+def check_exclusive_outcomes():
+    # A soccer home win @2.30 and the draw @3.70 on the same game must never both win
+    game = {'Sport': 'soccer_epl', 'Game': 'Home FC vs Away FC', 'Bet Type': 'Moneyline', 'Bookmaker': 'fanduel'}
+    home = dict(game, Team='Home FC', Odds=2.30, EV=0.035)
+    draw = dict(game, Team='Draw', Odds=3.70, EV=0.02)
+    away = dict(game, Team='Away FC', Odds=3.40, EV=0.01)
+    for bets in ([home, draw], [draw, away], [home, draw, away]):
+        returns, _, _ = scenario_returns([(bet['EV'], 'EV', bet) for bet in bets], SCENARIOS,
+                                         np.random.default_rng(SEED))
+        assert ((returns > 0).sum(axis=1) <= 1).all(), "Exclusive outcomes won together"
+
+def naive_growth(candidates, returns, bankroll, kelly_fraction):
+    # Each bet at its own fractional Kelly (EV / (odds - 1)), each opportunity at its full stakes, all
+    # scaled down together to the bankroll cap
+    fractions = np.array([min(kelly_fraction * value / (candidate['Odds'] - 1), MAX_BET_FRACTION)
+                          if category == 'EV' else candidate['Total Investment'] / bankroll
+                          for value, category, candidate in candidates])
+    fractions *= min(1, MAX_BANKROLL_FRACTION / fractions.sum())
+    return expected_log_growth(returns, fractions)
+
+def main(events_per_sport=150, repeats=3):
+    all_data, _ = generate_payloads(DEFAULT_SPORTS, events_per_sport, arbitrage_rate=0.2, ev_rate=0.2)
+    positive_ev_bets, _, arbitrage_opportunities = analyze_odds(all_data)
+    print(f"{len(positive_ev_bets)} EV bets, {len(arbitrage_opportunities)} opportunities\n")
+
+    for max_candidates in (100, 300, 500):
+        portfolio.MAX_CANDIDATES = max_candidates
+        candidates = select_candidates(positive_ev_bets, arbitrage_opportunities)
+        best = float('inf')
+        for _ in range(repeats):
+            start = time.perf_counter()
+            result = size_portfolio(positive_ev_bets, arbitrage_opportunities)
+            best = min(best, time.perf_counter() - start)
+        check_caps(result)
+
+        returns, _, _ = scenario_returns(candidates, SCENARIOS, np.random.default_rng(SEED))
+        naive = naive_growth(candidates, returns, result.bankroll, portfolio.KELLY_FRACTION)
+        assert result.growth >= naive, (result.growth, naive)
+        print(f"{len(candidates):4d} candidates  {best * 1000:8.1f}ms  {len(result.positions):4d} positions, "
+              f"staked {result.staked:7.2f}, expected profit {result.expected_profit:6.2f}, "
+              f"log growth {result.growth:.4%} (independent Kelly {naive:.4%})")
+
+    check_exclusive_outcomes()
+    single, pair = check_duplicate_outcome(positive_ev_bets)
+    print(f"\nOne bet staked {single:.2f}; the same bet at two bookmakers staked {pair:.2f} in total")
+
+if __name__ == "__main__":
+    main(*[int(a) for a in sys.argv[1:3]])
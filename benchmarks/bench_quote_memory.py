@@ -0,0 +1,108 @@
+# Measure memory held per quote by the old dict bets against the interned SideQuote/TotalQuote records.
+#
+# Usage: python -m benchmarks.bench_quote_memory [num_events]
+
+import csv
+import gc
+import os
+import sys
+import tempfile
+import time
+import tracemalloc
+
+from analysis.ev_analysis import (ALLOWED_BOOKMAKER_MASK, ALLOWED_BOOKMAKERS, EventTimes, calculate_implied_probability,
+                                  read_odds_csv)
+from analysis.quotes import AWAY, BOOKMAKERS, HOME, TEAMS, SideQuote, TotalQuote, in_mask
+from benchmarks.bench_odds_table import generate_rows
+from scrapers.odds_api import CSV_HEADERS
+
+def write_snapshot(rows, filename):
+    # Round-trip through a CSV so every row carries its own string objects, as in production
+    with open(filename, 'w', newline='', encoding='utf-8') as f:
+        writer = csv.writer(f)
+        writer.writerow(CSV_HEADERS)
+        for row in rows:
+            writer.writerow(['N/A' if value is None else value for value in row])
+
+def dict_quotes(filename):
+    # The bet dicts analyze_odds built before quotes were interned
+    event_times = EventTimes()
+    quotes = []
+    for row in read_odds_csv(filename):
+        bookmaker = row.bookmaker.lower()
+        if bookmaker not in ALLOWED_BOOKMAKERS:
+            continue
+        commence_time, start_time, in_window = event_times.get(row.start_time)
+        if not in_window:
+            continue
+        for team, odds in ((row.home_team, row.home_odds), (row.away_team, row.away_odds)):
+            quotes.append({'Team': team, 'Bookmaker': bookmaker, 'Odds': odds,
+                           'Implied Probability': calculate_implied_probability(odds),
+                           'Start Time': start_time, 'Commence Time': commence_time, 'Bet Type': 'Moneyline'})
+        for side, team, spread, odds in (('Home', row.home_team, row.home_spread, row.home_spread_odds),
+                                         ('Away', row.away_team, -row.home_spread, row.away_spread_odds)):
+            quotes.append({'Team': team, 'Bookmaker': bookmaker, 'Odds': odds,
+                           'Implied Probability': calculate_implied_probability(odds), 'Spread': spread, 'Side': side,
+                           'Start Time': start_time, 'Commence Time': commence_time, 'Bet Type': 'Spread'})
+        quotes.append({'Total': row.over, 'Bookmaker': bookmaker, 'Over Odds': row.over_odds,
+                       'Under Odds': row.under_odds,
+                       'Over Implied Probability': calculate_implied_probability(row.over_odds),
+                       'Under Implied Probability': calculate_implied_probability(row.under_odds),
+                       'Start Time': start_time, 'Commence Time': commence_time})
+    return quotes
+
+def record_quotes(filename):
+    event_times = EventTimes()
+    quotes = []
+    for row in read_odds_csv(filename):
+        bookmaker = BOOKMAKERS.intern(row.bookmaker)
+        if not in_mask(ALLOWED_BOOKMAKER_MASK, bookmaker):
+            continue
+        commence_time, start_time, in_window = event_times.get(row.start_time)
+        if not in_window:
+            continue
+        home_team, away_team = TEAMS.intern(row.home_team), TEAMS.intern(row.away_team)
+        quotes.append(SideQuote(home_team, away_team, bookmaker, row.home_odds,
+                                calculate_implied_probability(row.home_odds), commence_time, start_time, HOME))
+        quotes.append(SideQuote(away_team, home_team, bookmaker, row.away_odds,
+                                calculate_implied_probability(row.away_odds), commence_time, start_time, AWAY))
+        quotes.append(SideQuote(home_team, away_team, bookmaker, row.home_spread_odds,
+                                calculate_implied_probability(row.home_spread_odds), commence_time, start_time, HOME,
+                                row.home_spread))
+        quotes.append(SideQuote(away_team, home_team, bookmaker, row.away_spread_odds,
+                                calculate_implied_probability(row.away_spread_odds), commence_time, start_time, AWAY,
+                                -row.home_spread))
+        quotes.append(TotalQuote(row.over, bookmaker, row.over_odds, row.under_odds,
+                                 calculate_implied_probability(row.over_odds),
+                                 calculate_implied_probability(row.under_odds), commence_time, start_time))
+    return quotes
+
+def measure(build, filename):
+    gc.collect()
+    tracemalloc.start()
+    start = time.perf_counter()
+    quotes = build(filename)
+    elapsed = time.perf_counter() - start
+    held, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return len(quotes), held, peak, elapsed
+
+def main(num_events=2000):
+    rows = generate_rows(num_events)
+    fd, filename = tempfile.mkstemp(suffix='.csv')
+    os.close(fd)
+    try:
+        write_snapshot(rows, filename)
+        print(f"{len(rows)} bookmaker rows from {num_events} events\n")
+        print(f"{'':<22}{'quotes':>8}{'held':>12}{'peak':>12}{'bytes/quote':>13}{'build':>9}")
+        results = {}
+        for label, build in (('dict bets', dict_quotes), ('interned records', record_quotes)):
+            count, held, peak, elapsed = measure(build, filename)
+            results[label] = held / count
+            print(f"{label:<22}{count:>8}{held / 1024:>10.0f}KB{peak / 1024:>10.0f}KB{held / count:>13.0f}{elapsed:>8.2f}s")
+        print(f"\nMemory per quote: {results['dict bets'] / results['interned records']:.1f}x smaller")
+    finally:
+        os.remove(filename)
+
+if __name__ == "__main__":
+    main(*map(int, sys.argv[1:2]))
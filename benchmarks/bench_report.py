@@ -0,0 +1,99 @@
+# Benchmark writing the recommendations report for a large slate: the old path (many small writes,
+# the log read back and printed, then read back and printed again by the caller) against rendering
+# once and sending the text to the file and the console, with and without the JSON report. Apart
+# from the data summary, which is now one line per game, both reports must hold the same text.
+#
+# Usage: python -m benchmarks.bench_report [num_events] [repeats]
+
+import heapq
+import io
+import json
+import os
+import sys
+import tempfile
+import time
+
+from analysis.ev_analysis import TOP_EV_BETS, analyze_odds, format_arbitrage_opportunity, format_bet_recommendation
+from analysis.report import DATA_SUMMARY_MAX_GAMES, REPORT_SECTIONS, write_report
+from benchmarks.bench_odds_table import generate_rows
+
+def legacy_report(positive_ev_bets, games, arbitrage_opportunities, log_filename, console):
+    # The report as ev_analysis.main used to write it, and as main.py then printed it a second time
+    with open(log_filename, 'w') as log_file:
+        log_file.write("Betting Recommendations:\n\n")
+        log_file.write("Data Summary:\n")
+        for sport, sport_games in games.items():
+            log_file.write(f"{sport}:\n")
+            for game, data in sport_games.items():
+                log_file.write(f"  {game}:\n")
+                for market in ['moneyline', 'spread', 'total']:
+                    if market in data:
+                        log_file.write(f"    {market.capitalize()}: {len(data[market])} odds\n")
+        log_file.write("\n")
+        log_file.write("High Value Bets:\n")
+        for bet in heapq.nlargest(TOP_EV_BETS, positive_ev_bets, key=lambda x: x['EV']):
+            log_file.write(format_bet_recommendation(bet))
+            log_file.write("\n")
+        log_file.write("\nArbitrage Opportunities:\n")
+        for opportunity in sorted(arbitrage_opportunities, key=lambda x: x['Profit'], reverse=True):
+            log_file.write(format_arbitrage_opportunity(opportunity))
+            log_file.write("\n")
+    for _ in range(2):
+        with open(log_filename, 'r') as log_file:
+            console.write(log_file.read() + "\n")
+
+def main(num_events=4000, repeats=5):
+    rows = generate_rows(num_events)
+    positive_ev_bets, games, arbitrage_opportunities = analyze_odds(rows)
+    game_count = sum(len(sport_games) for sport_games in games.values())
+    print(f"{game_count} games, {len(positive_ev_bets)} EV bets, {len(arbitrage_opportunities)} opportunities\n")
+
+    with tempfile.TemporaryDirectory() as workdir:
+        timings = {}
+        legacy_file = os.path.join(workdir, 'legacy.txt')
+        variants = [
+            ('legacy (write, read back twice)', lambda console: legacy_report(
+                positive_ev_bets, games, arbitrage_opportunities, legacy_file, console)),
+            ('render once, text only', lambda console: write_report(
+                positive_ev_bets, games, arbitrage_opportunities, REPORT_SECTIONS, console, False, workdir)),
+            ('render once, no data summary', lambda console: write_report(
+                positive_ev_bets, games, arbitrage_opportunities, ('ev_bets', 'arbitrage', 'summary'), console,
+                False, workdir)),
+            ('render once, text + JSON', lambda console: write_report(
+                positive_ev_bets, games, arbitrage_opportunities, REPORT_SECTIONS, console, True, workdir)),
+        ]
+        for label, run in variants:
+            best = float('inf')
+            for _ in range(repeats):
+                # The console is redirected to a file, as it is when runs are logged
+                with open(os.path.join(workdir, 'console.txt'), 'w') as console:
+                    start = time.perf_counter()
+                    run(console)
+                    console.flush()
+                    best = min(best, time.perf_counter() - start)
+                    written = console.tell()
+            timings[label] = best
+            print(f"{label:<36}{best * 1000:8.2f}ms  ({written / 1024 / 1024:.1f}MB to the console)")
+
+        log_filename = write_report(positive_ev_bets, games, arbitrage_opportunities, REPORT_SECTIONS,
+                                    io.StringIO(), True, workdir)
+        with open(log_filename) as f:
+            text = f.read()
+        with open(legacy_file) as f:
+            legacy = f.read()
+        tail = lambda report: report[report.index("High Value Bets:"):report.index("\nBetting Strategy Summary:")]
+        assert tail(text) == legacy[legacy.index("High Value Bets:"):], "Report sections differ"
+        with open(log_filename[:-4] + '.json') as f:
+            data = json.load(f)
+        assert data['ev_bet_count'] == len(positive_ev_bets)
+        assert len(data['arbitrage_opportunities']) == len(arbitrage_opportunities)
+        default = io.StringIO()
+        write_report(positive_ev_bets, games, arbitrage_opportunities, None, default, False, workdir)
+        assert ("Data Summary:" in default.getvalue()) == (game_count <= DATA_SUMMARY_MAX_GAMES)
+
+    legacy = timings['legacy (write, read back twice)']
+    print(f"\nSpeedup: {legacy / timings['render once, text only']:.1f}x for the same text report, "
+          f"{legacy / timings['render once, no data summary']:.1f}x without the data summary")
+
+if __name__ == "__main__":
+    main(*[int(a) for a in sys.argv[1:3]])
@@ -0,0 +1,88 @@
+# Benchmark hot-reloading the settings file in a warm scanner: the per-cycle cost of checking an
+# untouched file, the cost of a reload, and the cycle that follows one. After the reload the warm
+# incremental analyzer must give exactly what a full analyze_odds gives under the new settings, and
+# settings that did not change must not rebuild their derived lookups.
+#
+# Usage: python -m benchmarks.bench_settings [num_events] [checks]
+
+import json
+import os
+import sys
+import tempfile
+import time
+from contextlib import redirect_stdout
+from datetime import datetime, timezone
+
+from analysis import ev_analysis
+from analysis.ev_analysis import analyze_odds
+from analysis.incremental import IncrementalAnalyzer
+from benchmarks.bench_odds_table import arbitrage_key, ev_key, generate_rows, same_results
+from config.settings import ANALYSIS_FIELDS, DEFAULTS, SettingsWatcher, apply_settings
+from scrapers import odds_api
+
+def write_settings(filename, settings):
+    # A new file replaces the old one in one rename, as editors and deploy scripts do
+    with open(filename + '.tmp', 'w', encoding='utf-8') as f:
+        json.dump(settings, f)
+    os.replace(filename + '.tmp', filename)
+
+def main(num_events=2000, checks=10000):
+    rows = generate_rows(num_events)
+    now = datetime.now(timezone.utc)
+    analyzer = IncrementalAnalyzer()
+    bookmakers = sorted(ev_analysis.ALLOWED_BOOKMAKERS)
+
+    with tempfile.TemporaryDirectory() as workdir, open(os.devnull, 'w') as devnull:
+        filename = os.path.join(workdir, 'settings.json')
+        write_settings(filename, {'min_ev_threshold': 0.0})
+        watcher = SettingsWatcher(filename)
+        with redirect_stdout(devnull):
+            watcher.check()
+            analyzer.update(rows, now)
+
+        start = time.perf_counter()
+        for _ in range(checks):
+            assert not watcher.check()
+        check_time = (time.perf_counter() - start) / checks
+
+        # Only analysis settings change, so the fetch parameters must survive the reload as they are
+        market_params = odds_api.MARKET_PARAMS
+        write_settings(filename, {'min_ev_threshold': 0.02, 'max_ev_threshold': 0.1,
+                                  'allowed_bookmakers': bookmakers[:len(bookmakers) // 2 + 1]})
+        with redirect_stdout(devnull):
+            start = time.perf_counter()
+            changed = watcher.check()
+            reload_time = time.perf_counter() - start
+            assert set(changed) == {'min_ev_threshold', 'max_ev_threshold', 'allowed_bookmakers'}, changed
+            assert odds_api.MARKET_PARAMS is market_params, "Fetch parameters rebuilt for an analysis change"
+            if any(field in ANALYSIS_FIELDS for field in changed):
+                analyzer.invalidate()
+
+            start = time.perf_counter()
+            analyzer.update(rows, now)
+            warm_time = time.perf_counter() - start
+            start = time.perf_counter()
+            positive_ev_bets, _, arbitrage_opportunities = analyze_odds(rows, now)
+            full_time = time.perf_counter() - start
+
+        assert same_results(sorted(positive_ev_bets, key=ev_key), sorted(analyzer.positive_ev_bets, key=ev_key)), \
+            "EV results differ after the reload"
+        assert same_results(sorted(arbitrage_opportunities, key=arbitrage_key),
+                            sorted(analyzer.arbitrage_opportunities, key=arbitrage_key)), \
+            "Arbitrage results differ after the reload"
+        assert all(0.02 <= bet['EV'] <= 0.1 for bet in analyzer.positive_ev_bets)
+
+        write_settings(filename, {'min_ev_threshold': 0.02, 'max_ev_threshold': 'high'})
+        with redirect_stdout(devnull):
+            assert not watcher.check(), "An invalid file was applied"
+        assert ev_analysis.MAX_EV_THRESHOLD == 0.1
+
+    apply_settings(DEFAULTS, watcher.settings)
+    print(f"{len(rows)} bookmaker rows, {len(analyzer.results)} markets tracked (results identical to a full pass)\n")
+    print(f"check, file untouched      {check_time * 1e6:8.2f}us")
+    print(f"reload                     {reload_time * 1000:8.2f}ms")
+    print(f"warm update after reload   {warm_time:8.3f}s")
+    print(f"full analyze_odds          {full_time:8.3f}s")
+
+if __name__ == "__main__":
+    main(*[int(a) for a in sys.argv[1:3]])
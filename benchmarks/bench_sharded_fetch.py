@@ -0,0 +1,84 @@
+# Benchmark sharded multi-key fetching of several regions against the local mock Odds API acting as
+# several accounts with their own quotas and rate limits. One key is given too little quota, so its work
+# has to move to the others mid-fetch. Checks that the merged event set matches the mock's payloads exactly,
+# that no key was billed past its quota, and that the remaining quota gauge is only ever labelled per key.
+#
+# Usage: python -m benchmarks.bench_sharded_fetch [events_per_sport] [keys] [processes]
+
+import sys
+import time
+
+from benchmarks.mock_odds_api import start_mock_server
+from benchmarks.synthetic import DEFAULT_SPORTS, generate_payloads
+from monitoring.metrics import METRICS
+from scrapers import odds_api
+from scrapers.odds_api import MARKETS
+from scrapers.sharded_fetch import ShardedFetcher
+
+BOOKMAKER_REGIONS = {
+    'fanduel': 'us', 'draftkings': 'us', 'betmgm': 'us',
+    'espnbet': 'us2', 'betrivers': 'us2',
+    'williamhill': 'uk', 'skybet': 'uk',
+    'pinnacle': 'eu', 'unibet_eu': 'eu',
+    'sportsbet': 'au', 'tab': 'au',
+}
+REGIONS = ['us', 'us2', 'uk', 'eu', 'au']  # Configured regions; every request asks for all of them
+KEY_RATE_LIMIT = 10  # Requests per second the mock allows each key
+SMALL_QUOTA = 15  # Quota of the key that runs out
+
+def normalize(all_data):
+    # Event set as {sport: {event id: {bookmaker: {market: outcomes}}}}, independent of ordering
+    return {sport: {event['id']: {bookmaker['key']: {market['key']: market['outcomes'] for market in bookmaker['markets']}
+                                  for bookmaker in event['bookmakers']} for event in events}
+            for sport, events in all_data.items()}
+
+def expected_data(all_data):
+    # What the fetcher should see: the configured markets of each sport, bookmakers of every region
+    return normalize({sport: [{**event, 'bookmakers': [
+        {**bookmaker, 'markets': [market for market in bookmaker['markets']
+                                  if market['key'] in MARKETS.get(sport, MARKETS['default'])]}
+        for bookmaker in event['bookmakers']]} for event in events] for sport, events in all_data.items()})
+
+def run(label, all_data, keys, quotas, processes, latency):
+    server, base_url = start_mock_server(all_data, latency=latency, handshake_latency=latency, key_quotas=quotas,
+                                         key_rate_limit=KEY_RATE_LIMIT, bookmaker_regions=BOOKMAKER_REGIONS)
+    odds_api.BASE_URL = base_url
+    fetcher = ShardedFetcher(keys, REGIONS, processes, rate_limit=KEY_RATE_LIMIT * 0.8)
+    try:
+        start = time.perf_counter()
+        fetched = fetcher.fetch(list(all_data))
+        elapsed = time.perf_counter() - start
+    finally:
+        server.shutdown()
+
+    units = len(fetcher.work_units(list(all_data)))
+    rate_limited = sum(count for (_, status), count in server.key_statuses.items() if status == 429)
+    print(f"{label:<28}{elapsed:8.2f}s  {units} units, {server.requests} billed requests, {rate_limited} rate limited")
+    for key in keys:
+        print(f"    {key:<10} used {server.key_used[key]:>4} of {quotas[key]}")
+        assert server.key_used[key] <= quotas[key], f"{key} went over its quota"
+    assert normalize(fetched) == expected_data(all_data), "Merged event set differs from the mock's payloads"
+    assert not [labels for name, labels in METRICS.gauges if name == 'api_requests_remaining' and not labels], \
+        "Unlabelled quota gauge written while sharding"
+    assert all([event['commence_time'] for event in events] == sorted(event['commence_time'] for event in events)
+               for events in fetched.values()), "Events are not in start time order"
+    return elapsed
+
+def main(events_per_sport=20, num_keys=3, processes=3, latency=0.02):
+    all_data, _ = generate_payloads(DEFAULT_SPORTS, events_per_sport, list(BOOKMAKER_REGIONS))
+    keys = [f"key{i}" for i in range(num_keys)]
+    units = sum(len(MARKETS.get(sport, MARKETS['default'])) for sport in all_data) * len(REGIONS)
+    # Enough quota overall, but the first key can only cover a fraction of its share
+    quotas = {key: units for key in keys}
+    quotas[keys[0]] = SMALL_QUOTA
+    print(f"{len(all_data)} sports x {events_per_sport} events x {len(BOOKMAKER_REGIONS)} bookmakers in "
+          f"{len(REGIONS)} regions; {num_keys} keys at {KEY_RATE_LIMIT} requests/s\n")
+
+    single = run("one key", all_data, keys[1:2], {keys[1]: units + 20}, 1, latency)
+    threaded = run(f"{num_keys} keys, threads", all_data, keys, quotas, 1, latency)
+    sharded = run(f"{num_keys} keys, {processes} processes", all_data, keys, quotas, processes, latency)
+    print(f"\nSpeedup vs one key: threads {single / threaded:.2f}x, processes {single / sharded:.2f}x")
+
+if __name__ == "__main__":
+    args = [int(a) for a in sys.argv[1:4]]
+    main(*args)
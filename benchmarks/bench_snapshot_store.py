@@ -0,0 +1,69 @@
+# Benchmark the columnar snapshot store against the timestamped CSV files it replaces.
+#
+# Usage: python -m benchmarks.bench_snapshot_store [num_events] [num_snapshots]
+
+import os
+import shutil
+import sys
+import tempfile
+import time
+from datetime import datetime, timedelta, timezone
+
+from analysis.ev_analysis import read_odds_csv
+from benchmarks.bench_odds_table import generate_rows
+from benchmarks.bench_quote_memory import write_snapshot
+from scrapers.snapshot_store import SnapshotStore
+
+def directory_size(directory):
+    return sum(os.path.getsize(os.path.join(directory, f)) for f in os.listdir(directory))
+
+def timed(fn):
+    start = time.perf_counter()
+    result = fn()
+    return result, time.perf_counter() - start
+
+def main(num_events=1000, num_snapshots=10):
+    snapshots = [generate_rows(num_events, seed=i) for i in range(num_snapshots)]
+    rows_per_snapshot = len(snapshots[0])
+    sport = snapshots[0][0].sport
+    workdir = tempfile.mkdtemp()
+    csv_dir = os.path.join(workdir, 'csv')
+    store_dir = os.path.join(workdir, 'store')
+    os.makedirs(csv_dir)
+
+    try:
+        paths = [os.path.join(csv_dir, f"all_sports_odds_{i:04d}.csv") for i in range(num_snapshots)]
+        _, csv_write = timed(lambda: [write_snapshot(rows, path) for rows, path in zip(snapshots, paths)])
+        store = SnapshotStore(store_dir)
+        start = datetime.now(timezone.utc)
+        _, store_write = timed(lambda: [store.append(rows, start + timedelta(minutes=i))
+                                        for i, rows in enumerate(snapshots)])
+
+        store = SnapshotStore(store_dir)
+        times = store.snapshot_times()
+        csv_rows, csv_read = timed(lambda: [list(read_odds_csv(path)) for path in paths])
+        store_rows, store_read = timed(lambda: [list(store.rows(t)) for t in times])
+        assert all(sorted(map(repr, a)) == sorted(map(repr, b)) for a, b in zip(csv_rows, store_rows)), \
+            "Store rows differ from CSV rows"
+
+        # A backtest that only needs two price columns for one sport
+        _, csv_columns = timed(lambda: [[(row.home_odds, row.away_odds) for row in read_odds_csv(path)
+                                         if row.sport == sport] for path in paths])
+        _, store_columns = timed(lambda: [store.load(['home_odds', 'away_odds'], t, sports={sport})
+                                          for t in times])
+
+        total_rows = rows_per_snapshot * num_snapshots
+        print(f"{num_snapshots} snapshots x {rows_per_snapshot} bookmaker rows ({total_rows} rows)\n")
+        print(f"{'':<36}{'CSV':>10}{'store':>10}{'speedup':>10}")
+        for label, csv_time, store_time in (("write", csv_write, store_write),
+                                            ("read all rows", csv_read, store_read),
+                                            (f"load 2 columns of {sport}", csv_columns, store_columns)):
+            print(f"{label:<36}{csv_time:>9.3f}s{store_time:>9.3f}s{csv_time / store_time:>9.1f}x")
+        print(f"\nrows/s read: CSV {total_rows / csv_read:,.0f}, store {total_rows / store_read:,.0f}")
+        print(f"size on disk: CSV {directory_size(csv_dir) / 1024:,.0f}KB, "
+              f"store {directory_size(store_dir) / 1024:,.0f}KB")
+    finally:
+        shutil.rmtree(workdir)
+
+if __name__ == "__main__":
+    main(*[int(a) for a in sys.argv[1:3]])
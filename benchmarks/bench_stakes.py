@@ -0,0 +1,53 @@
+# Check the rounded stake solver against brute force on random arbitrage markets with bookmaker
+# limits, then time it on a slate. Brute force tries every whole-unit stake on every leg within the
+# bankroll and limits; the solver must find the same guaranteed profit.
+#
+# Usage: python -m benchmarks.bench_stakes [markets] [bankroll] [seed]
+
+import itertools
+import sys
+import time
+
+import numpy as np
+
+from analysis.stakes import solve_stakes, solve_stakes_batch
+
+def random_market(rng, legs):
+    # Two-decimal odds with a 0.5-5% arbitrage margin, and a limit on some of the legs
+    probabilities = rng.dirichlet(np.full(legs, 3.0))
+    odds = np.round(1 / (probabilities * (1 - rng.uniform(0.005, 0.05))), 2)
+    limits = [float(rng.integers(5, 60)) if rng.random() < 0.5 else np.inf for _ in range(legs)]
+    return odds.tolist(), limits
+
+def brute_force_profit(odds, limits, bankroll):
+    ranges = [np.arange(1, min(limit, bankroll) + 1) for limit in limits]
+    stakes = np.array(list(itertools.product(*ranges)), dtype=float)
+    stakes = stakes[stakes.sum(axis=1) <= bankroll]
+    if not len(stakes):
+        return None
+    return ((stakes * odds).min(axis=1) - stakes.sum(axis=1)).max()
+
+def main(markets=300, bankroll=60, seed=0):
+    rng = np.random.default_rng(seed)
+    checked = 0
+    for i in range(markets):
+        odds, limits = random_market(rng, 2 if i % 3 else 3)
+        plan = solve_stakes(odds, bankroll=bankroll, limits=limits)
+        expected = brute_force_profit(odds, limits, bankroll)
+        if expected is None or expected <= 0:
+            continue
+        assert plan is not None and abs(plan.profit - expected) < 1e-9, (odds, limits, plan, expected)
+        checked += 1
+    # A limit binding where the payout over the odds falls just short of a whole unit
+    assert abs(solve_stakes([2.99, 1.63], bankroll=100, limits=[np.inf, 20]).profit - 1.6) < 1e-9
+    print(f"{checked} profitable markets match brute force")
+
+    slate = [random_market(rng, 2) for _ in range(20000)]
+    odds = np.array([market[0] for market in slate])
+    limits = np.array([market[1] for market in slate]) * 20
+    start = time.perf_counter()
+    solve_stakes_batch(odds, limits)
+    print(f"{len(slate)} two-way markets solved in {time.perf_counter() - start:.3f}s")
+
+if __name__ == "__main__":
+    main(*[int(a) for a in sys.argv[1:4]])
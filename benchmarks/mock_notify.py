@@ -0,0 +1,76 @@
+# Local stand-ins for the notification sinks used by the benchmarks.
+#
+# A webhook receiver that accepts POSTed JSON and a minimal SMTP server that accepts mail, both
+# recording when each message arrived. A fixed latency per message simulates a slow endpoint.
+
+import json
+import socketserver
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+class MockWebhookHandler(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'
+
+    def do_POST(self):
+        body = self.rfile.read(int(self.headers['Content-Length']))
+        if self.server.latency:
+            time.sleep(self.server.latency)
+        with self.server.lock:
+            self.server.received.append((time.time(), json.loads(body)))
+        self.send_response(204)
+        self.send_header('Content-Length', '0')
+        self.end_headers()
+
+    def log_message(self, format, *args):
+        pass
+
+def start_mock_webhook(latency=0, port=0):
+    server = ThreadingHTTPServer(('127.0.0.1', port), MockWebhookHandler)
+    server.daemon_threads = True
+    server.latency = latency
+    server.lock = threading.Lock()
+    server.received = []
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server, f"http://127.0.0.1:{server.server_address[1]}/alerts"
+
+class MockSMTPHandler(socketserver.StreamRequestHandler):
+    # Just enough of RFC 5321 for smtplib.send_message
+    def reply(self, line):
+        self.wfile.write(f"{line}\r\n".encode('ascii'))
+
+    def handle(self):
+        self.reply("220 localhost mock SMTP")
+        while True:
+            line = self.rfile.readline().decode('utf-8').rstrip('\r\n')
+            if not line:
+                return
+            command = line[:4].upper()
+            if command == 'EHLO' or command == 'HELO':
+                self.reply("250 localhost")
+            elif command == 'DATA':
+                self.reply("354 End data with <CR><LF>.<CR><LF>")
+                lines = []
+                for data in iter(self.rfile.readline, b''):
+                    if data.rstrip(b'\r\n') == b'.':
+                        break
+                    lines.append(data.decode('utf-8'))
+                if self.server.latency:
+                    time.sleep(self.server.latency)
+                with self.server.lock:
+                    self.server.received.append((time.time(), ''.join(lines)))
+                self.reply("250 OK")
+            elif command == 'QUIT':
+                self.reply("221 Bye")
+                return
+            else:
+                self.reply("250 OK")
+
+def start_mock_smtp(latency=0, port=0):
+    server = socketserver.ThreadingTCPServer(('127.0.0.1', port), MockSMTPHandler)
+    server.daemon_threads = True
+    server.latency = latency
+    server.lock = threading.Lock()
+    server.received = []
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server, server.server_address[1]
@@ -0,0 +1,146 @@
+# Local stand-in for the Odds API used by the benchmarks.
+#
+# Serves GET /<sport>/odds with canned JSON payloads over HTTP/1.1 keep-alive.
+# A fixed per-request latency simulates the API round-trip and a per-connection
+# delay simulates the TCP/TLS handshake, so connection reuse shows up in timings.
+# Payloads come from benchmarks.synthetic.
+#
+# Given per-key quotas, it also acts like a set of API accounts: unknown keys get a 401, each key is
+# billed regions x markets per request and refused with a 401 once spent, and a per-key rate limit
+# answers bursts with a 429. Given each bookmaker's region, responses only hold the bookmakers of the
+# requested regions and the requested markets.
+
+import json
+import threading
+import time
+from collections import deque
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlparse
+
+class MockOddsAPIHandler(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'
+    disable_nagle_algorithm = True
+
+    def setup(self):
+        super().setup()
+        # Paid once per TCP connection, like a real TLS handshake
+        if self.server.handshake_latency:
+            time.sleep(self.server.handshake_latency)
+        with self.server.lock:
+            self.server.connections += 1
+
+    def do_GET(self):
+        url = urlparse(self.path)
+        parts = url.path.strip('/').split('/')
+        sport = parts[-2] if len(parts) >= 2 and parts[-1] == 'odds' else None
+        query = parse_qs(url.query)
+        regions = tuple(sorted(query.get('regions', [''])[0].split(',')))
+        markets = tuple(sorted(query.get('markets', [''])[0].split(',')))
+        cost = len(regions) * len(markets)
+
+        if self.server.latency:
+            time.sleep(self.server.latency)
+        if self.server.key_quotas is not None:
+            self.do_keyed_GET(query.get('api_key', [None])[0], sport, regions, markets, cost)
+            return
+        with self.server.lock:
+            self.server.requests += 1
+            requests_used = self.server.requests
+
+        if sport not in self.server.bodies:
+            self.send_json(404, json.dumps({'message': f"Unknown sport {sport}"}).encode('utf-8'))
+            return
+        self.send_json(200, self.body(sport, regions, markets), {
+            'x-requests-used': requests_used,
+            'x-requests-remaining': max(self.server.quota - requests_used, 0),
+            'x-requests-last': 1,
+        })
+
+    def do_keyed_GET(self, api_key, sport, regions, markets, cost):
+        server = self.server
+        with server.lock:
+            if api_key not in server.key_quotas:
+                status, message, error_code = 401, "API key is not valid", 'INVALID_KEY'
+            elif server.key_used[api_key] + cost > server.key_quotas[api_key]:
+                status, message, error_code = 401, "Usage quota has been reached", 'OUT_OF_USAGE_CREDITS'
+            else:
+                recent = server.key_requests[api_key]
+                now = time.monotonic()
+                while recent and now - recent[0] >= 1:
+                    recent.popleft()
+                if server.key_rate_limit and len(recent) >= server.key_rate_limit:
+                    status, message, error_code = 429, "Too many requests", 'EXCEEDED_FREQ_LIMIT'
+                else:
+                    recent.append(now)
+                    status = 200 if sport in server.bodies else 404
+                    if status == 200:
+                        server.key_used[api_key] += cost
+                        server.requests += 1
+            server.key_statuses[api_key, status] = server.key_statuses.get((api_key, status), 0) + 1
+            used = server.key_used.get(api_key, 0)
+            quota = server.key_quotas.get(api_key, 0)
+
+        headers = {'x-requests-used': used, 'x-requests-remaining': max(quota - used, 0),
+                   'x-requests-last': cost if status == 200 else 0}
+        if status == 200:
+            self.send_json(200, self.body(sport, regions, markets), headers)
+        elif status == 404:
+            self.send_json(404, json.dumps({'message': f"Unknown sport {sport}"}).encode('utf-8'), headers)
+        else:
+            self.send_json(status, json.dumps({'message': message, 'error_code': error_code}).encode('utf-8'), headers)
+
+    def body(self, sport, regions, markets):
+        if self.server.bookmaker_regions is None:
+            return self.server.bodies[sport]
+        key = (sport, regions, markets)
+        with self.server.lock:
+            body = self.server.filtered_bodies.get(key)
+        if body is None:
+            events = [{**event, 'bookmakers': [
+                {**bookmaker, 'markets': [market for market in bookmaker['markets'] if market['key'] in markets]}
+                for bookmaker in event['bookmakers'] if self.server.bookmaker_regions.get(bookmaker['key']) in regions]}
+                for event in self.server.payloads[sport]]
+            body = json.dumps(events).encode('utf-8')
+            with self.server.lock:
+                self.server.filtered_bodies[key] = body
+        return body
+
+    def send_json(self, status, data, headers=None):
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(data)))
+        for name, value in (headers or {}).items():
+            self.send_header(name, str(value))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def log_message(self, format, *args):
+        pass
+
+def start_mock_server(payloads, latency=0.05, handshake_latency=0.05, quota=500, port=0, key_quotas=None,
+                      key_rate_limit=None, bookmaker_regions=None):
+    # key_quotas maps each valid API key to its quota and key_rate_limit caps a key's requests per
+    # second; bookmaker_regions maps bookmaker keys to their region
+    server = ThreadingHTTPServer(('127.0.0.1', port), MockOddsAPIHandler)
+    server.daemon_threads = True
+    # Encoded once up front, so serving large payloads costs the benchmarks nothing
+    server.bodies = {sport: json.dumps(payload).encode('utf-8') for sport, payload in payloads.items()}
+    server.payloads = payloads
+    server.filtered_bodies = {}  # Encoded on first request for each (sport, regions, markets)
+    server.bookmaker_regions = bookmaker_regions
+    server.key_quotas = key_quotas
+    server.key_rate_limit = key_rate_limit
+    server.key_used = {key: 0 for key in key_quotas or {}}
+    server.key_requests = {key: deque() for key in key_quotas or {}}
+    server.key_statuses = {}  # (key, status) -> responses
+    server.latency = latency
+    server.handshake_latency = handshake_latency
+    server.lock = threading.Lock()
+    server.quota = quota
+    server.requests = 0
+    server.connections = 0
+
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    base_url = f"http://127.0.0.1:{server.server_address[1]}"
+    return server, base_url
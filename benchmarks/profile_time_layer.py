@@ -0,0 +1,56 @@
+# Profile analyze_odds on a large synthetic snapshot and compare the old per-row time handling
+# (strptime + pytz on every bookmaker row, then again for the date) with the memoized EventTimes layer.
+#
+# Usage: python -m benchmarks.profile_time_layer [num_events]
+
+import cProfile
+import os
+import pstats
+import sys
+import time
+from contextlib import redirect_stdout
+from datetime import datetime, timedelta
+
+import pytz
+
+from analysis.ev_analysis import EST, MAX_DAYS_AHEAD, EventTimes, analyze_odds
+from benchmarks.bench_odds_table import generate_rows
+
+def legacy_row_times(start_times):
+    # What analyze_odds and find_arbitrage_opportunities used to do for every bookmaker row
+    for start_time in start_times:
+        now = datetime.now(EST)
+        est_time = pytz.utc.localize(datetime.strptime(start_time, "%Y-%m-%dT%H:%M:%SZ")).astimezone(EST)
+        if not now <= est_time <= now + timedelta(days=MAX_DAYS_AHEAD):
+            continue
+        formatted = pytz.utc.localize(datetime.strptime(start_time, "%Y-%m-%dT%H:%M:%SZ")).astimezone(EST).strftime("%m/%d/%Y %I:%M %p EST")
+        datetime.strptime(formatted, "%m/%d/%Y %I:%M %p EST").date()
+
+def cached_row_times(start_times):
+    event_times = EventTimes()
+    for start_time in start_times:
+        commence_time, est_start_time, in_window = event_times.get(start_time)
+        if in_window:
+            commence_time.date()
+
+def main(num_events=3000):
+    rows = generate_rows(num_events)
+    start_times = [row.start_time for row in rows]
+
+    for label, fn in (("legacy per-row parsing", legacy_row_times), ("memoized EventTimes", cached_row_times)):
+        start = time.perf_counter()
+        fn(start_times)
+        print(f"{label:<28} {time.perf_counter() - start:8.3f}s for {len(start_times)} rows")
+
+    profiler = cProfile.Profile()
+    with open(os.devnull, 'w') as devnull, redirect_stdout(devnull):
+        start = time.perf_counter()
+        profiler.enable()
+        analyze_odds(rows)
+        profiler.disable()
+        elapsed = time.perf_counter() - start
+    print(f"\nanalyze_odds on {len(rows)} rows: {elapsed:.3f}s (profiled)\n")
+    pstats.Stats(profiler).sort_stats('tottime').print_stats(10)
+
+if __name__ == "__main__":
+    main(*[int(a) for a in sys.argv[1:2]])
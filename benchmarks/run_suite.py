@@ -0,0 +1,177 @@
+# Reproducible end-to-end benchmark: synthetic payloads served by the mock Odds API, every pipeline
+# stage timed and memory-profiled, planted opportunities checked, results saved as JSON.
+#
+# Usage: python -m benchmarks.run_suite [--events N] [--sports N] [--repeats N] [--output FILE]
+#                                       [--compare PREVIOUS.json] [--tolerance 0.2]
+
+import argparse
+import contextlib
+import io
+import json
+import os
+import platform
+import statistics
+import sys
+import tempfile
+import time
+import tracemalloc
+from datetime import datetime, timezone
+
+from analysis.ev_analysis import analyze_odds, collect_quotes, find_arbitrage_opportunities
+from analysis.ev_analysis import main as report
+from benchmarks.mock_odds_api import start_mock_server
+from benchmarks.synthetic import DEFAULT_BOOKMAKERS, DEFAULT_SPORTS, generate_payloads
+from monitoring.metrics import METRICS
+from scrapers import odds_api
+from scrapers.snapshot_store import save_snapshot
+
+RESULTS_DIR = 'logs/benchmarks'  # Default location of the JSON result files
+DEFAULT_TOLERANCE = 0.2  # Slowdown (fraction of the previous best time) reported as a regression
+
+def measure(fn, repeats):
+    # Timings come from untraced runs; peak memory from one extra run under tracemalloc
+    timings = []
+    for _ in range(repeats):
+        with contextlib.redirect_stdout(io.StringIO()):
+            start = time.perf_counter()
+            result = fn()
+            timings.append(time.perf_counter() - start)
+    tracemalloc.start()
+    with contextlib.redirect_stdout(io.StringIO()):
+        fn()
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return result, {'median_seconds': statistics.median(timings), 'min_seconds': min(timings),
+                    'peak_bytes': peak, 'repeats': repeats}
+
+def planted_found(planted, positive_ev_bets, arbitrage_opportunities):
+    arbitrage = {(opportunity['Sport'], opportunity['Game'], frozenset(bet['Bookmaker'] for bet in opportunity['Bets']))
+                 for opportunity in arbitrage_opportunities
+                 if opportunity['Category'] == 'Arbitrage' and opportunity['Market'] == 'Moneyline'}
+    ev = {(bet['Sport'], bet['Game'], bet['Bookmaker'], bet.get('Team')) for bet in positive_ev_bets}
+    found = {'arbitrage': [0, 0], 'ev': [0, 0]}
+    for case in planted:
+        found[case.kind][1] += 1
+        if case.kind == 'arbitrage':
+            hit = (case.sport, case.game, frozenset(case.bookmakers)) in arbitrage
+        else:
+            hit = (case.sport, case.game, case.bookmakers[0], case.outcome) in ev
+        found[case.kind][0] += hit
+    return {kind: {'found': hits, 'planted': total} for kind, (hits, total) in found.items()}
+
+def run(args):
+    sports = DEFAULT_SPORTS[:args.sports] if args.sports <= len(DEFAULT_SPORTS) else \
+        DEFAULT_SPORTS + [f"sport_{i}" for i in range(args.sports - len(DEFAULT_SPORTS))]
+    all_data, planted = generate_payloads(sports, args.events, DEFAULT_BOOKMAKERS, seed=args.seed)
+    server, base_url = start_mock_server(all_data, latency=args.latency, handshake_latency=args.latency)
+    odds_api.BASE_URL = base_url
+    session = odds_api.create_session()
+    stages = {}
+
+    try:
+        fetched, stages['fetch'] = measure(lambda: odds_api.fetch_all_odds(sports, session=session), args.repeats)
+        assert fetched.keys() == all_data.keys(), "Mock server did not return every sport"
+        _, stages['stream_quotes'] = measure(
+            lambda: sum(1 for sport in sports for _ in odds_api.stream_quotes(sport, session)), args.repeats)
+        rows, stages['flatten'] = measure(lambda: list(odds_api.flatten_odds(fetched)), args.repeats)
+        _, stages['save_to_csv'] = measure(lambda: odds_api.save_to_csv(fetched), args.repeats)
+        _, stages['save_snapshot'] = measure(lambda: save_snapshot(fetched), args.repeats)
+        games, stages['collect_quotes'] = measure(lambda: collect_quotes(rows), args.repeats)
+        _, stages['find_arbitrage_opportunities'] = measure(
+            lambda: [find_arbitrage_opportunities(data, sport) for sport, sport_games in games.items()
+                     for data in sport_games.values()], args.repeats)
+        results, stages['analyze_odds'] = measure(lambda: analyze_odds(fetched), args.repeats)
+        _, stages['report'] = measure(lambda: report(fetched), args.repeats)
+
+        def pipeline():
+            # What main.py does per run: fetch, persist, analyze and write the report
+            data = odds_api.fetch_all_odds(sports, session=session)
+            save_snapshot(data)
+            return report(data)
+        _, stages['pipeline'] = measure(pipeline, args.repeats)
+    finally:
+        session.close()
+        server.shutdown()
+
+    positive_ev_bets, _, arbitrage_opportunities = results
+    return {
+        'timestamp': datetime.now(timezone.utc).isoformat(),
+        'python': platform.python_version(),
+        'platform': platform.platform(),
+        'config': {'sports': len(sports), 'events_per_sport': args.events, 'bookmakers': len(DEFAULT_BOOKMAKERS),
+                   'rows': len(rows), 'seed': args.seed, 'latency': args.latency, 'repeats': args.repeats},
+        'stages': stages,
+        'results': {'ev_bets': len(positive_ev_bets), 'opportunities': len(arbitrage_opportunities),
+                    'planted': planted_found(planted, positive_ev_bets, arbitrage_opportunities)},
+        'metrics': METRICS.snapshot(),
+    }
+
+def compare(previous, current, tolerance):
+    regressions = []
+    print(f"\n{'stage':<30}{'previous':>10}{'current':>10}{'change':>9}")
+    for stage, result in current['stages'].items():
+        if stage not in previous['stages']:
+            continue
+        # Best-of-N is far less noisy than the median on a shared machine
+        before = previous['stages'][stage]['min_seconds']
+        after = result['min_seconds']
+        change = after / before - 1 if before else 0
+        flag = ''
+        if change > tolerance:
+            regressions.append(stage)
+            flag = '  REGRESSION'
+        print(f"{stage:<30}{before:>9.3f}s{after:>9.3f}s{change:>+8.0%}{flag}")
+    if previous['config'] != current['config']:
+        print("Note: configurations differ, so the comparison is only indicative")
+    return regressions
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--events', type=int, default=100, help="events per sport")
+    parser.add_argument('--sports', type=int, default=len(DEFAULT_SPORTS))
+    parser.add_argument('--repeats', type=int, default=3)
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--latency', type=float, default=0.02, help="mock API latency per request (seconds)")
+    parser.add_argument('--output', help="JSON result file (default: logs/benchmarks/suite_<time>.json)")
+    parser.add_argument('--compare', help="previous JSON result to check for regressions")
+    parser.add_argument('--tolerance', type=float, default=DEFAULT_TOLERANCE)
+    args = parser.parse_args(argv)
+
+    output = os.path.abspath(args.output or os.path.join(
+        RESULTS_DIR, f"suite_{datetime.now().strftime('%Y%m%d_%H%M%S')}.json"))
+    previous = None
+    if args.compare:
+        with open(args.compare) as f:
+            previous = json.load(f)
+
+    # Stages that write data/ and logs/ run inside a scratch directory
+    cwd = os.getcwd()
+    with tempfile.TemporaryDirectory() as workdir:
+        os.chdir(workdir)
+        try:
+            result = run(args)
+        finally:
+            os.chdir(cwd)
+
+    config = result['config']
+    print(f"{config['sports']} sports x {config['events_per_sport']} events x {config['bookmakers']} bookmakers "
+          f"({config['rows']} rows), median of {config['repeats']}\n")
+    print(f"{'stage':<30}{'median':>10}{'min':>10}{'peak mem':>12}")
+    for stage, stats in result['stages'].items():
+        print(f"{stage:<30}{stats['median_seconds']:>9.3f}s{stats['min_seconds']:>9.3f}s"
+              f"{stats['peak_bytes'] / 1024 / 1024:>10.1f}MB")
+    planted = result['results']['planted']
+    print(f"\n{result['results']['ev_bets']} EV bets, {result['results']['opportunities']} opportunities; planted "
+          f"arbitrage found {planted['arbitrage']['found']}/{planted['arbitrage']['planted']}, "
+          f"planted EV found {planted['ev']['found']}/{planted['ev']['planted']}")
+
+    os.makedirs(os.path.dirname(output), exist_ok=True)
+    with open(output, 'w') as f:
+        json.dump(result, f, indent=2)
+    print(f"Results saved to {output}")
+
+    if previous is not None and compare(previous, result, args.tolerance):
+        sys.exit(1)
+
+if __name__ == "__main__":
+    main()
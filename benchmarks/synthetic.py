@@ -0,0 +1,168 @@
+# Synthetic Odds API payloads for the benchmarks.
+#
+# Every event gets a "true" probability per outcome and every bookmaker prices it with its own
+# margin plus a little noise, so a clean slate has almost no arbitrage. Arbitrage and +EV cases are
+# then planted on purpose and returned alongside the payloads, so the suite can check they are found.
+
+import random
+from datetime import datetime, timedelta, timezone
+from typing import NamedTuple
+
+DEFAULT_SPORTS = ['basketball_nba', 'americanfootball_nfl', 'baseball_mlb', 'icehockey_nhl', 'soccer_epl']
+DEFAULT_BOOKMAKERS = ['fanduel', 'draftkings', 'betmgm', 'bovada', 'betrivers', 'espnbet']
+DEFAULT_MARKETS = ('h2h', 'spreads', 'totals')
+TITLES = {'fanduel': 'FanDuel', 'draftkings': 'DraftKings', 'betmgm': 'BetMGM', 'bovada': 'Bovada',
+          'betrivers': 'BetRivers', 'espnbet': 'ESPN BET', 'betonlineag': 'BetOnline.ag', 'pinnacle': 'Pinnacle',
+          'circasports': 'Circa Sports', 'hardrockbet': 'Hard Rock Bet'}  # Display titles the API sends per key
+
+# Typical main lines per sport; anything not listed uses the basketball numbers
+SPREADS = {'basketball_nba': [-9.5, -5.5, -2.5, 2.5, 5.5], 'americanfootball_nfl': [-7.5, -3.5, -2.5, 3.5, 6.5],
+           'baseball_mlb': [-1.5, 1.5], 'icehockey_nhl': [-1.5, 1.5], 'soccer_epl': [-1.5, -0.5, 0.5]}
+TOTALS = {'basketball_nba': [218.5, 224.5, 231.5], 'americanfootball_nfl': [41.5, 44.5, 48.5],
+          'baseball_mlb': [7.5, 8.5, 9.5], 'icehockey_nhl': [5.5, 6.5], 'soccer_epl': [2.5, 3.5]}
+
+MARGIN_RANGE = (1.03, 1.06)  # Bookmaker overround on a fair market
+PRICE_NOISE = 0.01  # Relative disagreement between bookmakers on the same price
+PLANTED_ARBITRAGE_OVERROUND = 0.97  # Combined implied probability of a planted arbitrage (3% profit)
+PLANTED_EV_EDGE = 0.93  # A planted +EV price is fair odds divided by this
+
+class PlantedCase(NamedTuple):
+    kind: str  # 'arbitrage' or 'ev'
+    sport: str
+    game: str
+    bookmakers: tuple  # Bookmaker keys, as they appear in the analysis output
+    outcome: str
+
+def price(rng, probability, margin):
+    return round(1 / (probability * margin * (1 + rng.uniform(-PRICE_NOISE, PRICE_NOISE))), 2)
+
+def two_way(rng, probability=None):
+    probability = probability if probability is not None else rng.uniform(0.35, 0.65)
+    margin = rng.uniform(*MARGIN_RANGE)
+    return price(rng, probability, margin), price(rng, 1 - probability, margin)
+
+def generate_markets(rng, markets, home_team, away_team, probabilities, lines, last_update,
+                     alternate_lines=0, props=0):
+    generated = []
+    margin = rng.uniform(*MARGIN_RANGE)
+    if 'h2h' in markets:
+        outcomes = [{'name': name, 'price': price(rng, probability, margin)}
+                    for name, probability in zip((home_team, away_team, 'Draw'), probabilities)]
+        generated.append({'key': 'h2h', 'last_update': last_update, 'outcomes': outcomes})
+    if 'spreads' in markets:
+        spread = lines['spread']
+        home_price, away_price = two_way(rng, 0.5)
+        generated.append({'key': 'spreads', 'last_update': last_update, 'outcomes': [
+            {'name': home_team, 'price': home_price, 'point': spread},
+            {'name': away_team, 'price': away_price, 'point': -spread},
+        ]})
+        if alternate_lines:
+            outcomes = []
+            for step in range(1, alternate_lines + 1):
+                # Moving the line toward the home side makes the home cover more likely
+                home_price, away_price = two_way(rng, min(0.5 + 0.06 * step, 0.95))
+                outcomes += [{'name': home_team, 'price': home_price, 'point': spread + step},
+                             {'name': away_team, 'price': away_price, 'point': -spread - step}]
+            generated.append({'key': 'alternate_spreads', 'last_update': last_update, 'outcomes': outcomes})
+    if 'totals' in markets:
+        total = lines['total']
+        over_price, under_price = two_way(rng, 0.5)
+        generated.append({'key': 'totals', 'last_update': last_update, 'outcomes': [
+            {'name': 'Over', 'price': over_price, 'point': total},
+            {'name': 'Under', 'price': under_price, 'point': total},
+        ]})
+    for i in range(props):
+        # Player props: two outcomes per player around a threshold, described by the player's name
+        over_price, under_price = two_way(rng, 0.5)
+        threshold = lines['props'][i]
+        generated.append({'key': 'player_points', 'last_update': last_update, 'outcomes': [
+            {'name': 'Over', 'description': f"Player {i}", 'price': over_price, 'point': threshold},
+            {'name': 'Under', 'description': f"Player {i}", 'price': under_price, 'point': threshold},
+        ]})
+    return generated
+
+def generate_priced_events(sport, num_events=10, bookmakers=DEFAULT_BOOKMAKERS, seed=0, markets=('h2h',),
+                           alternate_lines=0, props=0):
+    # (event payload, true outcome probabilities) pairs; probabilities are home, away[, draw]
+    rng = random.Random(f"{sport}-{seed}")
+    start = datetime.now(timezone.utc) + timedelta(hours=2)
+    events = []
+    for i in range(num_events):
+        home_team = f"{sport} Home {i}"
+        away_team = f"{sport} Away {i}"
+        commence_time = (start + timedelta(hours=i)).strftime("%Y-%m-%dT%H:%M:%SZ")
+        home_probability = rng.uniform(0.25, 0.7)
+        if sport.startswith('soccer'):
+            draw_probability = rng.uniform(0.22, 0.3)
+            probabilities = (home_probability * (1 - draw_probability), (1 - home_probability) * (1 - draw_probability),
+                             draw_probability)
+        else:
+            probabilities = (home_probability, 1 - home_probability)
+        # Every bookmaker hangs the same main lines, as they mostly do
+        lines = {'spread': rng.choice(SPREADS.get(sport, SPREADS['basketball_nba'])),
+                 'total': rng.choice(TOTALS.get(sport, TOTALS['basketball_nba'])),
+                 'props': [rng.choice([0.5, 1.5, 19.5, 24.5]) for _ in range(props)]}
+        event_bookmakers = []
+        for key in bookmakers:
+            event_bookmakers.append({
+                'key': key,
+                'title': TITLES.get(key, key.capitalize()),
+                'last_update': commence_time,
+                'markets': generate_markets(rng, markets, home_team, away_team, probabilities, lines,
+                                            commence_time, alternate_lines, props),
+            })
+        events.append(({
+            'id': f"{sport}-{i}",
+            'sport_key': sport,
+            'commence_time': commence_time,
+            'home_team': home_team,
+            'away_team': away_team,
+            'bookmakers': event_bookmakers,
+        }, probabilities))
+    return events
+
+def generate_events(sport, num_events=10, bookmakers=DEFAULT_BOOKMAKERS, seed=0, markets=('h2h',),
+                    alternate_lines=0, props=0):
+    return [event for event, _ in generate_priced_events(sport, num_events, bookmakers, seed, markets,
+                                                         alternate_lines, props)]
+
+def h2h_outcomes(event, bookmaker):
+    market = next(market for market in bookmaker['markets'] if market['key'] == 'h2h')
+    return {outcome['name']: outcome for outcome in market['outcomes']}
+
+def plant_arbitrage(rng, sport, event, probabilities):
+    # A different bookmaker overprices each moneyline outcome so the best prices sum below 100%
+    names = (event['home_team'], event['away_team'], 'Draw')[:len(probabilities)]
+    bookmakers = rng.sample(event['bookmakers'], len(names))
+    scale = PLANTED_ARBITRAGE_OVERROUND / sum(probabilities)
+    for name, probability, bookmaker in zip(names, probabilities, bookmakers):
+        h2h_outcomes(event, bookmaker)[name]['price'] = round(1 / (probability * scale), 2)
+    return PlantedCase('arbitrage', sport, f"{event['home_team']} vs {event['away_team']}",
+                       tuple(bookmaker['key'] for bookmaker in bookmakers), event['home_team'])
+
+def plant_ev(rng, sport, event, probabilities):
+    # One bookmaker hangs a stale, generous price on the home side
+    bookmaker = rng.choice(event['bookmakers'])
+    outcome = h2h_outcomes(event, bookmaker)[event['home_team']]
+    outcome['price'] = round(1 / (probabilities[0] * PLANTED_EV_EDGE), 2)
+    return PlantedCase('ev', sport, f"{event['home_team']} vs {event['away_team']}",
+                       (bookmaker['key'],), event['home_team'])
+
+def generate_payloads(sports=DEFAULT_SPORTS, events_per_sport=20, bookmakers=DEFAULT_BOOKMAKERS,
+                      markets=DEFAULT_MARKETS, arbitrage_rate=0.05, ev_rate=0.05, alternate_lines=0, props=0,
+                      seed=0):
+    # Returns (all_data, planted cases); planting needs the moneyline, so it is skipped without h2h
+    rng = random.Random(seed)
+    all_data = {}
+    planted = []
+    for sport in sports:
+        events = generate_priced_events(sport, events_per_sport, bookmakers, seed, markets, alternate_lines, props)
+        for event, probabilities in events:
+            if 'h2h' in markets and len(bookmakers) >= len(probabilities):
+                roll = rng.random()
+                if roll < arbitrage_rate:
+                    planted.append(plant_arbitrage(rng, sport, event, probabilities))
+                elif roll < arbitrage_rate + ev_rate:
+                    planted.append(plant_ev(rng, sport, event, probabilities))
+        all_data[sport] = [event for event, _ in events]
+    return all_data, planted
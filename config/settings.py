@@ -0,0 +1,125 @@
+import json
+import os
+from typing import NamedTuple
+
+from analysis import ev_analysis
+from monitoring.metrics import METRICS
+from scrapers import odds_api
+
+SETTINGS_FILE = os.getenv('ARBING_SETTINGS', 'config/settings.json')  # JSON file overriding the defaults in code
+
+class Settings(NamedTuple):
+    # Everything that can change without a restart. Fields left out of the settings file keep the
+    # module constants they replace in scrapers/odds_api.py and analysis/ev_analysis.py.
+    sports: tuple
+    markets: dict  # Sport -> tuple of Odds API markets; 'default' covers every other sport
+    regions: tuple
+    allowed_bookmakers: frozenset
+    max_days_ahead: float
+    min_ev_threshold: float
+    max_ev_threshold: float
+
+FETCH_FIELDS = ('sports', 'markets', 'regions')  # Applied through odds_api.configure
+ANALYSIS_FIELDS = ('allowed_bookmakers', 'max_days_ahead', 'min_ev_threshold', 'max_ev_threshold')  # ev_analysis.configure
+
+DEFAULTS = Settings(tuple(odds_api.SPORTS), {sport: tuple(markets) for sport, markets in odds_api.MARKETS.items()},
+                    tuple(odds_api.REGIONS), frozenset(ev_analysis.ALLOWED_BOOKMAKERS), ev_analysis.MAX_DAYS_AHEAD,
+                    ev_analysis.MIN_EV_THRESHOLD, ev_analysis.MAX_EV_THRESHOLD)
+
+def string_list(name, value):
+    if not isinstance(value, list) or not all(isinstance(item, str) and item for item in value):
+        raise ValueError(f"{name} must be a list of strings")
+    return value
+
+def number(name, value):
+    if isinstance(value, bool) or not isinstance(value, (int, float)):
+        raise ValueError(f"{name} must be a number")
+    return value
+
+def parse_settings(data, defaults=DEFAULTS):
+    # Settings from a decoded settings file; raises ValueError for unknown fields and wrong types
+    if not isinstance(data, dict):
+        raise ValueError("settings must be a JSON object")
+    unknown = set(data) - set(Settings._fields)
+    if unknown:
+        raise ValueError(f"unknown settings: {', '.join(sorted(unknown))}")
+    values = defaults._asdict()
+    if 'sports' in data:
+        values['sports'] = tuple(string_list('sports', data['sports']))
+    if 'markets' in data:
+        if not isinstance(data['markets'], dict):
+            raise ValueError("markets must map sports to lists of markets")
+        markets = {sport: tuple(string_list(f"markets.{sport}", sport_markets))
+                   for sport, sport_markets in data['markets'].items()}
+        # Sports left out keep the markets configured for them in code
+        values['markets'] = {**defaults.markets, **markets}
+    if 'regions' in data:
+        values['regions'] = tuple(string_list('regions', data['regions']))
+        if not values['regions']:
+            raise ValueError("regions must not be empty")
+    if 'allowed_bookmakers' in data:
+        values['allowed_bookmakers'] = frozenset(bookmaker.lower() for bookmaker in
+                                                 string_list('allowed_bookmakers', data['allowed_bookmakers']))
+    for field in ('max_days_ahead', 'min_ev_threshold', 'max_ev_threshold'):
+        if field in data:
+            values[field] = number(field, data[field])
+    if values['max_days_ahead'] <= 0:
+        raise ValueError("max_days_ahead must be positive")
+    if values['min_ev_threshold'] > values['max_ev_threshold']:
+        raise ValueError("min_ev_threshold is above max_ev_threshold")
+    return Settings(**values)
+
+def load_settings(filename=SETTINGS_FILE):
+    # The defaults when there is no settings file
+    if not os.path.exists(filename):
+        return DEFAULTS
+    with open(filename, encoding='utf-8') as f:
+        return parse_settings(json.load(f))
+
+def apply_settings(settings, previous=None):
+    # Pushes settings into the modules that read them and returns the fields that changed. A module is
+    # only reconfigured when one of its fields changed, so its derived lookups (the bookmaker mask,
+    # the fetch query parameters) are rebuilt only then.
+    changed = [field for field in Settings._fields
+               if previous is None or getattr(settings, field) != getattr(previous, field)]
+    if any(field in FETCH_FIELDS for field in changed):
+        odds_api.configure(settings.sports, settings.markets, settings.regions)
+    if any(field in ANALYSIS_FIELDS for field in changed):
+        ev_analysis.configure(settings.allowed_bookmakers, settings.max_days_ahead, settings.min_ev_threshold,
+                              settings.max_ev_threshold)
+    return changed
+
+class SettingsWatcher:
+    # Reloads the settings file whenever its modification time or size changes. check() is meant to
+    # run between scan cycles, on the scan thread, so every cycle sees one consistent set of settings.
+    # A file that does not parse is reported and the settings in force stay as they are.
+    def __init__(self, filename=SETTINGS_FILE):
+        self.filename = filename
+        self.settings = DEFAULTS
+        self.signature = None
+
+    def file_signature(self):
+        try:
+            stat = os.stat(self.filename)
+        except FileNotFoundError:
+            return None
+        return stat.st_mtime_ns, stat.st_size
+
+    def check(self):
+        # Returns the fields that changed; a stat call when the file has not been touched
+        signature = self.file_signature()
+        if signature == self.signature:
+            return []
+        self.signature = signature
+        try:
+            settings = load_settings(self.filename)
+        except (OSError, ValueError) as e:
+            print(f"Ignoring settings in {self.filename}: {e}")
+            METRICS.increment('settings_errors')
+            return []
+        changed = apply_settings(settings, self.settings)
+        self.settings = settings
+        if changed:
+            print(f"Settings loaded from {self.filename}: {', '.join(changed)} changed")
+            METRICS.increment('settings_reloads')
+        return changed
@@ -1,26 +1,50 @@
-from scrapers.odds_api import main as fetch_odds
+import threading
+import time
+from scrapers.odds_api import fetch_all_odds
+from scrapers.sharded_fetch import API_KEYS, fetch_all_odds_sharded
+from monitoring.metrics import METRICS
+from scrapers.snapshot_store import save_snapshot
 from analysis.ev_analysis import main as analyze_odds
+from analysis.opportunity_store import OpportunityStore
+from config.settings import SettingsWatcher
+from notifications.dispatcher import create_dispatcher
+
+SAVE_SNAPSHOTS = True  # Also append each fetch to the snapshot store in data/
+RECORD_OPPORTUNITIES = True  # Keep every opportunity found in the opportunity store in data/
 
 def main():
+    SettingsWatcher().check()
+
     # Fetch odds data for all sports
     print("Fetching odds data for all sports...")
-    odds_file = fetch_odds()
-    
-    if odds_file:
-        print(f"Odds data saved to {odds_file}")
-        
+    fetched_at = time.time()
+    # With several API keys the same requests are spread over all of them, per sport and market
+    all_data = fetch_all_odds_sharded() if len(API_KEYS) > 1 else fetch_all_odds()
+
+    if all_data:
+        # Append the snapshot to the store in the background; analysis works on the fetched data directly
+        snapshot_writer = None
+        if SAVE_SNAPSHOTS:
+            snapshot_writer = threading.Thread(target=save_snapshot, args=(all_data,))
+            snapshot_writer.start()
+
         # Analyze odds data and get betting recommendations
         print("\nAnalyzing odds data and generating betting recommendations...")
-        log_file = analyze_odds(odds_file)
-        
+        notifier = create_dispatcher()
+        store = OpportunityStore() if RECORD_OPPORTUNITIES else None
+        log_file = analyze_odds(all_data, notifier, fetched_at, store)
+
         print(f"\nAnalysis complete. Detailed recommendations have been saved to {log_file}")
-        print("\nBetting Recommendations Summary:")
-        
-        with open(log_file, 'r') as f:
-            content = f.read()
-            print(content)
+
+        if snapshot_writer:
+            snapshot_writer.join()
+        if notifier is not None:
+            notifier.close()
+        if store is not None:
+            store.close()
+        print(f"Stage timings and counters saved to {METRICS.write_json()}")
     else:
         print("Failed to fetch odds data. Analysis cannot be performed.")
 
 if __name__ == "__main__":
-    main()
\ No newline at end of file
+    main()
@@ -0,0 +1,156 @@
+import json
+import os
+import threading
+import time
+from contextlib import contextmanager
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+METRICS_FILE = 'logs/metrics.json'  # JSON stats written after every run or scan cycle
+METRICS_PORT = 9108  # Local port for the Prometheus text endpoint
+METRIC_PREFIX = 'arbing_'
+
+def label_key(labels):
+    return tuple(sorted((name, str(value)) for name, value in labels.items()))
+
+def escape_label_value(value):
+    # The text exposition format requires backslash, double quote and newline escaped in label values
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+def format_labels(key):
+    if not key:
+        return ''
+    return '{' + ','.join(f'{name}="{escape_label_value(value)}"' for name, value in key) + '}'
+
+class Metrics:
+    # Process-wide stage timers, counters and gauges. Fetches run on a thread pool, so every
+    # update takes the lock; each one is a couple of dict operations.
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.reset()
+
+    def reset(self):
+        with self.lock:
+            self.timers = {}
+            self.counters = {}
+            self.gauges = {}
+
+    def observe(self, stage, seconds, **labels):
+        key = (stage, label_key(labels))
+        with self.lock:
+            timer = self.timers.get(key)
+            if timer is None:
+                self.timers[key] = [1, seconds, seconds, seconds]
+            else:
+                timer[0] += 1
+                timer[1] += seconds
+                timer[2] = seconds
+                timer[3] = max(timer[3], seconds)
+
+    @contextmanager
+    def timer(self, stage, **labels):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(stage, time.perf_counter() - start, **labels)
+
+    def increment(self, name, value=1, **labels):
+        key = (name, label_key(labels))
+        with self.lock:
+            self.counters[key] = self.counters.get(key, 0) + value
+
+    def set_gauge(self, name, value, **labels):
+        with self.lock:
+            self.gauges[(name, label_key(labels))] = value
+
+    def state(self):
+        # Raw timers, counters and gauges, for a worker process to send back to its parent
+        with self.lock:
+            return ({key: list(timer) for key, timer in self.timers.items()}, dict(self.counters), dict(self.gauges))
+
+    def merge(self, state):
+        # Adds what another process recorded, as returned by its state()
+        timers, counters, gauges = state
+        with self.lock:
+            for key, (count, total, last, longest) in timers.items():
+                timer = self.timers.get(key)
+                if timer is None:
+                    self.timers[key] = [count, total, last, longest]
+                else:
+                    timer[0] += count
+                    timer[1] += total
+                    timer[2] = last
+                    timer[3] = max(timer[3], longest)
+            for key, value in counters.items():
+                self.counters[key] = self.counters.get(key, 0) + value
+            self.gauges.update(gauges)
+
+    def snapshot(self):
+        with self.lock:
+            return {
+                'timers': [dict(labels, stage=stage, count=count, total_seconds=total, last_seconds=last,
+                                max_seconds=longest)
+                           for (stage, labels), (count, total, last, longest) in sorted(self.timers.items())],
+                'counters': [dict(labels, name=name, value=value)
+                             for (name, labels), value in sorted(self.counters.items())],
+                'gauges': [dict(labels, name=name, value=value)
+                           for (name, labels), value in sorted(self.gauges.items())],
+            }
+
+    def prometheus_text(self):
+        with self.lock:
+            timers = sorted(self.timers.items())
+            counters = sorted(self.counters.items())
+            gauges = sorted(self.gauges.items())
+
+        lines = [f"# TYPE {METRIC_PREFIX}stage_seconds summary"]
+        for (stage, labels), (count, total, last, longest) in timers:
+            label_text = format_labels((('stage', stage),) + labels)
+            lines.append(f"{METRIC_PREFIX}stage_seconds_sum{label_text} {total:.6f}")
+            lines.append(f"{METRIC_PREFIX}stage_seconds_count{label_text} {count}")
+        lines.append(f"# TYPE {METRIC_PREFIX}stage_last_seconds gauge")
+        for (stage, labels), (count, total, last, longest) in timers:
+            lines.append(f"{METRIC_PREFIX}stage_last_seconds{format_labels((('stage', stage),) + labels)} {last:.6f}")
+
+        for kind, metrics, suffix in (('counter', counters, '_total'), ('gauge', gauges, '')):
+            declared = set()
+            for (name, labels), value in metrics:
+                if name not in declared:
+                    lines.append(f"# TYPE {METRIC_PREFIX}{name}{suffix} {kind}")
+                    declared.add(name)
+                lines.append(f"{METRIC_PREFIX}{name}{suffix}{format_labels(labels)} {value}")
+        return '\n'.join(lines) + '\n'
+
+    def write_json(self, filename=METRICS_FILE):
+        os.makedirs(os.path.dirname(filename) or '.', exist_ok=True)
+        # Written beside the target and renamed, so readers never see a partial file
+        with open(filename + '.tmp', 'w') as f:
+            json.dump(self.snapshot(), f, indent=2, default=str)
+        os.replace(filename + '.tmp', filename)
+        return filename
+
+    def serve(self, port=METRICS_PORT):
+        metrics = self
+
+        class MetricsHandler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                if self.path.rstrip('/') == '/stats':
+                    body, content_type = json.dumps(metrics.snapshot(), default=str), 'application/json'
+                else:
+                    body, content_type = metrics.prometheus_text(), 'text/plain; version=0.0.4'
+                data = body.encode('utf-8')
+                self.send_response(200)
+                self.send_header('Content-Type', content_type)
+                self.send_header('Content-Length', str(len(data)))
+                self.end_headers()
+                self.wfile.write(data)
+
+            def log_message(self, format, *args):
+                pass
+
+        server = ThreadingHTTPServer(('127.0.0.1', port), MetricsHandler)
+        server.daemon_threads = True
+        threading.Thread(target=server.serve_forever, daemon=True).start()
+        return server
+
+METRICS = Metrics()
@@ -0,0 +1,213 @@
+import json
+import os
+import queue
+import smtplib
+import sys
+import threading
+import time
+from collections import deque
+from email.message import EmailMessage
+from typing import NamedTuple, Optional
+
+import requests
+from dotenv import load_dotenv
+
+from analysis.ev_analysis import format_arbitrage_opportunity, format_bet_recommendation
+from analysis.incremental import bet_key, opportunity_key
+from monitoring.metrics import METRICS
+
+DEDUP_TTL = 30 * 60  # Seconds before the same opportunity may be alerted again
+BATCH_WINDOW = 0.5  # Seconds a sink waits for more alerts before sending a batch
+MAX_BATCH_SIZE = 50  # Alerts per message at most
+MIN_SEND_INTERVAL = {'stdout': 0, 'webhook': 1, 'email': 30}  # Per-sink rate limit, seconds between sends
+MAX_QUEUED_ALERTS = 10000  # Per-sink backlog; beyond this new alerts are dropped and counted
+LATENCY_SAMPLES = 1000  # Recent fetch-to-delivery latencies kept per sink
+SINK_TIMEOUT = 10  # Seconds before a webhook or SMTP call is abandoned
+SEND_RETRIES = 3  # Further attempts at a batch a sink failed to send before its alerts are given up
+RETRY_BACKOFF = 2  # Seconds before a sink's first retry; doubled on each further one
+
+load_dotenv()
+
+class Alert(NamedTuple):
+    key: tuple
+    kind: str  # 'arbitrage', 'middle' or 'ev'
+    text: str
+    payload: dict
+    fetched_at: Optional[float]  # time.time() when the odds behind this alert were fetched
+
+class StdoutSink:
+    name = 'stdout'
+
+    def __init__(self, stream=None):
+        self.stream = stream
+
+    def send(self, alerts):
+        stream = self.stream or sys.stdout
+        stream.write(f"\n=== {len(alerts)} new betting opportunities ===\n")
+        stream.write('\n'.join(alert.text for alert in alerts))
+        stream.flush()
+
+class WebhookSink:
+    name = 'webhook'
+
+    def __init__(self, url, session=None):
+        self.url = url
+        self.session = session or requests.Session()
+
+    def send(self, alerts):
+        body = json.dumps({'alerts': [dict(alert.payload, Kind=alert.kind) for alert in alerts]}, default=str)
+        response = self.session.post(self.url, data=body, headers={'Content-Type': 'application/json'},
+                                     timeout=SINK_TIMEOUT)
+        response.raise_for_status()
+
+class EmailSink:
+    name = 'email'
+
+    def __init__(self, recipients, host='localhost', port=25, sender='arbing@localhost'):
+        self.recipients = recipients
+        self.host = host
+        self.port = port
+        self.sender = sender
+
+    def send(self, alerts):
+        message = EmailMessage()
+        message['Subject'] = f"{len(alerts)} new betting opportunities"
+        message['From'] = self.sender
+        message['To'] = ', '.join(self.recipients)
+        message.set_content('\n'.join(alert.text for alert in alerts))
+        with smtplib.SMTP(self.host, self.port, timeout=SINK_TIMEOUT) as smtp:
+            smtp.send_message(message)
+
+class SinkWorker(threading.Thread):
+    # One thread and queue per sink, so a slow webhook or mail server only delays its own alerts.
+    # Alerts that arrive while the sink is rate limited simply join the next batch. A batch the sink
+    # fails to send is retried on this thread with a doubling backoff, so other sinks never resend it.
+    def __init__(self, sink, min_interval=None):
+        super().__init__(name=f"notify-{sink.name}", daemon=True)
+        self.sink = sink
+        self.min_interval = MIN_SEND_INTERVAL.get(sink.name, 0) if min_interval is None else min_interval
+        self.queue = queue.Queue(MAX_QUEUED_ALERTS)
+        self.latencies = deque(maxlen=LATENCY_SAMPLES)
+        self.last_send = 0
+        self.sent = 0
+        self.failed = 0
+
+    def submit(self, alert):
+        try:
+            self.queue.put_nowait(alert)
+        except queue.Full:
+            METRICS.increment('alerts_dropped', sink=self.sink.name)
+
+    def next_batch(self):
+        # Blocks for the first alert, then gathers whatever else arrives within the batch window
+        batch = [self.queue.get()]
+        deadline = time.monotonic() + max(BATCH_WINDOW, self.last_send + self.min_interval - time.monotonic())
+        while batch[-1] is not None and len(batch) < MAX_BATCH_SIZE:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                break
+            try:
+                batch.append(self.queue.get(timeout=remaining))
+            except queue.Empty:
+                break
+        return batch
+
+    def run(self):
+        while True:
+            batch = self.next_batch()
+            stopping = batch[-1] is None
+            alerts = [alert for alert in batch if alert is not None]
+            if alerts:
+                self.deliver(alerts)
+            if stopping:
+                return
+
+    def send(self, alerts):
+        for attempt in range(SEND_RETRIES + 1):
+            if attempt:
+                METRICS.increment('alerts_retried', len(alerts), sink=self.sink.name)
+                time.sleep(RETRY_BACKOFF * 2 ** (attempt - 1))
+            self.last_send = time.monotonic()
+            try:
+                with METRICS.timer('notify', sink=self.sink.name):
+                    self.sink.send(alerts)
+                return True
+            except Exception as e:
+                print(f"Failed to deliver {len(alerts)} alerts via {self.sink.name} "
+                      f"(attempt {attempt + 1} of {SEND_RETRIES + 1}): {e}")
+        return False
+
+    def deliver(self, alerts):
+        if not self.send(alerts):
+            self.failed += len(alerts)
+            METRICS.increment('alerts_failed', len(alerts), sink=self.sink.name)
+            return
+        delivered_at = time.time()
+        self.sent += len(alerts)
+        METRICS.increment('alerts_sent', len(alerts), sink=self.sink.name)
+        for alert in alerts:
+            if alert.fetched_at is not None:
+                latency = delivered_at - alert.fetched_at
+                self.latencies.append(latency)
+                METRICS.observe('fetch_to_alert', latency, sink=self.sink.name)
+
+class NotificationDispatcher:
+    # publish() only deduplicates and enqueues, so the scan loop never waits on delivery. A key is
+    # marked as alerted when it is queued, once for every sink; each sink retries its own failures.
+    def __init__(self, sinks, dedup_ttl=DEDUP_TTL):
+        self.workers = [SinkWorker(sink) for sink in sinks]
+        self.dedup_ttl = dedup_ttl
+        self.alerted = {}
+        for worker in self.workers:
+            worker.start()
+
+    def is_duplicate(self, key, now):
+        last_alerted = self.alerted.get(key)
+        if last_alerted is not None and now - last_alerted < self.dedup_ttl:
+            METRICS.increment('alerts_deduplicated')
+            return True
+        self.alerted[key] = now
+        return False
+
+    def submit(self, alert):
+        for worker in self.workers:
+            worker.submit(alert)
+
+    def publish(self, opportunities=(), positive_ev_bets=(), fetched_at=None):
+        # Alerts are only formatted once they survive deduplication
+        now = time.monotonic()
+        if len(self.alerted) > MAX_QUEUED_ALERTS:
+            self.alerted = {key: at for key, at in self.alerted.items() if now - at < self.dedup_ttl}
+        published = 0
+        for opportunity in opportunities:
+            key = opportunity_key(opportunity)
+            if not self.is_duplicate(key, now):
+                self.submit(Alert(key, opportunity['Category'].lower(), format_arbitrage_opportunity(opportunity),
+                                  opportunity, fetched_at))
+                published += 1
+        for bet in positive_ev_bets:
+            key = bet_key(bet)
+            if not self.is_duplicate(key, now):
+                self.submit(Alert(key, 'ev', format_bet_recommendation(bet), bet, fetched_at))
+                published += 1
+        return published
+
+    def close(self, timeout=None):
+        # Flushes every sink's backlog, then stops its worker
+        for worker in self.workers:
+            worker.queue.put(None)
+        for worker in self.workers:
+            worker.join(timeout)
+
+def create_dispatcher():
+    # Sinks come from the environment (.env), like the API key. Returns None when none is configured.
+    sinks = []
+    if os.getenv('NOTIFY_STDOUT'):
+        sinks.append(StdoutSink())
+    if os.getenv('NOTIFY_WEBHOOK_URL'):
+        sinks.append(WebhookSink(os.getenv('NOTIFY_WEBHOOK_URL')))
+    if os.getenv('NOTIFY_EMAIL_TO'):
+        sinks.append(EmailSink(os.getenv('NOTIFY_EMAIL_TO').split(','), os.getenv('NOTIFY_SMTP_HOST', 'localhost'),
+                               int(os.getenv('NOTIFY_SMTP_PORT', '25')),
+                               os.getenv('NOTIFY_EMAIL_FROM', 'arbing@localhost')))
+    return NotificationDispatcher(sinks) if sinks else None
@@ -1,44 +1,58 @@
 # run_ev_analysis.py
 
 import os
+import sys
+from analysis.ev_analysis import EST
 from analysis.ev_analysis import main as analyze_odds
+from analysis.batch_analysis import run_batch, snapshot_time
+from config.settings import SettingsWatcher
+from scrapers.snapshot_store import STORE_DIR, SnapshotStore
 
 def list_csv_files():
-    csv_files = [f for f in os.listdir('data') if f.endswith('.csv')]
+    csv_files = [f for f in os.listdir('data') if f.endswith('.csv')] if os.path.isdir('data') else []
     return csv_files
 
 def main():
-    csv_files = list_csv_files()
+    SettingsWatcher().check()
+
+    # python run_ev_analysis.py --batch [workers]: analyze every snapshot in data/ in parallel
+    if len(sys.argv) > 1 and sys.argv[1] == '--batch':
+        workers = int(sys.argv[2]) if len(sys.argv) > 2 else None
+        run_batch('data', workers)
+        return
+
+    # Legacy CSV files first, then every snapshot in the columnar store
+    store = SnapshotStore(STORE_DIR)
+    snapshots = [(file, os.path.join('data', file)) for file in list_csv_files()]
+    snapshots += [(f"{STORE_DIR} @ {time.isoformat()}", time) for time in store.snapshot_times()]
     
-    if not csv_files:
-        print("No CSV files found in the 'data' folder.")
+    if not snapshots:
+        print("No snapshots found in the 'data' folder.")
         return
 
-    print("Available CSV files:")
-    for i, file in enumerate(csv_files, 1):
-        print(f"{i}. {file}")
+    print("Available snapshots:")
+    for i, (label, _) in enumerate(snapshots, 1):
+        print(f"{i}. {label}")
 
     while True:
         try:
-            choice = int(input("\nEnter the number of the CSV file you want to analyze: "))
-            if 1 <= choice <= len(csv_files):
-                selected_file = csv_files[choice - 1]
+            choice = int(input("\nEnter the number of the snapshot you want to analyze: "))
+            if 1 <= choice <= len(snapshots):
+                label, selected = snapshots[choice - 1]
                 break
             else:
                 print("Invalid choice. Please enter a number from the list.")
         except ValueError:
             print("Invalid input. Please enter a number.")
 
-    csv_file_path = os.path.join('data', selected_file)
-    print(f"\nAnalyzing odds data from {csv_file_path}...")
-    log_file = analyze_odds(csv_file_path)
+    print(f"\nAnalyzing odds data from {label}...")
+    # Analyzed as of the time the snapshot was taken, so its games are still upcoming
+    if isinstance(selected, str):
+        log_file = analyze_odds(selected, now=snapshot_time(selected))
+    else:
+        log_file = analyze_odds(store.rows(selected), now=selected.astimezone(EST))
     
     print(f"\nAnalysis complete. Detailed recommendations have been saved to {log_file}")
-    print("\nBetting Recommendations Summary:")
-    
-    with open(log_file, 'r') as f:
-        content = f.read()
-        print(content)
 
 if __name__ == "__main__":
     main()
\ No newline at end of file
@@ -1,13 +1,212 @@
-from apscheduler.schedulers.blocking import BlockingScheduler
-from betus_scraper import main as scrape_main
+import heapq
+import sys
+import threading
+import time
 
-def scheduled_scrape():
-    print("Starting scheduled scrape...")
-    scrape_main()
-    print("Scheduled scrape completed.")
+from analysis.ev_analysis import format_arbitrage_opportunity
+from analysis.incremental import IncrementalAnalyzer
+from analysis.line_history import SHARP_BOOKMAKERS, STEAM_MIN_BOOKS, LineHistory
+from analysis.opportunity_store import OpportunityStore
+from analysis.portfolio import format_portfolio, format_position, size_portfolio
+from config.settings import ANALYSIS_FIELDS, FETCH_FIELDS, SettingsWatcher
+from monitoring.metrics import METRICS, METRICS_PORT
+from notifications.dispatcher import create_dispatcher
+from scrapers import odds_api
+from scrapers.odds_api import MAX_CONCURRENT_REQUESTS
+from scrapers.poller import OddsPoller
+from scrapers.snapshot_store import save_snapshot
+
+TICK_INTERVAL = 15  # Seconds between scan cycles; the poller decides which sports are actually due
+SAVE_SNAPSHOTS = True  # Also append changed odds to the snapshot store in data/
+MAX_REPORTED_BETS = 5  # Top new or repriced EV bets printed per cycle
+RECORD_OPPORTUNITIES = True  # Keep every new or repriced opportunity in the opportunity store in data/
+SIZE_PORTFOLIO = True  # Re-solve the stakes of every current EV bet and opportunity after each analysis
+SERVE_METRICS = True  # Expose stage timings and counters on http://127.0.0.1:METRICS_PORT/metrics
+
+class Scanner:
+    # Resident scan loop: the poller keeps every sport's parsed odds in memory between cycles,
+    # each cycle only re-fetches due sports, and the analyzer only re-evaluates markets that moved.
+    def __init__(self, poller=None, tick_interval=TICK_INTERVAL, max_concurrent=MAX_CONCURRENT_REQUESTS,
+                 save_snapshots=SAVE_SNAPSHOTS, notifier=None, store=None, settings=None,
+                 size_portfolio=SIZE_PORTFOLIO):
+        self.poller = poller if poller is not None else OddsPoller()
+        self.tick_interval = tick_interval
+        self.max_concurrent = max_concurrent
+        self.save_snapshots = save_snapshots
+        # Sharp books are followed for steam even when they are not among the books bet with
+        self.analyzer = IncrementalAnalyzer(watched_bookmakers=SHARP_BOOKMAKERS)
+        self.history = LineHistory()
+        self.sharp_books_checked = False
+        self.notifier = notifier
+        self.store = store
+        self.settings = settings  # A SettingsWatcher checked before every cycle
+        self.size_portfolio = size_portfolio
+        self.portfolio = None  # Stakes for the analyzer's current bets and opportunities
+        self.snapshot_writer = None
+        self.cycles = 0
+        self.skipped_ticks = 0
+        self.skipped_snapshots = 0
+
+    def write_snapshot(self):
+        # At most one snapshot write in flight; a slow disk drops snapshots instead of queuing threads
+        if self.snapshot_writer is not None and self.snapshot_writer.is_alive():
+            self.skipped_snapshots += 1
+            METRICS.increment('snapshots_skipped')
+            return False
+        self.snapshot_writer = threading.Thread(target=save_snapshot, args=(dict(self.poller.data),), daemon=True)
+        self.snapshot_writer.start()
+        return True
+
+    def check_sharp_books(self):
+        # Sharp books only appear when their region is requested (e.g. pinnacle is in 'eu')
+        seen = {bookmaker['key'] for events in self.poller.data.values() for event in events
+                for bookmaker in event.get('bookmakers', [])}
+        missing = sorted(SHARP_BOOKMAKERS - seen)
+        if missing:
+            print(f"Warning: no odds from sharp bookmakers {', '.join(missing)} in regions "
+                  f"{','.join(odds_api.REGIONS)}; steam from them needs their region, otherwise it takes "
+                  f"{STEAM_MIN_BOOKS} books moving together")
+        self.sharp_books_checked = True
+        return missing
+
+    def track_lines(self, now):
+        # Only rows whose prices changed this cycle can move a line
+        if not self.sharp_books_checked:
+            self.check_sharp_books()
+        steam = self.history.observe(self.analyzer.changed_rows, now)
+        self.history.evict(now)
+        METRICS.increment('steam_moves', len(steam))
+        METRICS.set_gauge('line_history_quotes', len(self.history))
+        return steam
+
+    def reload_settings(self):
+        # The new settings take effect from this cycle: sports are added or dropped, a change of markets
+        # or regions refetches everything, and a change of analysis settings re-evaluates every market
+        changed = self.settings.check()
+        if any(field in FETCH_FIELDS for field in changed):
+            self.poller.set_sports(odds_api.SPORTS)
+            if 'markets' in changed or 'regions' in changed:
+                self.poller.refresh()
+        if any(field in ANALYSIS_FIELDS for field in changed):
+            self.analyzer.invalidate()
+        return changed
+
+    def resize_portfolio(self):
+        # Over everything currently open, not just this cycle's changes, since a new bet competes with
+        # the old ones for the same caps
+        self.portfolio = size_portfolio(self.analyzer.positive_ev_bets, self.analyzer.arbitrage_opportunities)
+        METRICS.set_gauge('portfolio_staked', self.portfolio.staked)
+        return self.portfolio
+
+    def report(self, changed, bet_delta, opportunity_delta, steam=()):
+        print(f"Updated {', '.join(changed)}: {self.analyzer.markets_evaluated} markets re-evaluated, "
+              f"{len(self.analyzer.positive_ev_bets)} EV bets, "
+              f"{len(self.analyzer.arbitrage_opportunities)} arbitrage opportunities "
+              f"({len(opportunity_delta.new)} new, {len(opportunity_delta.changed)} changed, "
+              f"{len(opportunity_delta.expired)} expired)")
+        for opportunity in opportunity_delta.new + opportunity_delta.changed:
+            print(format_arbitrage_opportunity(opportunity))
+        for bet in heapq.nlargest(MAX_REPORTED_BETS, bet_delta.new + bet_delta.changed, key=lambda x: x['EV']):
+            print(f"  {bet['EV']:.2%} EV: {bet['Sport']} - {bet['Game']} {bet['Bet Type']} "
+                  f"{bet.get('Team', '')} @ {bet['Odds']:.2f} ({bet['Bookmaker']})")
+        for move in steam:
+            line = '' if move.line is None else f" {move.line:+g}" if move.market == 'spread' else f" {move.line:g}"
+            lagging = ', '.join(f"{bookmaker} @ {odds:.2f}" for bookmaker, odds in move.lagging) or 'none'
+            print(f"  Steam {'on' if move.direction > 0 else 'against'} {move.outcome}{line} ({move.market}): "
+                  f"{move.sport} - {move.game}, {', '.join(move.movers)} moved to {move.consensus_odds:.2f}; "
+                  f"lagging: {lagging}")
+        if self.portfolio is not None:
+            print("Portfolio: " + format_portfolio(self.portfolio), end='')
+            for position in self.portfolio.positions[:MAX_REPORTED_BETS]:
+                print(format_position(position), end='')
+
+    def cycle(self):
+        timings = {}
+        start = time.perf_counter()
+        if self.settings is not None:
+            self.reload_settings()
+        fetched_at = time.time()
+        changed = self.poller.poll(max_concurrent=self.max_concurrent)
+        timings['fetch'] = time.perf_counter() - start
+
+        if changed:
+            stage_start = time.perf_counter()
+            bet_delta, opportunity_delta = self.analyzer.update(self.poller.data)
+            steam = self.track_lines(time.time())
+            timings['analyze'] = time.perf_counter() - stage_start
+
+            if self.size_portfolio:
+                stage_start = time.perf_counter()
+                self.resize_portfolio()
+                timings['portfolio'] = time.perf_counter() - stage_start
+
+            if self.notifier is not None:
+                # Only enqueues; delivery happens on the notifier's own threads
+                self.notifier.publish(opportunity_delta.new + opportunity_delta.changed,
+                                      bet_delta.new + bet_delta.changed, fetched_at)
+
+            stage_start = time.perf_counter()
+            if self.store is not None:
+                self.store.record(bet_delta.new + bet_delta.changed, opportunity_delta.new + opportunity_delta.changed,
+                                  fetched_at)
+            self.report(changed, bet_delta, opportunity_delta, steam)
+            if self.save_snapshots:
+                self.write_snapshot()
+            timings['report'] = time.perf_counter() - stage_start
+
+        timings['total'] = time.perf_counter() - start
+        self.cycles += 1
+        for stage, seconds in timings.items():
+            METRICS.observe(f"cycle_{stage}", seconds)
+        METRICS.increment('cycles')
+        METRICS.write_json()
+        print(f"Cycle {self.cycles}: " + ", ".join(f"{stage} {seconds:.3f}s" for stage, seconds in timings.items())
+              + f" ({len(changed)} sports changed, {self.poller.quota_summary()})")
+        return timings
+
+    def run(self, max_cycles=None):
+        # Cycles run back to back on this thread, so they can never overlap. A cycle that overruns
+        # its tick drops the ticks it missed rather than firing them in a burst afterwards.
+        next_tick = time.monotonic()
+        while max_cycles is None or self.cycles < max_cycles:
+            self.cycle()
+            next_tick += self.tick_interval
+            now = time.monotonic()
+            if now >= next_tick:
+                missed = int((now - next_tick) // self.tick_interval) + 1
+                self.skipped_ticks += missed
+                METRICS.increment('ticks_skipped', missed)
+                next_tick += missed * self.tick_interval
+                print(f"Cycle overran its {self.tick_interval}s tick, skipping {missed} tick(s)")
+            time.sleep(next_tick - now)
+
+    def stop(self):
+        if self.snapshot_writer is not None:
+            self.snapshot_writer.join()
+        if self.notifier is not None:
+            self.notifier.close()
+        if self.store is not None:
+            self.store.close()
+
+def main(tick_interval=TICK_INTERVAL):
+    # Settings are applied before the poller is built, so it starts with the configured sports
+    settings = SettingsWatcher()
+    settings.check()
+    scanner = Scanner(tick_interval=tick_interval, notifier=create_dispatcher(),
+                      store=OpportunityStore() if RECORD_OPPORTUNITIES else None, settings=settings)
+    if not scanner.poller.sports:
+        print("No sports configured in SPORTS")
+        return
+    if SERVE_METRICS:
+        METRICS.serve(METRICS_PORT)
+        print(f"Metrics available at http://127.0.0.1:{METRICS_PORT}/metrics (JSON at /stats)")
+    print(f"Scanner started, checking every {tick_interval}s. Press Ctrl+C to exit.")
+    try:
+        scanner.run()
+    except KeyboardInterrupt:
+        print(f"\nStopping scanner after {scanner.cycles} cycles ({scanner.skipped_ticks} ticks skipped).")
+    finally:
+        scanner.stop()
 
 if __name__ == "__main__":
-    scheduler = BlockingScheduler()
-    scheduler.add_job(scheduled_scrape, 'interval', hours=1)
-    print("Scheduler started. Press Ctrl+C to exit.")
-    scheduler.start()
\ No newline at end of file
+    main(*map(float, sys.argv[1:2]))
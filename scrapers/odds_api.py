@@ -1,13 +1,20 @@
 import requests
 import csv
+import json
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime
+from itertools import groupby
 import os
+from typing import NamedTuple, Optional
 from dotenv import load_dotenv
+from requests.adapters import HTTPAdapter
+
+from monitoring.metrics import METRICS
 
 # Load environment variables from .env file
 load_dotenv()
 
-BASE_URL = "https://api.the-odds-api.com/v4/sports"
+BASE_URL = os.getenv("ODDS_API_BASE_URL", "https://api.the-odds-api.com/v4/sports")
 
 SPORTS = [
     # 'soccer_france_ligue_one',
@@ -33,24 +40,224 @@ MARKETS = {
     'soccer_epl': ['h2h', 'spreads', 'totals'],
     'soccer_la_liga': ['h2h', 'spreads', 'totals'],
 }
-REGIONS = ['us']
+REGIONS = os.getenv("ODDS_API_REGIONS", "us").split(',')  # Bookmaker regions requested: us, us2, uk, eu, au
+MARKET_PARAMS = {sport: ','.join(markets) for sport, markets in MARKETS.items()}  # markets query parameter per sport
+REGIONS_PARAM = ','.join(REGIONS)  # regions query parameter
+MAX_CONCURRENT_REQUESTS = 8  # Maximum number of in-flight requests when fetching concurrently
+REQUEST_TIMEOUT = 30  # Seconds to wait for a single Odds API response
+SCORES_DAYS_FROM = 3  # Days back the scores endpoint reports completed games for (at most 3)
+STREAM_CHUNK_SIZE = 64 * 1024  # Bytes read at a time when streaming a response
+QUOTA_GAUGES = {'x-requests-remaining': 'api_requests_remaining', 'x-requests-used': 'api_requests_used',
+                'x-requests-last': 'api_requests_last'}  # Quota headers exported as metrics gauges
+
+CSV_HEADERS = ["Sport", "Home Team", "Away Team", "Start Time", "Bookmaker",
+               "Home Odds", "Away Odds", "Draw Odds",
+               "Home Spread", "Home Spread Odds", "Away Spread", "Away Spread Odds",
+               "Over", "Over Odds", "Under", "Under Odds"]
+
+class OddsRow(NamedTuple):
+    # One bookmaker's prices for one event; missing markets are None
+    sport: str
+    home_team: str
+    away_team: str
+    start_time: str
+    bookmaker: str  # The bookmaker's API key (e.g. 'betonlineag'), as ALLOWED_BOOKMAKERS and SHARP_BOOKMAKERS name it
+    home_odds: Optional[float] = None
+    away_odds: Optional[float] = None
+    draw_odds: Optional[float] = None
+    home_spread: Optional[float] = None
+    home_spread_odds: Optional[float] = None
+    away_spread: Optional[float] = None
+    away_spread_odds: Optional[float] = None
+    over: Optional[float] = None
+    over_odds: Optional[float] = None
+    under: Optional[float] = None
+    under_odds: Optional[float] = None
+
+class Quote(NamedTuple):
+    # One price in the Odds API payload: a single outcome of one market at one bookmaker.
+    # point is the outcome's own line (spread, total, prop threshold), None when the market has none;
+    # description names the player (or other subject) of prop outcomes; bookmaker is the API key, not the
+    # display title ('betonlineag', not 'BetOnline.ag').
+    sport: str
+    event_id: str
+    home_team: str
+    away_team: str
+    start_time: str
+    bookmaker: str
+    market: str
+    outcome: str
+    description: Optional[str]
+    point: Optional[float]
+    price: float
+    last_update: Optional[str]
+
+def configure(sports=None, markets=None, regions=None):
+    # Replaces the fetch settings above, e.g. when config.settings reloads them, and rebuilds the query
+    # parameters derived from them. None keeps a setting as it is.
+    global SPORTS, MARKETS, REGIONS, MARKET_PARAMS, REGIONS_PARAM
+    if sports is not None:
+        SPORTS = list(sports)
+    if markets is not None:
+        MARKETS = {sport: list(sport_markets) for sport, sport_markets in markets.items()}
+        MARKET_PARAMS = {sport: ','.join(sport_markets) for sport, sport_markets in MARKETS.items()}
+    if regions is not None:
+        REGIONS = list(regions)
+        REGIONS_PARAM = ','.join(REGIONS)
+
+def create_session(max_connections=MAX_CONCURRENT_REQUESTS):
+    # One pooled session so every sport reuses the same keep-alive TCP/TLS connections
+    session = requests.Session()
+    adapter = HTTPAdapter(pool_connections=1, pool_maxsize=max_connections)
+    session.mount('https://', adapter)
+    session.mount('http://', adapter)
+    return session
 
-def fetch_odds(sport):
+def request_odds(sport, session=None, headers=None, stream=False, api_key=None, regions=None, markets=None,
+                 key_index=None):
+    # key_index: which of several API keys (see scrapers.sharded_fetch) is making the request; its quota
+    # gauges are then labelled with it, so one key's reply never overwrites another's
     params = {
-        "api_key": os.getenv("API_KEY"),
-        "regions": ','.join(REGIONS),
-        "markets": ','.join(MARKETS.get(sport, MARKETS['default'])),
+        "api_key": api_key or os.getenv("API_KEY"),
+        "regions": ','.join(regions) if regions else REGIONS_PARAM,
+        "markets": ','.join(markets) if markets else MARKET_PARAMS.get(sport, MARKET_PARAMS['default']),
         "oddsFormat": "decimal",
         "dateFormat": "iso"
     }
     
     url = f"{BASE_URL}/{sport}/odds"
-    response = requests.get(url, params=params)
+    http = session if session is not None else requests
+    try:
+        response = http.get(url, params=params, headers=headers, timeout=REQUEST_TIMEOUT, stream=stream)
+    except requests.RequestException as e:
+        print(f"Failed to get odds for {sport}: {e}")
+        METRICS.increment('api_requests', sport=sport, status='error')
+        return None
+
+    METRICS.increment('api_requests', sport=sport, status=response.status_code)
+    labels = {} if key_index is None else {'key': str(key_index)}
+    for header, gauge in QUOTA_GAUGES.items():
+        try:
+            METRICS.set_gauge(gauge, float(response.headers[header]), **labels)
+        except (KeyError, ValueError):
+            pass
+    return response
+
+def fetch_odds(sport, session=None):
+    with METRICS.timer('fetch', sport=sport):
+        response = request_odds(sport, session)
+        if response is None:
+            return None
+        if response.status_code != 200:
+            print(f"Failed to get odds for {sport}: status_code {response.status_code}, response body {response.text}")
+            return None
+        return response.json()
+
+def fetch_scores(sport, session=None, days_from=SCORES_DAYS_FROM):
+    # Live and recently completed games with their scores
+    params = {"api_key": os.getenv("API_KEY"), "daysFrom": days_from, "dateFormat": "iso"}
+    http = session if session is not None else requests
+    try:
+        response = http.get(f"{BASE_URL}/{sport}/scores", params=params, timeout=REQUEST_TIMEOUT)
+    except requests.RequestException as e:
+        print(f"Failed to get scores for {sport}: {e}")
+        METRICS.increment('api_requests', sport=sport, status='error')
+        return None
+    METRICS.increment('api_requests', sport=sport, status=response.status_code)
     if response.status_code != 200:
-        print(f"Failed to get odds for {sport}: status_code {response.status_code}, response body {response.text}")
+        print(f"Failed to get scores for {sport}: status_code {response.status_code}, response body {response.text}")
         return None
     return response.json()
 
+def iter_json_array(chunks):
+    # Decodes a top-level JSON array one element at a time, so only the element being read is held as text
+    decoder = json.JSONDecoder()
+    buffer, position, started = '', 0, False
+    for chunk in chunks:
+        buffer = buffer[position:] + chunk
+        position = 0
+        while True:
+            while position < len(buffer) and buffer[position] in ' \t\r\n,':
+                position += 1
+            if position == len(buffer) or (started and buffer[position] == ']'):
+                break
+            if not started:
+                if buffer[position] != '[':
+                    raise ValueError("Expected a JSON array")
+                started = True
+                position += 1
+                continue
+            try:
+                item, position = decoder.raw_decode(buffer, position)
+            except json.JSONDecodeError:
+                break  # The element continues in the next chunk
+            yield item
+    if buffer[position:].strip() not in (']', ''):
+        raise ValueError("Truncated JSON array")
+
+def event_quotes(sport, event):
+    home_team = event['home_team']
+    away_team = event['away_team']
+    start_time = event['commence_time']
+    for bookmaker in event['bookmakers']:
+        for market in bookmaker['markets']:
+            last_update = market.get('last_update', bookmaker.get('last_update'))
+            for outcome in market['outcomes']:
+                yield Quote(sport, event['id'], home_team, away_team, start_time, bookmaker['key'], market['key'],
+                            outcome['name'], outcome.get('description'), outcome.get('point'), outcome['price'],
+                            last_update)
+
+def iter_quotes(all_data):
+    # Long-format quotes for already parsed payloads, e.g. the all_data dict from fetch_all_odds
+    for sport, data in all_data.items():
+        for event in data:
+            yield from event_quotes(sport, event)
+
+def stream_quotes(sport, session=None):
+    # Long-format quotes straight off the wire: each event is decoded, flattened and dropped in turn
+    response = request_odds(sport, session, stream=True)
+    if response is None:
+        return
+    with response:
+        if response.status_code != 200:
+            print(f"Failed to get odds for {sport}: status_code {response.status_code}, response body {response.text}")
+            return
+        response.encoding = response.encoding or 'utf-8'
+        for event in iter_json_array(response.iter_content(STREAM_CHUNK_SIZE, decode_unicode=True)):
+            yield from event_quotes(sport, event)
+
+def flatten_quotes(quotes):
+    # Wide OddsRow view of the main markets, one row per (event, bookmaker). Outcomes are matched to
+    # the home or away slot by team name, and every line comes from the outcome's own point.
+    for (sport, _, bookmaker), bookmaker_quotes in groupby(quotes, key=lambda q: (q.sport, q.event_id, q.bookmaker)):
+        odds_fields = {}
+        for quote in bookmaker_quotes:
+            if quote.market == 'h2h':
+                if quote.outcome == quote.home_team:
+                    odds_fields['home_odds'] = quote.price
+                elif quote.outcome == quote.away_team:
+                    odds_fields['away_odds'] = quote.price
+                elif quote.outcome == 'Draw':
+                    odds_fields['draw_odds'] = quote.price
+            elif quote.market == 'spreads':
+                if quote.outcome == quote.home_team:
+                    odds_fields['home_spread'] = quote.point
+                    odds_fields['home_spread_odds'] = quote.price
+                elif quote.outcome == quote.away_team:
+                    odds_fields['away_spread'] = quote.point
+                    odds_fields['away_spread_odds'] = quote.price
+            elif quote.market == 'totals':
+                if quote.outcome == 'Over':
+                    odds_fields['over'] = quote.point
+                    odds_fields['over_odds'] = quote.price
+                elif quote.outcome == 'Under':
+                    odds_fields['under'] = quote.point
+                    odds_fields['under_odds'] = quote.price
+        yield OddsRow(sport, quote.home_team, quote.away_team, quote.start_time, bookmaker, **odds_fields)
+
+def flatten_odds(all_data):
+    return flatten_quotes(iter_quotes(all_data))
+
 def save_to_csv(all_data):
     if not all_data:
         print("No data to save")
@@ -59,63 +266,49 @@ def save_to_csv(all_data):
     os.makedirs('data', exist_ok=True)
     filename = f"data/all_sports_odds_{datetime.now().strftime('%Y%m%d_%H%M%S')}.csv"
     
-    with open(filename, mode='w', newline='', encoding='utf-8') as file:
+    with METRICS.timer('csv_write'), open(filename, mode='w', newline='', encoding='utf-8') as file:
         writer = csv.writer(file)
-        
-        headers = ["Sport", "Home Team", "Away Team", "Start Time", "Bookmaker", 
-                   "Home Odds", "Away Odds", "Draw Odds",
-                   "Home Spread", "Home Spread Odds", "Away Spread", "Away Spread Odds", 
-                   "Over", "Over Odds", "Under", "Under Odds"]
-        
-        writer.writerow(headers)
-
-        for sport, data in all_data.items():
-            for event in data:
-                home_team = event['home_team']
-                away_team = event['away_team']
-                start_time = event['commence_time']
-
-                for bookmaker in event['bookmakers']:
-                    row = [sport, home_team, away_team, start_time, bookmaker['title']]
-                    
-                    # Initialize all odds fields with 'N/A'
-                    odds_fields = ['N/A'] * 11
-                    
-                    for market in bookmaker['markets']:
-                        if market['key'] == 'h2h':
-                            odds = {o['name']: o['price'] for o in market['outcomes']}
-                            odds_fields[0] = odds.get(home_team, 'N/A')
-                            odds_fields[1] = odds.get(away_team, 'N/A')
-                            odds_fields[2] = odds.get('Draw', 'N/A')  # Add draw odds
-                        elif market['key'] == 'spreads':
-                            for outcome in market['outcomes']:
-                                if outcome['name'] == home_team:
-                                    odds_fields[3] = outcome.get('point', 'N/A')
-                                    odds_fields[4] = outcome['price']
-                                else:
-                                    odds_fields[5] = outcome.get('point', 'N/A')
-                                    odds_fields[6] = outcome['price']
-                        elif market['key'] == 'totals':
-                            odds_fields[7] = market.get('total', 'N/A')
-                            for outcome in market['outcomes']:
-                                if outcome['name'] == 'Over':
-                                    odds_fields[8] = outcome['price']
-                                else:
-                                    odds_fields[10] = outcome['price']
-                    
-                    row.extend(odds_fields)
-                    writer.writerow(row)
+        writer.writerow(CSV_HEADERS)
+
+        for row in flatten_odds(all_data):
+            # Missing odds are written as 'N/A'
+            writer.writerow(['N/A' if value is None else value for value in row])
     
     print(f"Data for all sports saved to {filename}")
     return filename
 
-def main():
+def fetch_all_odds(sports=None, max_concurrent=MAX_CONCURRENT_REQUESTS, session=None):
+    sports = SPORTS if sports is None else sports
     all_data = {}
-    for sport in SPORTS:
-        print(f"Fetching odds data for {sport}...")
-        odds_data = fetch_odds(sport)
+    if not sports:
+        return all_data
+
+    own_session = session is None
+    if own_session:
+        session = create_session(max_concurrent)
+
+    try:
+        if max_concurrent <= 1:
+            results = []
+            for sport in sports:
+                print(f"Fetching odds data for {sport}...")
+                results.append(fetch_odds(sport, session))
+        else:
+            print(f"Fetching odds data for {len(sports)} sports ({max_concurrent} at a time)...")
+            with ThreadPoolExecutor(max_workers=min(max_concurrent, len(sports))) as executor:
+                results = list(executor.map(lambda sport: fetch_odds(sport, session), sports))
+    finally:
+        if own_session:
+            session.close()
+
+    # Keep the same sport ordering as the sequential loop
+    for sport, odds_data in zip(sports, results):
         if odds_data:
             all_data[sport] = odds_data
+    return all_data
+
+def main(max_concurrent=MAX_CONCURRENT_REQUESTS):
+    all_data = fetch_all_odds(max_concurrent=max_concurrent)
     
     if all_data:
         filename = save_to_csv(all_data)
@@ -0,0 +1,239 @@
+import hashlib
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta, timezone
+
+from monitoring.metrics import METRICS
+from scrapers import odds_api
+from scrapers.odds_api import create_session, request_odds
+from scrapers.snapshot_store import save_snapshot
+
+# Refresh interval in seconds, chosen by how soon a sport's next event starts
+REFRESH_TIERS = [
+    (timedelta(hours=1), 60),
+    (timedelta(hours=6), 5 * 60),
+    (timedelta(hours=24), 15 * 60),
+    (timedelta(days=3), 60 * 60),
+]
+IDLE_REFRESH_INTERVAL = 6 * 60 * 60  # Sports with nothing scheduled inside the tiers above
+MAX_REFRESH_INTERVAL = 6 * 60 * 60  # Upper bound after backing off unchanged sports
+LIVE_WINDOW = timedelta(hours=4)  # Events that started this recently still count as in play
+UNCHANGED_BACKOFF = 2  # Interval multiplier each time a sport's payload comes back unchanged
+RETRY_INTERVAL = 60  # Seconds before retrying a sport whose request failed
+QUOTA_RESERVE = 50  # Below this many remaining requests, only poll sports in the fastest tier
+
+def parse_commence_time(commence_time):
+    return datetime.strptime(commence_time, "%Y-%m-%dT%H:%M:%SZ").replace(tzinfo=timezone.utc)
+
+def next_commence_time(events, now):
+    upcoming = [start for start in (parse_commence_time(event['commence_time']) for event in events)
+                if start >= now - LIVE_WINDOW]
+    return min(upcoming) if upcoming else None
+
+def base_refresh_interval(next_start, now):
+    if next_start is None:
+        return IDLE_REFRESH_INTERVAL
+    until_start = next_start - now
+    for horizon, interval in REFRESH_TIERS:
+        if until_start <= horizon:
+            return interval
+    return IDLE_REFRESH_INTERVAL
+
+def parse_quota_header(headers, name):
+    value = headers.get(name)
+    if value is None:
+        return None
+    try:
+        return int(float(value))
+    except ValueError:
+        return None
+
+def initial_state():
+    return {
+        'next_poll': None,
+        'interval': 0,
+        'next_start': None,
+        'payload_hash': None,
+        'etag': None,
+        'last_modified': None,
+        'unchanged_polls': 0,
+    }
+
+class OddsPoller:
+    def __init__(self, sports=None, session=None, quota_reserve=QUOTA_RESERVE):
+        self.sports = list(odds_api.SPORTS if sports is None else sports)
+        self.session = session if session is not None else create_session()
+        self.quota_reserve = quota_reserve
+        self.data = {}
+        self.state = {sport: initial_state() for sport in self.sports}
+
+        # Quota as last reported by the Odds API response headers
+        self.requests_remaining = None
+        self.requests_used = None
+        self.requests_last = None
+        self.quota_probe_at = None  # Once the quota runs out, when one request checks whether it has reset
+
+    def update_quota(self, headers, now):
+        remaining = parse_quota_header(headers, 'x-requests-remaining')
+        used = parse_quota_header(headers, 'x-requests-used')
+        last = parse_quota_header(headers, 'x-requests-last')
+        if remaining is not None:
+            self.requests_remaining = remaining
+            if remaining <= 0:
+                self.quota_probe_at = now + timedelta(seconds=IDLE_REFRESH_INTERVAL)
+        if used is not None:
+            self.requests_used = used
+        if last is not None:
+            self.requests_last = last
+
+    def set_sports(self, sports):
+        # Added sports are polled on the next cycle; removed sports drop their odds
+        self.sports = list(sports)
+        for sport in self.sports:
+            self.state.setdefault(sport, initial_state())
+        for sport in [sport for sport in self.state if sport not in self.sports]:
+            del self.state[sport]
+            self.data.pop(sport, None)
+
+    def refresh(self):
+        # After a change of markets or regions: every sport is polled again on the next cycle, and the
+        # cached payloads no longer describe the request, so they are not revalidated
+        for sport in self.sports:
+            self.state[sport] = initial_state()
+
+    def quota_exhausted(self):
+        return self.requests_remaining is not None and self.requests_remaining <= 0
+
+    def due_sports(self, now=None):
+        now = now or datetime.now(timezone.utc)
+        if self.quota_exhausted():
+            # The remaining count only comes back with a response, so after the idle interval the most
+            # urgent sport is polled once to find out whether the quota has been reset
+            if self.quota_probe_at is not None and now < self.quota_probe_at:
+                return []
+            self.quota_probe_at = now + timedelta(seconds=IDLE_REFRESH_INTERVAL)
+            return sorted(self.sports, key=lambda sport: self.state[sport]['interval'])[:1]
+
+        due = [sport for sport in self.sports
+               if self.state[sport]['next_poll'] is None or self.state[sport]['next_poll'] <= now]
+
+        # Running low on quota: keep spending it only on games that are about to start
+        if self.requests_remaining is not None and self.requests_remaining <= self.quota_reserve:
+            fastest = REFRESH_TIERS[0][1]
+            due = [sport for sport in due if self.state[sport]['interval'] <= fastest]
+
+        return sorted(due, key=lambda sport: self.state[sport]['interval'])
+
+    def schedule(self, sport, now, changed):
+        state = self.state[sport]
+        events = self.data.get(sport, [])
+        state['next_start'] = next_commence_time(events, now)
+        interval = base_refresh_interval(state['next_start'], now)
+
+        if changed:
+            state['unchanged_polls'] = 0
+        else:
+            state['unchanged_polls'] += 1
+            backed_off = interval * UNCHANGED_BACKOFF ** state['unchanged_polls']
+            # Never back off past the next kickoff, when prices start moving again
+            if state['next_start'] is not None:
+                backed_off = min(backed_off, max(interval, (state['next_start'] - now).total_seconds()))
+            interval = min(backed_off, MAX_REFRESH_INTERVAL)
+
+        state['interval'] = interval
+        state['next_poll'] = now + timedelta(seconds=interval)
+
+    def poll_sport(self, sport, now=None):
+        now = now or datetime.now(timezone.utc)
+        state = self.state[sport]
+
+        headers = {}
+        if state['etag']:
+            headers['If-None-Match'] = state['etag']
+        if state['last_modified']:
+            headers['If-Modified-Since'] = state['last_modified']
+
+        response = request_odds(sport, self.session, headers=headers or None)
+        if response is None:
+            state['next_poll'] = now + timedelta(seconds=RETRY_INTERVAL)
+            return False
+
+        self.update_quota(response.headers, now)
+
+        if response.status_code == 304:
+            self.schedule(sport, now, changed=False)
+            return False
+        if response.status_code != 200:
+            print(f"Failed to get odds for {sport}: status_code {response.status_code}, response body {response.text}")
+            state['next_poll'] = now + timedelta(seconds=max(RETRY_INTERVAL, state['interval']))
+            return False
+
+        state['etag'] = response.headers.get('ETag')
+        state['last_modified'] = response.headers.get('Last-Modified')
+
+        payload_hash = hashlib.blake2b(response.content, digest_size=16).digest()
+        changed = payload_hash != state['payload_hash']
+        if changed:
+            state['payload_hash'] = payload_hash
+            self.data[sport] = response.json()
+
+        self.schedule(sport, now, changed)
+        return changed
+
+    def poll(self, now=None, max_concurrent=1):
+        now = now or datetime.now(timezone.utc)
+        due = self.due_sports(now)
+
+        # Sports held back by the quota reserve wait out another full interval
+        for sport in self.sports:
+            state = self.state[sport]
+            if sport not in due and state['next_poll'] is not None and state['next_poll'] <= now:
+                state['next_poll'] = now + timedelta(seconds=state['interval'])
+
+        def poll_sport(sport):
+            with METRICS.timer('fetch', sport=sport):
+                return self.poll_sport(sport, now)
+
+        if max_concurrent > 1 and len(due) > 1:
+            # Each sport only touches its own state, so due sports can share the pooled session
+            with ThreadPoolExecutor(max_workers=min(max_concurrent, len(due))) as executor:
+                results = list(executor.map(poll_sport, due))
+        else:
+            results = [poll_sport(sport) for sport in due]
+        return [sport for sport, changed in zip(due, results) if changed]
+
+    def seconds_until_next_poll(self, now=None):
+        now = now or datetime.now(timezone.utc)
+        if self.quota_exhausted():
+            if self.quota_probe_at is None:
+                return 0
+            return max(0, (self.quota_probe_at - now).total_seconds())
+        pending = [state['next_poll'] for state in self.state.values()]
+        if not pending or any(next_poll is None for next_poll in pending):
+            return 0
+        return max(0, (min(pending) - now).total_seconds())
+
+    def quota_summary(self):
+        return (f"requests remaining: {self.requests_remaining}, used: {self.requests_used}, "
+                f"last request cost: {self.requests_last}")
+
+    def run(self, on_update=None, max_cycles=None):
+        cycles = 0
+        while max_cycles is None or cycles < max_cycles:
+            changed = self.poll()
+            if changed:
+                print(f"Updated odds for {', '.join(changed)} ({self.quota_summary()})")
+                if on_update:
+                    on_update(self.data, changed)
+            cycles += 1
+            time.sleep(max(1, self.seconds_until_next_poll()))
+
+def main():
+    poller = OddsPoller()
+    if not poller.sports:
+        print("No sports configured in SPORTS")
+        return
+    poller.run(on_update=lambda all_data, changed: save_snapshot(all_data))
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,283 @@
+import os
+import threading
+import time
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from typing import NamedTuple
+
+from dotenv import load_dotenv
+
+from monitoring.metrics import METRICS
+from scrapers import odds_api
+from scrapers.odds_api import MAX_CONCURRENT_REQUESTS, create_session, request_odds
+from scrapers.poller import parse_quota_header
+
+load_dotenv()
+
+API_KEYS = [key.strip() for key in (os.getenv("API_KEYS") or os.getenv("API_KEY") or '').split(',')
+            if key.strip()]  # Odds API keys to spread requests over, comma-separated in API_KEYS
+KEY_RATE_LIMIT = 8  # Requests per second sent with any one key
+KEY_QUOTA_RESERVE = 10  # Requests left unspent on every key
+RATE_LIMIT_RETRIES = 3  # Times a work unit is retried after a 429
+RETRY_AFTER = 1  # Seconds to wait after a 429 that has no Retry-After header
+MAX_WORKER_PROCESSES = os.cpu_count() or 1  # Keys are fetched in parallel processes, at most this many at once
+
+class WorkUnit(NamedTuple):
+    # One request: one market of one sport over the configured regions, which the Odds API bills once
+    # per region, just as fetch_all_odds is billed for that market
+    sport: str
+    regions: tuple
+    market: str
+
+class ShardResult(NamedTuple):
+    key_index: int
+    payloads: list  # (unit, events) pairs of the units fetched
+    unfinished: list  # Units not sent because the key ran out of quota; they go to another key
+    failed: list  # Units that got an error response; dropped, like a failed sport in fetch_all_odds
+    remaining: int  # Quota left on the key as last reported, None if never reported
+    exhausted: bool
+    statuses: dict  # Response status -> count
+    seconds: float
+
+class RateLimiter:
+    # Spaces requests evenly, shared by every thread of a shard
+    def __init__(self, rate):
+        self.interval = 1 / rate if rate else 0
+        self.next_time = 0
+        self.paused_until = 0
+        self.lock = threading.Lock()
+
+    def wait(self):
+        with self.lock:
+            now = time.monotonic()
+            start = max(now, self.next_time)
+            self.next_time = start + self.interval
+        time.sleep(start - now)
+
+    def back_off(self, seconds):
+        # After a 429: every thread pauses, and the key's rate is halved for the rest of the shard. The
+        # other requests already in flight when the pause began do not halve it again.
+        with self.lock:
+            now = time.monotonic()
+            if now < self.paused_until:
+                return
+            self.interval = self.interval * 2 if self.interval else 1 / KEY_RATE_LIMIT
+            self.paused_until = self.next_time = max(self.next_time, now + seconds)
+
+class KeyBudget:
+    # A key's remaining quota as the shard spends it. Requests are counted before they are sent, so
+    # concurrent threads cannot overshoot; response headers then correct the count downwards. Until the
+    # API has reported the quota, one request at a time goes out to find it.
+    def __init__(self, remaining, reserve):
+        self.remaining = remaining
+        self.reserve = reserve
+        self.exhausted = False
+        self.probing = False
+        self.condition = threading.Condition()
+
+    def take(self, cost=1):
+        with self.condition:
+            while self.remaining is None and self.probing and not self.exhausted:
+                self.condition.wait()
+            if self.exhausted:
+                return False
+            if self.remaining is None:
+                self.probing = True
+            elif self.remaining - cost < self.reserve:
+                self.exhausted = True
+                return False
+            else:
+                self.remaining -= cost
+            return True
+
+    def refund(self, cost=1):
+        with self.condition:
+            if self.remaining is not None:
+                self.remaining += cost
+
+    def report(self, remaining):
+        # Called after every response, with None when the quota was not reported
+        with self.condition:
+            if remaining is not None:
+                self.remaining = remaining if self.remaining is None else min(self.remaining, remaining)
+            self.probing = False
+            self.condition.notify_all()
+
+    def exhaust(self):
+        with self.condition:
+            self.exhausted = True
+            self.condition.notify_all()
+
+def fetch_shard(key_index, api_key, units, remaining=None, base_url=None, max_concurrent=MAX_CONCURRENT_REQUESTS,
+                rate_limit=KEY_RATE_LIMIT, quota_reserve=KEY_QUOTA_RESERVE):
+    # Fetches every unit with one key, in a worker process or a thread. Metrics recorded here would stay
+    # in the worker, so the outcome is returned for the parent to record.
+    if base_url is not None:
+        odds_api.BASE_URL = base_url
+    start = time.perf_counter()
+    limiter = RateLimiter(rate_limit)
+    budget = KeyBudget(remaining, quota_reserve)
+    statuses = {}
+    lock = threading.Lock()
+
+    def fetch_unit(unit):
+        cost = len(unit.regions)
+        for _ in range(RATE_LIMIT_RETRIES + 1):
+            if not budget.take(cost):
+                return 'unfinished', None
+            limiter.wait()
+            response = request_odds(unit.sport, session, api_key=api_key, regions=list(unit.regions),
+                                    markets=[unit.market], key_index=key_index)
+            status = 'error' if response is None else response.status_code
+            with lock:
+                statuses[status] = statuses.get(status, 0) + 1
+            budget.report(None if response is None else parse_quota_header(response.headers, 'x-requests-remaining'))
+            if response is None:
+                return 'failed', None
+            if response.status_code == 200:
+                return 'ok', response.json()
+            if response.status_code == 429:
+                # Rate limited requests are not billed
+                budget.refund(cost)
+                limiter.back_off(float(response.headers.get('Retry-After', RETRY_AFTER)))
+                continue
+            if response.status_code == 401:
+                # Invalid key or out of usage credits: the key is done, its units move to another key
+                print(f"API key {key_index} rejected: {response.text}")
+                budget.exhaust()
+                return 'unfinished', None
+            print(f"Failed to get {unit.market} odds for {unit.sport} in {','.join(unit.regions)}: "
+                  f"status_code {response.status_code}, response body {response.text}")
+            return 'failed', None
+        return 'failed', None
+
+    session = create_session(max_concurrent)
+    try:
+        with ThreadPoolExecutor(max_workers=max(1, min(max_concurrent, len(units)))) as executor:
+            outcomes = list(executor.map(fetch_unit, units))
+    finally:
+        session.close()
+
+    payloads, unfinished, failed = [], [], []
+    for unit, (outcome, data) in zip(units, outcomes):
+        if outcome == 'ok':
+            payloads.append((unit, data))
+        else:
+            (unfinished if outcome == 'unfinished' else failed).append(unit)
+    return ShardResult(key_index, payloads, unfinished, failed, budget.remaining, budget.exhausted, statuses,
+                       time.perf_counter() - start)
+
+def merge_payloads(results, sports):
+    # One event set from the per-unit payloads: events are matched by id, bookmakers by key and markets
+    # by key, keeping the most recently updated copy of a market quoted twice. Events come out ordered
+    # by start time, as the API returns them.
+    all_data = {}
+    events = {}
+    for unit, data in results:
+        sport_events = all_data.setdefault(unit.sport, {})
+        for event in data:
+            merged = sport_events.get(event['id'])
+            if merged is None:
+                merged = sport_events[event['id']] = {**event, 'bookmakers': []}
+                events[event['id']] = {}
+            bookmakers = events[event['id']]
+            for bookmaker in event['bookmakers']:
+                book = bookmakers.get(bookmaker['key'])
+                if book is None:
+                    book = bookmakers[bookmaker['key']] = ({**bookmaker, 'markets': []}, {})
+                    merged['bookmakers'].append(book[0])
+                merged_book, markets = book
+                for market in bookmaker['markets']:
+                    position = markets.get(market['key'])
+                    if position is None:
+                        markets[market['key']] = len(merged_book['markets'])
+                        merged_book['markets'].append(market)
+                    elif market.get('last_update', '') > merged_book['markets'][position].get('last_update', ''):
+                        merged_book['markets'][position] = market
+                if bookmaker.get('last_update', '') > merged_book.get('last_update', ''):
+                    merged_book['last_update'] = bookmaker['last_update']
+    return {sport: sorted(all_data[sport].values(), key=lambda event: event['commence_time'])
+            for sport in sports if all_data.get(sport)}
+
+class ShardedFetcher:
+    # Spreads (sport, market) work units over several API keys, one worker process per key, without
+    # letting any key spend past its reserve. Units a key could not send are handed to the keys that
+    # still have quota, until every unit is fetched or every key is spent. Every unit asks for the
+    # configured regions (odds_api.REGIONS unless regions is given), so sharding costs no more quota
+    # than fetch_all_odds; it only spreads that cost over the keys.
+    def __init__(self, api_keys=None, regions=None, processes=None, max_concurrent=MAX_CONCURRENT_REQUESTS,
+                 rate_limit=KEY_RATE_LIMIT, quota_reserve=KEY_QUOTA_RESERVE):
+        self.api_keys = list(API_KEYS if api_keys is None else api_keys)
+        self.regions = None if regions is None else list(regions)
+        self.processes = min(len(self.api_keys), MAX_WORKER_PROCESSES) if processes is None else processes
+        self.max_concurrent = max_concurrent
+        self.rate_limit = rate_limit
+        self.quota_reserve = quota_reserve
+        # Quota as last reported for each key; kept between fetches
+        self.remaining = [None] * len(self.api_keys)
+        self.exhausted = [False] * len(self.api_keys)
+
+    def work_units(self, sports):
+        regions = tuple(odds_api.REGIONS if self.regions is None else self.regions)
+        return [WorkUnit(sport, regions, market) for sport in sports
+                for market in odds_api.MARKETS.get(sport, odds_api.MARKETS['default'])]
+
+    def spare(self, key_index):
+        remaining = self.remaining[key_index]
+        return float('inf') if remaining is None else remaining - self.quota_reserve
+
+    def assign(self, units):
+        # Each unit goes to the key with the most quota to spare after what it already has; keys that
+        # have not reported their quota yet share the units evenly
+        usable = [index for index in range(len(self.api_keys)) if not self.exhausted[index] and self.spare(index) > 0]
+        shards = {index: [] for index in usable}
+        if not usable:
+            return shards
+        for unit in units:
+            index = max(usable, key=lambda index: (self.spare(index) - len(shards[index]), -len(shards[index])))
+            shards[index].append(unit)
+        return {index: shard for index, shard in shards.items() if shard}
+
+    def run_shards(self, shards):
+        args = [(index, self.api_keys[index], units, self.remaining[index], odds_api.BASE_URL, self.max_concurrent,
+                 self.rate_limit, self.quota_reserve) for index, units in shards.items()]
+        if self.processes > 1 and len(args) > 1:
+            with ProcessPoolExecutor(max_workers=min(self.processes, len(args))) as executor:
+                return list(executor.map(fetch_shard, *zip(*args)))
+        with ThreadPoolExecutor(max_workers=len(args)) as executor:
+            return list(executor.map(lambda arg: fetch_shard(*arg), args))
+
+    def fetch(self, sports=None):
+        sports = odds_api.SPORTS if sports is None else sports
+        pending = self.work_units(sports)
+        results = []
+        with METRICS.timer('fetch'):
+            while pending:
+                shards = self.assign(pending)
+                if not shards:
+                    print(f"Every API key is out of quota; {len(pending)} requests were not sent")
+                    METRICS.increment('shard_units_unsent', len(pending))
+                    break
+                print(f"Fetching {len(pending)} sport/market requests with {len(shards)} API keys...")
+                pending = []
+                for shard in self.run_shards(shards):
+                    self.remaining[shard.key_index] = shard.remaining
+                    self.exhausted[shard.key_index] = shard.exhausted
+                    results.extend(shard.payloads)
+                    pending.extend(shard.unfinished)
+                    key = str(shard.key_index)
+                    METRICS.observe('fetch_shard', shard.seconds, key=key)
+                    for status, count in shard.statuses.items():
+                        METRICS.increment('shard_requests', count, key=key, status=status)
+                    if shard.remaining is not None:
+                        METRICS.set_gauge('api_requests_remaining', shard.remaining, key=key)
+                    if shard.failed:
+                        METRICS.increment('shard_units_failed', len(shard.failed), key=key)
+        # Units finish in whatever order the keys got to them; merging in work unit order keeps the
+        # result independent of how they were sharded
+        order = {unit: position for position, unit in enumerate(self.work_units(sports))}
+        results.sort(key=lambda result: order[result[0]])
+        with METRICS.timer('merge'):
+            return merge_payloads(results, sports)
+
+def fetch_all_odds_sharded(sports=None, api_keys=None, regions=None, processes=None):
+    return ShardedFetcher(api_keys, regions, processes).fetch(sports)
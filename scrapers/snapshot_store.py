@@ -0,0 +1,170 @@
+import csv
+import os
+import sys
+from datetime import datetime, timezone
+
+import numpy as np
+
+from monitoring.metrics import METRICS
+from scrapers.odds_api import OddsRow, flatten_odds
+
+STORE_DIR = 'data/odds_store'  # Appendable columnar history of every fetched snapshot
+INDEX_FILE = 'snapshots.csv'  # One line per (snapshot, sport) block: time, sport, first row, row count
+STRINGS_FILE = 'strings.txt'  # Sport, team and bookmaker names, one per line; the line number is the id
+START_TIME_FORMAT = "%Y-%m-%dT%H:%M:%SZ"
+
+# Column files and their on-disk types. Names are interned to int32 ids, start times are epoch
+# seconds, and missing odds are NaN.
+STRING_COLUMNS = ['sport', 'home_team', 'away_team', 'bookmaker']
+COLUMN_TYPES = {field: np.dtype('<i4') if field in STRING_COLUMNS else np.dtype('<f8') for field in OddsRow._fields}
+COLUMN_TYPES['start_time'] = np.dtype('<i8')
+
+def column_path(directory, column):
+    return os.path.join(directory, f"{column}.bin")
+
+def to_epoch(start_time):
+    return int(datetime.strptime(start_time, START_TIME_FORMAT).replace(tzinfo=timezone.utc).timestamp())
+
+def from_epoch(seconds):
+    return datetime.fromtimestamp(seconds, timezone.utc).strftime(START_TIME_FORMAT)
+
+class SnapshotStore:
+    # Snapshots are appended as contiguous row blocks to one file per column. Readers memory-map
+    # only the columns they ask for, so selecting a snapshot or a sport is a slice, not a copy.
+    # The index line is written last: a crash mid-append leaves column tails that the next append
+    # truncates, and readers never see them.
+    def __init__(self, directory=STORE_DIR):
+        self.directory = directory
+        self.blocks = []
+        self.names = []
+        self.ids = {}
+        self.columns = {}
+        if os.path.exists(os.path.join(directory, STRINGS_FILE)):
+            with open(os.path.join(directory, STRINGS_FILE), encoding='utf-8') as f:
+                self.names = f.read().split('\n')[:-1]
+            self.ids = {name: i for i, name in enumerate(self.names)}
+        if os.path.exists(os.path.join(directory, INDEX_FILE)):
+            with open(os.path.join(directory, INDEX_FILE), newline='', encoding='utf-8') as f:
+                self.blocks = [(datetime.fromisoformat(time), sport, int(offset), int(count))
+                               for time, sport, offset, count in csv.reader(f)]
+
+    def __len__(self):
+        return self.blocks[-1][2] + self.blocks[-1][3] if self.blocks else 0
+
+    def snapshot_times(self):
+        return sorted(set(block[0] for block in self.blocks))
+
+    def intern(self, name, new_names):
+        symbol = self.ids.get(name)
+        if symbol is None:
+            symbol = self.ids[name] = len(self.names)
+            self.names.append(name)
+            new_names.append(name)
+        return symbol
+
+    def append(self, rows, snapshot_time=None):
+        snapshot_time = snapshot_time or datetime.now(timezone.utc)
+        # Group rows by sport so every (snapshot, sport) is one contiguous block
+        by_sport = {}
+        for row in rows:
+            by_sport.setdefault(row.sport, []).append(row)
+        if not by_sport:
+            return 0
+
+        os.makedirs(self.directory, exist_ok=True)
+        new_names = []
+        epochs = {}
+        columns = dict(zip(OddsRow._fields, zip(*[row for sport_rows in by_sport.values() for row in sport_rows])))
+        for column in STRING_COLUMNS:
+            columns[column] = [self.intern(value, new_names) for value in columns[column]]
+        for start_time in set(columns['start_time']):
+            epochs[start_time] = to_epoch(start_time)
+        columns['start_time'] = [epochs[start_time] for start_time in columns['start_time']]
+
+        if new_names:
+            with open(os.path.join(self.directory, STRINGS_FILE), 'a', encoding='utf-8') as f:
+                f.write(''.join(f"{name}\n" for name in new_names))
+
+        offset = len(self)
+        for column, values in columns.items():
+            dtype = COLUMN_TYPES[column]
+            with open(column_path(self.directory, column), 'ab') as f:
+                f.truncate(offset * dtype.itemsize)
+                # None converts to NaN in the float columns
+                f.write(np.array(values, dtype=dtype).tobytes())
+
+        blocks = []
+        for sport, sport_rows in by_sport.items():
+            blocks.append((snapshot_time, sport, offset, len(sport_rows)))
+            offset += len(sport_rows)
+        with open(os.path.join(self.directory, INDEX_FILE), 'a', newline='', encoding='utf-8') as f:
+            csv.writer(f).writerows((time.isoformat(), sport, start, count) for time, sport, start, count in blocks)
+        self.blocks.extend(blocks)
+        self.columns = {}
+        return offset - blocks[0][2]
+
+    def column(self, column):
+        # Memory-mapped for the store's committed length; mapped lazily and reused
+        if column not in self.columns:
+            self.columns[column] = np.memmap(column_path(self.directory, column), dtype=COLUMN_TYPES[column],
+                                             mode='r', shape=(len(self),))
+        return self.columns[column]
+
+    def select(self, snapshot_time=None, sports=None):
+        # Row ranges for one snapshot (the latest by default), optionally restricted to some sports
+        if not self.blocks:
+            return []
+        snapshot_time = snapshot_time or self.blocks[-1][0]
+        return [(offset, offset + count) for time, sport, offset, count in self.blocks
+                if time == snapshot_time and (sports is None or sport in sports)]
+
+    def load(self, columns, snapshot_time=None, sports=None):
+        # A single block comes back as views into the mapped files; several blocks are concatenated
+        ranges = self.select(snapshot_time, sports)
+        result = {}
+        for column in columns:
+            if not ranges:
+                result[column] = np.empty(0, dtype=COLUMN_TYPES[column])
+            elif len(ranges) == 1:
+                result[column] = self.column(column)[ranges[0][0]:ranges[0][1]]
+            else:
+                result[column] = np.concatenate([self.column(column)[start:end] for start, end in ranges])
+        return result
+
+    def rows(self, snapshot_time=None, sports=None):
+        # OddsRow records for analyze_odds and the other row-based consumers
+        start_times = {}
+        for start, end in self.select(snapshot_time, sports):
+            values = [self.column(column)[start:end].tolist() for column in OddsRow._fields]
+            for row in zip(*values):
+                sport, home_team, away_team, start_time, bookmaker = row[:5]
+                if start_time not in start_times:
+                    start_times[start_time] = from_epoch(start_time)
+                yield OddsRow(self.names[sport], self.names[home_team], self.names[away_team],
+                              start_times[start_time], self.names[bookmaker],
+                              *[None if value != value else value for value in row[5:]])
+
+def save_snapshot(all_data, directory=STORE_DIR):
+    if not all_data:
+        print("No data to save")
+        return None
+    with METRICS.timer('snapshot_write'):
+        count = SnapshotStore(directory).append(flatten_odds(all_data))
+    print(f"Snapshot of {count} rows appended to {directory}")
+    return directory
+
+def import_csv_snapshots(csv_directory='data', directory=STORE_DIR):
+    # One-off migration of the timestamped CSV history into the store, oldest first
+    from analysis.batch_analysis import list_snapshots, snapshot_time
+    from analysis.ev_analysis import read_odds_csv
+    store = SnapshotStore(directory)
+    imported = set(store.snapshot_times())
+    for path in list_snapshots(csv_directory):
+        time = snapshot_time(path).astimezone(timezone.utc)
+        if time not in imported:
+            store.append(read_odds_csv(path), time)
+    print(f"Store at {directory} now holds {len(store.snapshot_times())} snapshots ({len(store)} rows)")
+    return store
+
+if __name__ == "__main__":
+    import_csv_snapshots(*sys.argv[1:3])